@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from retrieval import Hit
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ANSWER_CACHE_PATH = os.path.join(ROOT_DIR, "data", "answer_cache.sqlite")
+
+# Cosine similarity a new question's embedding needs with a cached one to reuse its answer
+# (env ANSWER_CACHE_THRESHOLD). Paraphrases of one question typically score above 0.95;
+# different questions about the same topic usually stay below it.
+SIMILARITY_THRESHOLD = 0.95
+
+# Answers are evicted (least recently used first) beyond this many entries
+MAX_ENTRIES = 5000
+
+# Latencies kept for the p50 figures in stats()
+LATENCY_WINDOW = 1000
+
+# Characters of each source chunk kept with a cached answer (enough for the source preview)
+SOURCE_PREVIEW_CHARS = 200
+
+# ANSWER_CACHE and ANSWER_CACHE_THRESHOLD are read at call time: the front ends import this
+# module before load_dotenv() runs
+def answer_cache_enabled():
+    """ANSWER_CACHE=0 turns the cache off in both front ends (the sidebar can also bypass it per session)."""
+    return os.getenv("ANSWER_CACHE", "1").lower() not in ("0", "false", "no")
+
+def similarity_threshold():
+    return float(os.getenv("ANSWER_CACHE_THRESHOLD", str(SIMILARITY_THRESHOLD)))
+
+def context_key(*parts):
+    """Hash of everything besides the question that shapes an answer (prompt, model, retrieval settings)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+def p50(values):
+    return sorted(values)[len(values) // 2] if values else None
+
+def source_entries(hits):
+    """The sources of an answer as stored with it: ID, score, episode metadata and a text preview."""
+    return [{"source_id": hit.payload['source_id'], "score": hit.score, "metadata": hit.payload['metadata'],
+             "text": hit.payload['text'][:SOURCE_PREVIEW_CHARS]} for hit in hits]
+
+def source_hits(entries):
+    """Hits rebuilt from stored source entries, shaped like the search results they came from."""
+    # Entries cached before previews were stored carry only IDs; they're dropped
+    return [Hit(None, entry['score'], entry) for entry in entries if 'metadata' in entry]
+
+class AnswerCache:
+    """
+    Persistent semantic cache of generated answers, keyed by question embedding.
+
+    An answer is only reused under the same index version (collection contents) and context
+    key (system prompt, model, retrieval settings), for a question whose embedding is at least
+    `threshold` similar to the one it was generated for. Candidate embeddings for the current
+    version/context are held in memory as one matrix, so a lookup is a single dot product.
+    """
+    def __init__(self, path=DEFAULT_ANSWER_CACHE_PATH, threshold=None, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold if threshold is not None else similarity_threshold()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.matrices = {}  # (index_version, context) -> (entry ids, unit-length float32 matrix)
+        self.hits = 0
+        self.misses = 0
+        self.hit_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.miss_latencies = deque(maxlen=LATENCY_WINDOW)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                index_version TEXT NOT NULL,
+                context TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_by_key ON answers(index_version, context)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers(last_used)")
+        self.conn.commit()
+
+    def _matrix(self, index_version, context):
+        key = (index_version, context)
+        if key not in self.matrices:
+            rows = self.conn.execute(
+                "SELECT id, vector FROM answers WHERE index_version = ? AND context = ?", key
+            ).fetchall()
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            matrix = (np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                      if rows else np.zeros((0, 0), dtype=np.float32))
+            self.matrices[key] = (ids, matrix)
+        return self.matrices[key]
+
+    def lookup(self, vector, index_version, context):
+        """Returns {"question", "answer", "sources", "similarity"} for the closest cached question, or None."""
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        with self.lock:
+            ids, matrix = self._matrix(index_version, context)
+            if len(ids) == 0 or matrix.shape[1] != len(query):
+                return None
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            entry_id = int(ids[best])
+            question, answer, sources = self.conn.execute(
+                "SELECT question, answer, sources FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self.conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self.conn.commit()
+        return {"question": question, "answer": answer, "sources": json.loads(sources),
+                "similarity": float(similarities[best])}
+
+    def store(self, question, vector, answer, sources, index_version, context):
+        """Caches an answer; sources is a JSON-serializable list (see source_entries())."""
+        unit = np.asarray(vector, dtype=np.float32)
+        unit = unit / np.linalg.norm(unit)
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO answers (index_version, context, question, vector, answer, sources, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (index_version, context, question, unit.tobytes(), answer, json.dumps(sources), time.time()))
+            self._evict()
+            self.conn.commit()
+            # Reloaded from SQLite on the next lookup
+            self.matrices.clear()
+
+    def _evict(self):
+        excess = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute("""
+                DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)
+            """, (excess,))
+
+    def record(self, seconds, hit):
+        """Records the end-to-end latency of one answered question, served from the cache or not."""
+        with self.lock:
+            if hit:
+                self.hits += 1
+                self.hit_latencies.append(seconds)
+            else:
+                self.misses += 1
+                self.miss_latencies.append(seconds)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "p50_hit_seconds": p50(self.hit_latencies),
+                "p50_miss_seconds": p50(self.miss_latencies)
+            }
+
+    def close(self):
+        self.conn.close()
+
+def format_seconds(seconds):
+    return f"{seconds:.2f}s" if seconds is not None else "n/a"
+
+def describe(stats):
+    """One-line summary for the sidebar and CLI logs."""
+    return (f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"p50 {format_seconds(stats['p50_hit_seconds'])} cached vs {format_seconds(stats['p50_miss_seconds'])} generated")
@@ -1,15 +1,40 @@
 import streamlit as st
 import os
+import time
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
 from openai import OpenAI
 
+from retrieval_service import connect as connect_retrieval, describe_service, EMBEDDING_MODEL, HYBRID_TOP_K, VECTOR_TOP_K
+from retrieval import make_filters
+from query_cache import describe
+from chat_stream import GenerationLog, stream_chat, describe_timing
+from context_packer import context_token_budget, PackingLog, pack_context, describe_packing
+from answer_cache import (
+    AnswerCache, answer_cache_enabled, context_key, source_entries, source_hits, describe as describe_answers
+)
+
 # --- 1. Load secrets & config ---
 # Load environment variables from the .env file
 load_dotenv()
 
-QDRANT_URL = "http://localhost:6333"
-COLLECTION_NAME = "econtalk_episodes"
+# Retrieval (Qdrant or NumPy backend, hybrid search, query caches) lives in retrieval_service.py:
+# a shared service when RETRIEVAL_SERVICE_URL is set, the same service in this process otherwise.
+# Its settings (QDRANT_URL, QDRANT_PATH, RETRIEVAL_BACKEND, HYBRID_SEARCH, MMR_RERANK) are read from .env too.
+
+CHAT_MODEL = "gpt-4o"
+SYSTEM_PROMPT = """
+You are an expert research assistant for the 'EconTalk' podcast archives. 
+
+Your Role:
+Answer the user's question using ONLY the provided Context (podcast transcripts).
+
+Guidelines:
+1. CITATION IS MANDATORY: Always attribute ideas to the specific guest or episode.
+2. REASONABLE INFERENCE: If an author is discussing their own book, you may treat that as the book being "recommended" or "featured."
+3. NO OUTSIDE KNOWLEDGE: Do not use external training data.
+4. TONE: Intellectual, curious, and charitable.
+"""
+
 API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Check if key exists
@@ -21,81 +46,177 @@ if not API_KEY:
 @st.cache_resource
 def get_clients():
     try:
-        q_client = QdrantClient(url=QDRANT_URL)
-        # Test connection to ensure Docker is running
-        q_client.get_collections()
+        # One retrieval client for all sessions, so concurrent questions share its batches and caches
+        retrieval = connect_retrieval()
+        retrieval_info = retrieval.info()
         o_client = OpenAI(api_key=API_KEY)
-        return q_client, o_client
+        return retrieval, retrieval_info, o_client
     except Exception as e:
         st.error(f"Connection error: {e}")
-        st.error("Make sure your Docker container is running.")
+        st.error("Make sure your Docker container (and the retrieval service, if RETRIEVAL_SERVICE_URL is set) "
+                 "is running, and that the pipeline (04_chunk.py) has built the episode store.")
         st.stop()
 
-q_client, o_client = get_clients()
+retrieval, retrieval_info, o_client = get_clients()
+
+@st.cache_resource
+def get_filter_options():
+    # Guests, speakers and date range for the sidebar filters
+    return retrieval.filter_options()
+
+@st.cache_resource
+def get_answer_cache():
+    # Answers to earlier questions, reused for paraphrases (shared across sessions; ANSWER_CACHE=0 disables it)
+    return AnswerCache() if answer_cache_enabled() else None
+
+answer_cache = get_answer_cache()
+
+@st.cache_resource
+def get_generation_log():
+    # Time to first token / total generation time of every streamed answer (shared across sessions)
+    return GenerationLog()
+
+generation_log = get_generation_log()
+
+@st.cache_resource
+def get_packing_log():
+    # Tokens saved by context packing (shared across sessions)
+    return PackingLog()
+
+packing_log = get_packing_log()
 
 # --- 3. Helper functions (RAG logic) ---
 def get_embedding(text):
-    text = text.replace("\n", " ")
-    return o_client.embeddings.create(input=[text], model="text-embedding-3-small").data[0].embedding
+    return retrieval.embed(text)
 
-def retrieve_context(query, top_k=15):
+def retrieve_context(query, top_k=None, hybrid=None, episode_ids=None, hnsw_ef=None, oversampling=None,
+                     query_vector=None, mmr=None, filters=None):
     """
-    Searches the vector database for the top_k most relevant chunks and returns them as objects.
+    Searches the vector database (fused with BM25 when hybrid) for the top_k most relevant chunks
+    and returns them as objects. episode_ids restricts the search to those episodes, and filters
+    (make_filters()) to a date range, guest or speaker;
+    hnsw_ef / oversampling override the collection profile's search parameters.
+    query_vector skips the embedding lookup when the caller already has it.
+    mmr re-ranks an over-fetched candidate list for diversity (at most a few chunks per episode).
     """
-    query_vector = get_embedding(query)
-    response = q_client.query_points(
-        collection_name=COLLECTION_NAME,
-        query=query_vector,
-        limit=top_k
-    )
-    
-    # 'query_points' returns a response object; list the points inside it
-    return response.points
+    return retrieval.retrieve(query, top_k=top_k, hybrid=hybrid, episode_ids=episode_ids,
+                              hnsw_ef=hnsw_ef, oversampling=oversampling, query_vector=query_vector, mmr=mmr,
+                              filters=filters)
 
-def generate_rag_response(question, hits):
+def generate_rag_response(question, context_text, timing=None):
     """
-    Generates an answer based on the provided hits.
+    Streams an answer based on the packed context (see pack_context()), yielding text as it arrives.
+    timing (a dict) receives the time to first token and the total generation time.
     """
-    # 1. Build the context string
-    context_parts = []
-    for hit in hits:
-        meta = hit.payload['metadata']
-        text = hit.payload['text']
-        context_parts.append(f"--- EPISODE: {meta['title']} ({meta['date']}) ---\n{text}\n")
-    
-    context_text = "\n".join(context_parts)
-    
-    # 2. Build the prompt
-    system_prompt = """
-You are an expert research assistant for the 'EconTalk' podcast archives. 
-
-Your Role:
-Answer the user's question using ONLY the provided Context (podcast transcripts).
-
-Guidelines:
-1. CITATION IS MANDATORY: Always attribute ideas to the specific guest or episode.
-2. REASONABLE INFERENCE: If an author is discussing their own book, you may treat that as the book being "recommended" or "featured."
-3. NO OUTSIDE KNOWLEDGE: Do not use external training data.
-4. TONE: Intellectual, curious, and charitable.
-"""
-    
-    # 3. Call LLM
-    response = o_client.chat.completions.create(
-        model="gpt-4o", 
-        messages=[
-            {"role": "system", "content": system_prompt},
+    # Call LLM (SYSTEM_PROMPT is also part of the answer cache key)
+    yield from stream_chat(
+        o_client,
+        CHAT_MODEL,
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {question}"}
         ],
+        log=generation_log,
+        timing=timing,
         temperature=0.3
     )
-    
-    return response.choices[0].message.content
+
+def answer_context(hybrid, mmr, filters=None):
+    """Everything besides the question that shapes an answer; part of the answer cache key."""
+    return context_key(SYSTEM_PROMPT, CHAT_MODEL, EMBEDDING_MODEL,
+                       HYBRID_TOP_K if hybrid else VECTOR_TOP_K, hybrid, context_token_budget(), mmr, filters)
+
+def answer_question(question, hybrid=True, mmr=False, filters=None, use_cache=True):
+    """
+    Answers a question as a stream of (kind, value) events, so the UI can render each part as
+    soon as it exists:
+      ("sources", hits)   once retrieval is done, before generation starts
+      ("context", report) once the hits are packed into the prompt (see pack_context())
+      ("text", piece)     for each piece of the answer as it streams in
+      ("cached", entry)   if the answer came from the answer cache (a near-identical question)
+      ("timing", timing)  after a generated answer: first_token_seconds, total_seconds
+    filters (make_filters()) restricts retrieval; use_cache=False bypasses the answer cache.
+    """
+    started = time.perf_counter()
+    hybrid = hybrid and retrieval_info['hybrid']
+    use_cache = use_cache and answer_cache is not None
+    index_version = retrieval.version()
+    query_vector = get_embedding(question)
+
+    if use_cache:
+        cached = answer_cache.lookup(query_vector, index_version, answer_context(hybrid, mmr, filters))
+        if cached:
+            yield "sources", source_hits(cached['sources'])
+            yield "cached", cached
+            yield "text", cached['answer']
+            answer_cache.record(time.perf_counter() - started, hit=True)
+            return
+
+    hits = retrieve_context(question, hybrid=hybrid, query_vector=query_vector, mmr=mmr, filters=filters)
+    yield "sources", hits
+    if not hits:
+        yield "text", ("I couldn't find any relevant episodes matching the filters." if filters
+                       else "I couldn't find any relevant episodes.")
+        return
+
+    # Merge overlapping chunks per episode and fit the token budget
+    context_text, report = pack_context(hits)
+    packing_log.record(report)
+    yield "context", report
+
+    timing = {}
+    pieces = []
+    for piece in generate_rag_response(question, context_text, timing):
+        pieces.append(piece)
+        yield "text", piece
+    yield "timing", timing
+
+    if use_cache:
+        answer_cache.store(question, query_vector, "".join(pieces), source_entries(hits),
+                           index_version, answer_context(hybrid, mmr, filters))
+        answer_cache.record(time.perf_counter() - started, hit=False)
+
+def show_sources(hits):
+    with st.expander("View Source Episodes"):
+        for i, hit in enumerate(hits):
+            meta = hit.payload['metadata']
+            score = hit.score
+            st.markdown(f"**{i+1}. {meta['title']}** (Score: {score:.4f})")
+            st.caption(f"Date: {meta['date']}")
+            st.text(hit.payload['text'][:200] + "...") # Show preview
+            st.markdown("---")
 
 # --- 4. Streamlit UI ---
 st.set_page_config(page_title="EconTalk RAG", page_icon="🎙️")
 st.title("🎙️ EconTalk RAG Explorer")
 st.markdown("Ask questions about economics, philosophy, and life based on the EconTalk archives.")
 
+use_hybrid = st.sidebar.checkbox("Hybrid search (BM25 + vector)", value=retrieval_info['hybrid'],
+                                 disabled=not retrieval_info['hybrid'],
+                                 help="Untick to compare against vector-only retrieval.")
+use_mmr = st.sidebar.checkbox("Diversify sources (MMR)", value=retrieval_info['mmr'],
+                              help="Re-rank a larger candidate list so fewer chunks come from the same episode.")
+use_answer_cache = st.sidebar.checkbox("Reuse answers to similar questions", value=answer_cache is not None,
+                                       disabled=answer_cache is None,
+                                       help="Untick to always generate a fresh answer.")
+
+# Metadata filters, applied inside the search (indexed payload fields in Qdrant)
+st.sidebar.subheader("Filters")
+filter_options = get_filter_options()
+year_from, year_to = None, None
+if filter_options['date_from']:
+    first_year, last_year = int(filter_options['date_from'][:4]), int(filter_options['date_to'][:4])
+    if first_year < last_year:
+        year_from, year_to = st.sidebar.slider("Episode year", first_year, last_year, (first_year, last_year))
+        year_from = year_from if year_from > first_year else None
+        year_to = year_to if year_to < last_year else None
+guest = st.sidebar.selectbox("Guest", ["Any"] + filter_options['guests'])
+speaker = st.sidebar.selectbox("Speaker", ["Any"] + filter_options['speakers'],
+                               help="Only chunks where this person speaks.")
+search_filters = make_filters(date_from=year_from, date_to=year_to,
+                              guest=None if guest == "Any" else guest,
+                              speaker=None if speaker == "Any" else speaker)
+
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -119,30 +240,47 @@ if prompt := st.chat_input("What did Mike Munger say about voting?"):
         message_placeholder.markdown("Thinking...")
         
         try:
-            # A. Retrieve
-            hits = retrieve_context(prompt)
+            # A. Retrieve (sources show up below the answer as soon as they are known)
+            # B. Generate, streamed into the placeholder (or reuse the answer to a near-identical question)
+            response = ""
+            for kind, value in answer_question(prompt, hybrid=use_hybrid, mmr=use_mmr, filters=search_filters,
+                                               use_cache=use_answer_cache):
+                if kind == "sources":
+                    show_sources(value)
+                elif kind == "text":
+                    response += value
+                    message_placeholder.markdown(response + "▌")
+                elif kind == "cached":
+                    st.caption(f"Cached answer to \"{value['question']}\" (similarity {value['similarity']:.3f})")
+                elif kind == "context":
+                    st.caption(describe_packing(value).capitalize())
+                elif kind == "timing":
+                    st.caption(f"Generated with {describe_timing(value['first_token_seconds'], value['total_seconds'])}")
             
-            # B. Generate
-            if not hits:
-                response = "I couldn't find any relevant episodes."
-            else:
-                response = generate_rag_response(prompt, hits)
-            
-            # C. Display answer
+            # C. Display the final answer
             message_placeholder.markdown(response)
-            
-            # D. Show sources
-            with st.expander("View Source Episodes"):
-                for i, hit in enumerate(hits):
-                    meta = hit.payload['metadata']
-                    score = hit.score
-                    st.markdown(f"**{i+1}. {meta['title']}** (Score: {score:.4f})")
-                    st.caption(f"Date: {meta['date']}")
-                    st.text(hit.payload['text'][:200] + "...") # Show preview
-                    st.markdown("---")
 
             # Save to history
             st.session_state.messages.append({"role": "assistant", "content": response})
             
         except Exception as e:
-            message_placeholder.error(f"Error: {e}")
\ No newline at end of file
+            message_placeholder.error(f"Error: {e}")
+
+# Cache stats (rendered last, so they include the message just answered)
+retrieval_stats = retrieval.stats()
+if retrieval_stats['embedding_cache']:
+    cache_stats = retrieval_stats['embedding_cache']
+    st.sidebar.caption(f"Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+st.sidebar.caption(f"Query vectors: {describe(retrieval_stats['query_vectors'])}")
+st.sidebar.caption(f"Search results: {describe(retrieval_stats['results'])}")
+st.sidebar.caption(f"Retrieval service: {describe_service(retrieval_stats)}")
+if answer_cache is not None:
+    st.sidebar.caption(f"Answers: {describe_answers(answer_cache.stats())}")
+packing_stats = packing_log.stats()
+if packing_stats["requests"]:
+    st.sidebar.caption(f"Context packing ({packing_stats['requests']} prompts): "
+                       f"{packing_stats['tokens_saved']:,} tokens saved ({packing_stats['reduction']:.0%})")
+generation_stats = generation_log.stats()
+if generation_stats["requests"]:
+    st.sidebar.caption(f"Generation ({generation_stats['requests']} answers): p50 "
+                       f"{describe_timing(generation_stats['p50_first_token_seconds'], generation_stats['p50_total_seconds'])}")
@@ -0,0 +1,93 @@
+"""
+Compares the in-process NumPy backend (retrieval.py) with Qdrant on the same vectors:
+p50/p99 latency per query, batched throughput, and overlap of the top-k results.
+
+Qdrant is the live collection at QDRANT_URL (the econtalk_episodes alias), or with --memory a
+throwaway in-memory Qdrant loaded from the vector store (exact search, so overlap should be 1.0).
+
+Usage: python benchmarks/bench_backends.py [--queries 200] [--k 10] [--memory]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance
+
+from retrieval import NumpyBackend, QdrantBackend
+from vector_store import VectorStore, DEFAULT_VECTOR_DIR
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION_NAME = "econtalk_episodes"
+
+def memory_qdrant():
+    """An in-memory Qdrant holding the vector store, with chunk IDs in the payload as 06_load_db.py does."""
+    store = VectorStore(DEFAULT_VECTOR_DIR, read_only=True)
+    client = QdrantClient(":memory:")
+    client.create_collection(collection_name=COLLECTION_NAME,
+                             vectors_config=VectorParams(size=store.dim, distance=Distance.COSINE))
+    client.upload_collection(collection_name=COLLECTION_NAME, vectors=store.vectors(),
+                             payload=({"source_id": r['id'], "episode_id": r['episode_id']} for r in store.records),
+                             ids=range(len(store)), batch_size=512)
+    return client
+
+def time_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], results
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark NumPy vs Qdrant retrieval.")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--memory", action="store_true", help="Compare against an in-memory Qdrant.")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    started = time.time()
+    numpy_backend = NumpyBackend()
+    print(f"NumPy backend: {len(numpy_backend)} vectors ({numpy_backend.matrix.dtype}) ready in {time.time() - started:.2f}s")
+    if len(numpy_backend) == 0:
+        print("No vectors to search. Run 05_embed.py first.")
+        return
+
+    client = memory_qdrant() if args.memory else QdrantClient(url=QDRANT_URL)
+    qdrant_backend = QdrantBackend(client, COLLECTION_NAME)
+
+    # Queries: stored vectors nudged off their original position
+    rng = np.random.default_rng(7)
+    rows = rng.choice(len(numpy_backend), size=min(args.queries, len(numpy_backend)), replace=False)
+    queries = np.asarray(numpy_backend.matrix[np.sort(rows)], dtype=np.float32)
+    queries += rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+
+    numpy_p50, numpy_p99, numpy_results = time_queries(lambda q: numpy_backend.search(q, args.k), queries)
+    qdrant_p50, qdrant_p99, qdrant_results = time_queries(lambda q: qdrant_backend.search(q, args.k), queries)
+
+    started = time.perf_counter()
+    numpy_backend.search_batch(queries, args.k)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    overlap = np.mean([
+        len({h.payload['source_id'] for h in a} & {h.payload['source_id'] for h in b}) / args.k
+        for a, b in zip(numpy_results, qdrant_results)
+    ])
+
+    print(f"\n{'backend':<8} {'p50':>9} {'p99':>9}")
+    print(f"{'numpy':<8} {numpy_p50:>7.2f}ms {numpy_p99:>7.2f}ms")
+    print(f"{'qdrant':<8} {qdrant_p50:>7.2f}ms {qdrant_p99:>7.2f}ms")
+    print(f"\nNumPy batch of {len(queries)} queries: {batch_ms:.1f}ms ({batch_ms / len(queries):.2f}ms per query)")
+    print(f"Top-{args.k} overlap (NumPy exact vs Qdrant): {overlap:.3f}")
+
+if __name__ == "__main__":
+    main()
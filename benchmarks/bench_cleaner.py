@@ -0,0 +1,189 @@
+"""
+Benchmarks the compiled transcript cleaner (scripts/transcript_cleaner.py) against the
+original per-call-regex implementation, on a synthetic corpus covering both transcript eras.
+
+Also checks that both produce identical output before reporting any numbers.
+
+Usage: python benchmarks/bench_cleaner.py [--episodes 200] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', 'scripts'))
+
+from transcript_cleaner import clean_transcript_new_era, clean_transcript_old_era
+
+# --- Reference implementations (as they were in 03_clean.py before the compiled engine) ---
+def legacy_clean_transcript_new_era(lines):
+    cleaned_dialogue = []
+    current_speaker = "Narrator/Intro"
+    current_text_buffer = []
+    
+    timestamp_pattern = re.compile(r'^\d{1,2}:\d{2}$') 
+    speaker_pattern = re.compile(r'^([A-Za-z \.\-]+):$') 
+    ignore_phrases = ["Time", "Podcast Episode Highlights", "Hide Highlights"]
+
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        if line in ignore_phrases: continue
+        if timestamp_pattern.match(line): continue
+
+        speaker_match = speaker_pattern.match(line)
+        if speaker_match:
+            if current_text_buffer:
+                cleaned_dialogue.append({
+                    "speaker": current_speaker,
+                    "text": " ".join(current_text_buffer)
+                })
+                current_text_buffer = []
+            current_speaker = speaker_match.group(1)
+            continue
+
+        line = re.sub(r'\[.*?\]', '', line) 
+        current_text_buffer.append(line)
+
+    if current_text_buffer:
+        cleaned_dialogue.append({
+            "speaker": current_speaker,
+            "text": " ".join(current_text_buffer)
+        })
+        
+    return cleaned_dialogue
+
+def legacy_clean_transcript_old_era(lines):
+    cleaned_dialogue = []
+    current_speaker = "Narrator/Intro"
+    current_text_buffer = []
+    
+    speaker_inline_pattern = re.compile(r'^(Russ|Guest|Roberts|[A-Z][a-z]+ [A-Z][a-z]+): (.*)')
+    full_text = " ".join(lines)
+    full_text = re.sub(r'(Russ:|Guest:|Roberts:)', r'\n\1', full_text)
+    
+    split_lines = full_text.split('\n')
+
+    for line in split_lines:
+        line = line.strip()
+        if not line: continue
+        
+        if "Time Podcast Episode Highlights" in line: continue
+        
+        match = speaker_inline_pattern.match(line)
+        
+        if match:
+            if current_text_buffer:
+                cleaned_dialogue.append({
+                    "speaker": current_speaker,
+                    "text": " ".join(current_text_buffer).strip()
+                })
+                current_text_buffer = []
+            
+            current_speaker = match.group(1)
+            content = match.group(2)
+            content = re.sub(r'\[.*?\]', '', content) 
+            current_text_buffer.append(content)
+            
+        else:
+            line = re.sub(r'\[.*?\]', '', line)
+            current_text_buffer.append(line)
+
+    if current_text_buffer:
+        cleaned_dialogue.append({
+            "speaker": current_speaker,
+            "text": " ".join(current_text_buffer).strip()
+        })
+
+    return cleaned_dialogue
+
+# --- Synthetic corpus ---
+WORDS = ("the market price of labor incentives trade economics people think about "
+         "regulation growth knowledge emergent order a that is really interesting").split()
+GUESTS = ["Mike Munger", "Tyler Cowen", "Nassim Taleb", "Emily Oster"]
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(6, 25))
+    if rng.random() < 0.15:
+        words.insert(rng.randint(0, len(words)), "[laughter]")
+    if rng.random() < 0.05:
+        words.insert(rng.randint(0, len(words)), "[? inaudible")
+    return " ".join(words).capitalize() + "."
+
+def new_era_episode(rng, turns):
+    guest = rng.choice(GUESTS)
+    lines = ["Time", "Podcast Episode Highlights", "Hide Highlights", "Intro. [Recording date: May 1, 2019.]"]
+    for i in range(turns):
+        if rng.random() < 0.3:
+            lines.append(f"{rng.randint(0, 59)}:{rng.randint(0, 59):02d}")
+        lines.append("Russ Roberts:" if i % 2 == 0 else f"{guest}:")
+        for _ in range(rng.randint(1, 4)):
+            lines.append(" ".join(sentence(rng) for _ in range(rng.randint(1, 5))))
+    return lines
+
+def old_era_episode(rng, turns):
+    guest = rng.choice(GUESTS)
+    lines = ["Time Podcast Episode Highlights", "0:33 Intro. [Recording date: March 3, 2014.]"]
+    for i in range(turns):
+        label = rng.choice(["Russ:", "Roberts:"]) if i % 2 == 0 else rng.choice(["Guest:", f"{guest}:"])
+        body = " ".join(sentence(rng) for _ in range(rng.randint(1, 6)))
+        # Turns sometimes start mid-line, sometimes on their own line
+        if rng.random() < 0.5 and lines:
+            lines[-1] += f" {label} {body}"
+        else:
+            lines.append(f"{label} {body}")
+        if rng.random() < 0.1:
+            lines.append(f"{rng.randint(0, 59)}:{rng.randint(0, 59):02d}")
+    return lines
+
+def build_corpus(episodes, seed=0):
+    rng = random.Random(seed)
+    new_era = [new_era_episode(rng, rng.randint(60, 200)) for _ in range(episodes)]
+    old_era = [old_era_episode(rng, rng.randint(60, 200)) for _ in range(episodes)]
+    return new_era, old_era
+
+def corpus_megabytes(corpus):
+    return sum(len("\n".join(lines).encode('utf-8')) for lines in corpus) / 1e6
+
+def throughput(func, corpus, repeat):
+    """Best-of-N MB/s for running func over every episode in the corpus."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for lines in corpus:
+            func(lines)
+        best = min(best, time.perf_counter() - started)
+    return corpus_megabytes(corpus) / best
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--episodes", type=int, default=200, help="Synthetic episodes per era.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions (best is reported).")
+    args = arg_parser.parse_args()
+
+    new_era, old_era = build_corpus(args.episodes)
+    print(f"Corpus: {args.episodes} episodes per era "
+          f"({corpus_megabytes(new_era):.1f} MB new era, {corpus_megabytes(old_era):.1f} MB old era)")
+
+    # 1. Outputs must be identical
+    for lines in new_era:
+        assert clean_transcript_new_era(lines) == legacy_clean_transcript_new_era(lines), "new-era output differs"
+    for lines in old_era:
+        assert clean_transcript_old_era(lines) == legacy_clean_transcript_old_era(lines), "old-era output differs"
+    print("Outputs identical for both eras.")
+
+    # 2. Throughput
+    print(f"{'era':<10}{'old MB/s':>12}{'new MB/s':>12}{'speedup':>10}")
+    for era, corpus, legacy, engine in [
+        ("new", new_era, legacy_clean_transcript_new_era, clean_transcript_new_era),
+        ("old", old_era, legacy_clean_transcript_old_era, clean_transcript_old_era),
+    ]:
+        old_speed = throughput(legacy, corpus, args.repeat)
+        new_speed = throughput(engine, corpus, args.repeat)
+        print(f"{era:<10}{old_speed:>12.1f}{new_speed:>12.1f}{new_speed / old_speed:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Loads the same vectors under each collection profile (collection_profiles.py) and reports
+estimated RAM, p50/p99 search latency and recall@k against exact (brute-force) search.
+
+Needs a Qdrant server (QDRANT_URL, default http://localhost:6333): Qdrant's local mode always
+searches exhaustively, so HNSW and quantization settings would make no difference there.
+Uses the vector store from 05_embed.py, or random unit vectors with --synthetic N.
+
+Usage: python benchmarks/bench_collections.py [--profiles default scalar binary] [--queries 200] [--k 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import OptimizersConfigDiff, CollectionStatus
+
+from collection_profiles import PROFILES, collection_config, search_params
+from vector_store import VectorStore, DEFAULT_VECTOR_DIR
+
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+BENCH_PREFIX = "econtalk_bench_"
+
+def estimate_ram_bytes(profile, count, dim):
+    """Rough resident size: full vectors, quantized vectors and the HNSW level-0 links kept in RAM."""
+    total = 0
+    if not profile["on_disk"]:
+        total += count * dim * 4
+    if profile["quantization"] == "scalar":
+        total += count * dim
+    elif profile["quantization"] == "binary":
+        total += count * dim // 8
+    if not profile.get("hnsw_on_disk"):
+        total += count * profile["m"] * 2 * 4
+    return total
+
+def normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def exact_top_k(matrix, queries, k, block=8192):
+    """Ground truth by cosine similarity over the memmap, a block of rows at a time."""
+    scores = np.concatenate([
+        normalize(np.asarray(matrix[start:start + block], dtype=np.float32)) @ queries.T
+        for start in range(0, len(matrix), block)
+    ])
+    return np.argsort(-scores, axis=0)[:k].T
+
+def wait_until_indexed(client, name, timeout=1800):
+    started = time.time()
+    while client.get_collection(collection_name=name).status != CollectionStatus.GREEN:
+        if time.time() - started > timeout:
+            print(f"  Warning: '{name}' still indexing, measuring anyway.")
+            return
+        time.sleep(1)
+
+def bench_profile(client, name, matrix, queries, truth, k):
+    profile = PROFILES[name]
+    collection = BENCH_PREFIX + name
+    if client.collection_exists(collection_name=collection):
+        client.delete_collection(collection_name=collection)
+    client.create_collection(
+        collection_name=collection,
+        # Index even a small sample, as the full corpus would be
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1),
+        **collection_config(name, matrix.shape[1])
+    )
+    started = time.time()
+    client.upload_collection(collection_name=collection, vectors=matrix, ids=range(len(matrix)),
+                             batch_size=256, parallel=2, wait=True)
+    wait_until_indexed(client, collection)
+    load_seconds = time.time() - started
+
+    params = search_params(name)
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        points = client.query_points(collection_name=collection, query=query.tolist(), limit=k,
+                                     search_params=params).points
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({p.id for p in points} & set(expected.tolist())) / k)
+
+    client.delete_collection(collection_name=collection)
+    latencies.sort()
+    return {
+        "ram_mb": estimate_ram_bytes(profile, len(matrix), matrix.shape[1]) / 1e6,
+        "load_s": load_seconds,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "recall": sum(recalls) / len(recalls),
+    }
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Compare Qdrant collection profiles.")
+    arg_parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--synthetic", type=int, default=0,
+                            help="Benchmark N random 1536-dim vectors instead of the vector store.")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(7)
+    if args.synthetic:
+        matrix = normalize(rng.standard_normal((args.synthetic, 1536)).astype(np.float32))
+    else:
+        matrix = VectorStore(DEFAULT_VECTOR_DIR, read_only=True).vectors()
+    if len(matrix) == 0:
+        print("No vectors to benchmark. Run 05_embed.py or pass --synthetic N.")
+        return
+
+    # Queries: stored vectors nudged off their original position, so the answer isn't trivially itself
+    rows = rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)
+    queries = normalize(np.asarray(matrix[np.sort(rows)], dtype=np.float32) +
+                        rng.standard_normal((len(rows), matrix.shape[1])).astype(np.float32) * 0.02)
+    print(f"Computing exact top-{args.k} for {len(queries)} queries over {len(matrix)} vectors...")
+    truth = exact_top_k(matrix, queries, args.k)
+
+    client = QdrantClient(url=QDRANT_URL)
+    print(f"\n{'profile':<12} {'est. RAM':>10} {'load':>8} {'p50':>8} {'p99':>8} {'recall@' + str(args.k):>10}")
+    for name in args.profiles:
+        result = bench_profile(client, name, matrix, queries, truth, args.k)
+        print(f"{name:<12} {result['ram_mb']:>8.1f}MB {result['load_s']:>7.1f}s "
+              f"{result['p50_ms']:>6.2f}ms {result['p99_ms']:>6.2f}ms {result['recall']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
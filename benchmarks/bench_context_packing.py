@@ -0,0 +1,86 @@
+"""
+Measures context packing (context_packer.py) on real retrievals: for stored chunks nudged off their
+vectors, the top-k hits are formatted verbatim (as before) and packed, and the prompt tokens, the
+packing time and the time to first token against the local stub (which charges
+--prefill-per-1k-tokens for every 1,000 prompt tokens) are compared.
+
+Searches the vector store in process (NumPy backend); run 04_chunk.py and 05_embed.py first.
+
+Usage: python benchmarks/bench_context_packing.py [--queries 50] [--k 15] [--budget 4000] [--prefill-per-1k-tokens 0.1]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from openai import OpenAI
+
+from chat_stream import GenerationLog, stream_chat
+from context_packer import context_token_budget, format_hits, pack_context
+from episode_store import EpisodeStore
+from retrieval import NumpyBackend
+from stub_embedding_server import start_server
+
+def p50(values):
+    return sorted(values)[len(values) // 2]
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark context packing on retrieved chunks.")
+    arg_parser.add_argument("--queries", type=int, default=50)
+    arg_parser.add_argument("--k", type=int, default=15)
+    arg_parser.add_argument("--budget", type=int, default=context_token_budget())
+    arg_parser.add_argument("--prefill-per-1k-tokens", type=float, default=0.1)
+    return arg_parser.parse_args()
+
+def time_to_first_token(client, contexts):
+    log = GenerationLog()
+    for context_text in contexts:
+        messages = [{"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: What did the guest say?"}]
+        for _ in stream_chat(client, "gpt-4o", messages, log=log):
+            pass
+    return log.stats()["p50_first_token_seconds"]
+
+def main():
+    args = parse_args()
+    backend = NumpyBackend()
+    if len(backend) == 0:
+        print("No vectors to search. Run 05_embed.py first.")
+        return
+    store = EpisodeStore(read_only=True)
+
+    rng = np.random.default_rng(7)
+    rows = np.sort(rng.choice(len(backend), size=min(args.queries, len(backend)), replace=False))
+    vectors = np.asarray(backend.matrix[rows], dtype=np.float32)
+    vectors += rng.standard_normal(vectors.shape).astype(np.float32) * 0.02
+
+    unpacked, packed, reports = [], [], []
+    for hits in backend.search_batch(vectors, args.k):
+        hits = store.resolve_hits(hits)
+        context_text, report = pack_context(hits, budget=args.budget)
+        unpacked.append(format_hits(hits))
+        packed.append(context_text)
+        reports.append(report)
+
+    print(f"\n{len(reports)} prompts of top {args.k} chunks, budget {args.budget:,} tokens")
+    print(f"{'':<10} {'tokens (p50)':>13} {'chars (p50)':>12}")
+    print(f"{'verbatim':<10} {p50([r['tokens_before'] for r in reports]):>13,} {p50([r['chars_before'] for r in reports]):>12,}")
+    print(f"{'packed':<10} {p50([r['tokens_after'] for r in reports]):>13,} {p50([r['chars_after'] for r in reports]):>12,}")
+    saved = sum(r['tokens_saved'] for r in reports) / max(sum(r['tokens_before'] for r in reports), 1)
+    print(f"Tokens saved: {saved:.0%}; chunks kept p50 {p50([r['hits_used'] for r in reports])}/{args.k} "
+          f"in {p50([r['episodes'] for r in reports])} episodes; packing p50 {p50([r['pack_ms'] for r in reports])} ms")
+
+    server, _ = start_server(first_token_latency=0.2, token_interval=0.0,
+                             prefill_per_1k_tokens=args.prefill_per_1k_tokens)
+    client = OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    verbatim_ttft = time_to_first_token(client, unpacked)
+    packed_ttft = time_to_first_token(client, packed)
+    server.shutdown()
+    print(f"Time to first token (stub, {args.prefill_per_1k_tokens}s per 1k prompt tokens): "
+          f"p50 {verbatim_ttft:.2f}s verbatim vs {packed_ttft:.2f}s packed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmarks the async embedding engine (scripts/embed_engine.py) against the old one-request-at-a-time
+loop (fixed batches of 50), both talking to the local stub server (no API key, no cost).
+
+The stub enforces request/token-per-minute limits, so the run also exercises the 429 handling.
+
+Usage: python benchmarks/bench_embed.py [--chunks 5000] [--concurrency 8] [--tpm 1000000] [--error-rate 0.02]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', 'scripts'))
+
+from openai import AsyncOpenAI
+
+from embed_engine import EmbeddingEngine, pack_batches, openai_sender
+from token_counter import get_token_counter
+from stub_embedding_server import start_server
+
+LEGACY_BATCH_SIZE = 50
+MODEL = "text-embedding-3-small"
+
+WORDS = ("economics market price incentive trade policy money growth labor capital risk "
+         "regulation innovation knowledge institution value choice cost benefit").split()
+
+def synthetic_chunks(count, seed=7):
+    rng = random.Random(seed)
+    return [f"Podcast: Episode {i}\nDate: 2020-01-01\nGuest: Guest {i % 97}\n\n" +
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(150, 300)))
+            for i in range(count)]
+
+async def run_engine(client, texts, concurrency, max_inputs=None):
+    counter = get_token_counter("approx")
+    if max_inputs:
+        batches = pack_batches(texts, counter, max_tokens=float("inf"), max_inputs=max_inputs)
+    else:
+        batches = pack_batches(texts, counter)
+    engine = EmbeddingEngine(openai_sender(client, MODEL), counter, max_concurrency=concurrency)
+    results = {}
+
+    def on_result(batch_texts, vectors):
+        results.update(zip(batch_texts, vectors))
+
+    await engine.run(batches, on_result)
+    engine.stats.report(engine.limiter)
+    assert len(results) + len(engine.failed) == len(texts), "Some texts were neither embedded nor reported failed"
+    return engine.stats
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the async embedding engine against a local stub.")
+    arg_parser.add_argument("--chunks", type=int, default=5000)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--rpm", type=int, default=3000)
+    arg_parser.add_argument("--tpm", type=int, default=1_000_000)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0)
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    texts = synthetic_chunks(args.chunks)
+
+    results = {}
+    for name, concurrency, max_inputs in [("sequential, 50 per request", 1, LEGACY_BATCH_SIZE),
+                                          ("async engine, token-packed", args.concurrency, None)]:
+        # Fresh stub per run so both start with a full rate-limit allowance
+        server, state = start_server(rpm=args.rpm, tpm=args.tpm, error_rate=args.error_rate)
+        client = AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+        print(f"\n{name}:")
+        started = time.time()
+        stats = asyncio.run(run_engine(client, texts, concurrency, max_inputs))
+        results[name] = stats.chunks / (time.time() - started)
+        print(f"Stub answered {state.served} requests, rejected {state.rejected} with 429.")
+        server.shutdown()
+
+    baseline, engine = results.values()
+    print(f"\nSpeedup: {engine / baseline:.2f}x ({baseline:.1f} -> {engine:.1f} chunks/s)")
+
+if __name__ == "__main__":
+    main()
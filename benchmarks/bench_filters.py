@@ -0,0 +1,80 @@
+"""
+Measures metadata-filtered search (retrieval.make_filters) on the in-process NumPy backend: for
+stored chunks nudged off their vectors, compares unfiltered top-k search with searches filtered
+by year range, guest and speaker. Reports the share of the index each filter lets through,
+search latency, and the cost of a post-filter (search unfiltered, drop non-matching hits) in
+results lost.
+
+Usage: python benchmarks/bench_filters.py [--queries 200] [--k 10]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from episode_store import EpisodeStore
+from retrieval import NumpyBackend, make_filters
+
+def percentiles(values):
+    values = sorted(values)
+    return values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark metadata-filtered vector search.")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=10)
+    return arg_parser.parse_args()
+
+def sample_filters(fields):
+    """A few filters of different selectivity, built from the values in the store."""
+    records = list(fields.values())
+    years = sorted({time.gmtime(record['date_ts']).tm_year for record in records if record['date_ts'] is not None})
+    guests = Counter(record['guest'] for record in records if record['guest'])
+    speakers = Counter(speaker for record in records for speaker in record['speakers'])
+    filters = [("none", None)]
+    if years:
+        middle = years[len(years) // 2]
+        filters.append((f"{middle}-{years[-1]}", make_filters(date_from=str(middle))))
+        filters.append((f"{middle}", make_filters(date_from=str(middle), date_to=str(middle))))
+    if guests:
+        guest = guests.most_common()[len(guests) // 2][0]
+        filters.append((f"guest {guest}", make_filters(guest=guest)))
+    if speakers:
+        speaker = speakers.most_common()[min(1, len(speakers) - 1)][0]
+        filters.append((f"speaker {speaker}", make_filters(speaker=speaker)))
+    return filters
+
+def main():
+    args = parse_args()
+    fields = EpisodeStore(read_only=True).filter_fields()
+    backend = NumpyBackend(filter_fields=fields)
+    if len(backend) == 0:
+        print("No vectors to search. Run 05_embed.py first.")
+        return
+
+    rng = np.random.default_rng(7)
+    rows = rng.choice(len(backend), size=min(args.queries, len(backend)), replace=False)
+    queries = np.asarray(backend.matrix[np.sort(rows)], dtype=np.float32)
+    queries += rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+
+    print(f"\n{'filter':<28} {'rows':>7} {'p50 ms':>8} {'p99 ms':>8} {'post-filter hits':>17}")
+    for label, filters in sample_filters(fields):
+        mask = backend.filter_mask(filters) if filters else np.ones(len(backend), dtype=bool)
+        latencies, kept = [], []
+        for query in queries:
+            started = time.perf_counter()
+            backend.search(query, args.k, filters=filters)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # Post-filtering instead: an unfiltered top k, minus the hits the filter rejects
+            kept.append(sum(mask[hit.id] for hit in backend.search(query, args.k)))
+        p50, p99 = percentiles(latencies)
+        print(f"{label[:28]:<28} {mask.mean():>7.1%} {p50:>8.2f} {p99:>8.2f} {np.mean(kept):>9.1f} of {args.k}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures the BM25 side of hybrid search (lexical_index.py): p50/p99 latency of a lexical query
+and of the reciprocal rank fusion step, and how much hybrid changes the top-k of vector-only search.
+
+Queries are built from the corpus itself: a few of the rarer words of a random chunk (names and
+jargon), paired with that chunk's stored vector nudged off its position as the query embedding.
+Vector search runs in process (NumPy backend), so no Qdrant server or API key is needed.
+
+Usage: python benchmarks/bench_lexical.py [--queries 200] [--k 8] [--words 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from episode_store import EpisodeStore
+from lexical_index import LexicalIndex, tokenize
+from retrieval import NumpyBackend, CANDIDATE_MULTIPLIER, reciprocal_rank_fusion
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+def rare_words(index, text, count):
+    """The query words a user would type about this chunk: its least frequent indexed terms."""
+    terms = {term for term in tokenize(text) if term in index.terms}
+    return sorted(terms, key=lambda term: -index.idf[index.terms[term]])[:count]
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark BM25 lookups and hybrid fusion.")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=8)
+    arg_parser.add_argument("--words", type=int, default=4, help="Words per lexical query.")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    started = time.time()
+    index = LexicalIndex()
+    print(f"Lexical index: {len(index)} chunks, {index.meta['terms']} terms, "
+          f"{index.meta['postings']} postings, loaded in {(time.time() - started) * 1000:.1f}ms")
+    backend = NumpyBackend()
+    if len(backend) == 0 or len(index) == 0:
+        print("Nothing to search. Run 04_chunk.py and 05_embed.py first.")
+        return
+
+    store = EpisodeStore(read_only=True)
+    rng = np.random.default_rng(7)
+    rows = np.sort(rng.choice(len(backend), size=min(args.queries, len(backend)), replace=False))
+    chunks = store.get_chunks([backend.source_ids[row] for row in rows])
+    texts = [" ".join(rare_words(index, chunks[backend.source_ids[row]]["text"], args.words))
+             if backend.source_ids[row] in chunks else "" for row in rows]
+    vectors = np.asarray(backend.matrix[rows], dtype=np.float32)
+    vectors += rng.standard_normal(vectors.shape).astype(np.float32) * 0.02
+
+    depth = args.k * CANDIDATE_MULTIPLIER
+    lexical_ms, fusion_ms, overlaps = [], [], []
+    for text, vector in zip(texts, vectors):
+        vector_hits = backend.search(vector, depth)
+
+        started = time.perf_counter()
+        lexical_hits = index.search(text, depth)
+        lexical_ms.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], args.k)
+        fusion_ms.append((time.perf_counter() - started) * 1000)
+
+        vector_only = {hit.payload['source_id'] for hit in vector_hits[:args.k]}
+        overlaps.append(len(vector_only & {hit.payload['source_id'] for hit in fused}) / args.k)
+
+    print(f"\n{'step':<10} {'p50':>9} {'p99':>9}")
+    for name, latencies in (("bm25", lexical_ms), ("fusion", fusion_ms)):
+        p50, p99 = percentiles(latencies)
+        print(f"{name:<10} {p50:>7.2f}ms {p99:>7.2f}ms")
+    print(f"\nTop-{args.k} overlap, hybrid vs vector-only: {np.mean(overlaps):.3f}")
+
+if __name__ == "__main__":
+    main()
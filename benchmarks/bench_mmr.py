@@ -0,0 +1,79 @@
+"""
+Measures MMR diversity re-ranking (retrieval.mmr_rerank) on the vector store: for stored chunks
+nudged off their vectors, compares plain top-k search with MMR over MMR_CANDIDATE_MULTIPLIER * k
+candidates. Reports distinct episodes per result list, mean pairwise similarity of the hits
+(redundancy) and the latency MMR adds (search with vectors + re-rank).
+
+Usage: python benchmarks/bench_mmr.py [--queries 200] [--k 15] [--mmr-k 8 10 15]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from retrieval import NumpyBackend, MMR_CANDIDATE_MULTIPLIER, mmr_rerank
+
+def percentiles(values):
+    values = sorted(values)
+    return values[len(values) // 2], values[min(len(values) - 1, int(len(values) * 0.99))]
+
+def redundancy(backend, hits):
+    """Mean cosine similarity between the hits' vectors (lower = more diverse)."""
+    if len(hits) < 2:
+        return 0.0
+    vectors = np.asarray(backend.matrix[[hit.id for hit in hits]], dtype=np.float32)
+    similarity = vectors @ vectors.T
+    return float((similarity.sum() - np.trace(similarity)) / (len(hits) * (len(hits) - 1)))
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark MMR diversity re-ranking.")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--k", type=int, default=15, help="top_k of plain search.")
+    arg_parser.add_argument("--mmr-k", type=int, nargs="+", default=[8, 10, 15], help="Final top_k values after MMR.")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    backend = NumpyBackend()
+    if len(backend) == 0:
+        print("No vectors to search. Run 05_embed.py first.")
+        return
+
+    rng = np.random.default_rng(7)
+    rows = rng.choice(len(backend), size=min(args.queries, len(backend)), replace=False)
+    queries = np.asarray(backend.matrix[np.sort(rows)], dtype=np.float32)
+    queries += rng.standard_normal(queries.shape).astype(np.float32) * 0.02
+
+    print(f"\n{'ranking':<14} {'episodes':>9} {'redundancy':>11} {'search p50':>11} {'MMR p50':>9} {'MMR p99':>9}")
+    search_ms, episodes, similarity = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        hits = backend.search(query, args.k)
+        search_ms.append((time.perf_counter() - started) * 1000)
+        episodes.append(len({hit.payload['episode_id'] for hit in hits}))
+        similarity.append(redundancy(backend, hits))
+    print(f"{f'top {args.k}':<14} {np.mean(episodes):>9.1f} {np.mean(similarity):>11.3f} "
+          f"{percentiles(search_ms)[0]:>9.2f}ms {'-':>9} {'-':>9}")
+
+    for k in args.mmr_k:
+        search_ms, mmr_ms, episodes, similarity = [], [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            candidates = backend.search(query, k * MMR_CANDIDATE_MULTIPLIER, with_vectors=True)
+            search_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            hits = mmr_rerank(query, candidates, k)
+            mmr_ms.append((time.perf_counter() - started) * 1000)
+            episodes.append(len({hit.payload['episode_id'] for hit in hits}))
+            similarity.append(redundancy(backend, hits))
+        mmr_p50, mmr_p99 = percentiles(mmr_ms)
+        print(f"{f'MMR top {k}':<14} {np.mean(episodes):>9.1f} {np.mean(similarity):>11.3f} "
+              f"{percentiles(search_ms)[0]:>9.2f}ms {mmr_p50:>7.2f}ms {mmr_p99:>7.2f}ms")
+
+if __name__ == "__main__":
+    main()
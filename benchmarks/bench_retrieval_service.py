@@ -0,0 +1,88 @@
+"""
+Load test for the retrieval service (retrieval_service.py): distinct questions from N concurrent
+callers, with the embeddings API played by the local stub server. Reports throughput, latency,
+embeddings API calls, mean batch sizes and queue waits, one caller vs many.
+
+Searches the vector store in process (NumPy backend); run 04_chunk.py and 05_embed.py first.
+With --http the callers go through the HTTP service and RetrievalClient, as the front ends do
+when RETRIEVAL_SERVICE_URL is set.
+
+Usage: python benchmarks/bench_retrieval_service.py [--queries 200] [--concurrency 1 8 32] [--latency 0.2] [--http]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from openai import AsyncOpenAI
+
+from episode_store import EpisodeStore
+from lexical_index import load_lexical_index
+from retrieval import NumpyBackend
+from retrieval_service import RetrievalService, LocalRetrieval, RetrievalClient, make_handler, describe_service
+from stub_embedding_server import start_server
+
+TOPICS = ["voting", "trade", "prices", "Hayek", "Adam Smith", "institutions", "incentives", "emergent order"]
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the retrieval service under concurrent load.")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="Stub seconds per embeddings call.")
+    arg_parser.add_argument("--http", action="store_true", help="Go through the HTTP service.")
+    return arg_parser.parse_args()
+
+def run(retrieval, questions, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(retrieval.retrieve, questions))
+    return time.perf_counter() - started
+
+def main():
+    args = parse_args()
+    stub, _ = start_server(latency=args.latency, latency_per_1k_tokens=0.0)
+    backend = NumpyBackend()
+    if len(backend) == 0:
+        print("No vectors to search. Run 05_embed.py first.")
+        return
+    lexical_index = load_lexical_index()
+
+    print(f"\n{'callers':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'API calls':>10} "
+          f"{'embed batch':>12} {'search batch':>13} {'wait p50 ms':>12}")
+    for concurrency in args.concurrency:
+        # A fresh service per run: empty caches, fresh metrics
+        service = RetrievalService(
+            backend, EpisodeStore(read_only=True),
+            AsyncOpenAI(api_key="stub", base_url=f"http://127.0.0.1:{stub.server_port}/v1"),
+            lexical_index=lexical_index, hybrid=lexical_index is not None
+        )
+        local = LocalRetrieval(service)
+        retrieval, server = local, None
+        if args.http:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(local))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            retrieval = RetrievalClient(f"http://127.0.0.1:{server.server_port}")
+
+        questions = [f"What did guest {concurrency}-{i} say about {TOPICS[i % len(TOPICS)]}?"
+                     for i in range(args.queries)]
+        elapsed = run(retrieval, questions, concurrency)
+        stats = local.stats()
+        if server:
+            server.shutdown()
+
+        embedding = stats["embedding_batches"]
+        print(f"{concurrency:>8} {len(questions) / elapsed:>8.1f} {stats['p50_latency_ms']:>8} {stats['p99_latency_ms']:>8} "
+              f"{stats['embedding_api_calls']:>10} {embedding['mean_batch_size']:>12.1f} "
+              f"{stats['search_batches']['mean_batch_size']:>13.1f} {embedding['p50_queue_wait_ms']:>12}")
+        print(f"{'':>8} {describe_service(stats)}")
+    stub.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares blocking and streamed chat completions against the local stub server: how long until
+the user sees the first text (the whole answer when blocking, the first token when streaming)
+and the total generation time, using chat_stream.stream_chat() as the front ends do.
+
+Usage: python benchmarks/bench_streaming.py [--requests 10] [--first-token-latency 0.5] [--token-interval 0.02]
+"""
+import argparse
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+
+from openai import OpenAI
+
+from chat_stream import GenerationLog, stream_chat
+from stub_embedding_server import start_server
+
+def p50(values):
+    return sorted(values)[len(values) // 2]
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Benchmark blocking vs streamed generation against the stub.")
+    arg_parser.add_argument("--requests", type=int, default=10)
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.5)
+    arg_parser.add_argument("--token-interval", type=float, default=0.02)
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    server, _ = start_server(first_token_latency=args.first_token_latency, token_interval=args.token_interval)
+    client = OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    messages = [
+        {"role": "system", "content": "You are an expert research assistant for the 'EconTalk' podcast archives."},
+        {"role": "user", "content": "Context:\n" + "Some transcript text. " * 2000 + "\n\nQuestion: What did Mike Munger say about voting?"}
+    ]
+
+    blocking = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        client.chat.completions.create(model="gpt-4o", messages=messages, temperature=0.3)
+        blocking.append(time.perf_counter() - started)
+
+    log = GenerationLog()
+    for _ in range(args.requests):
+        for _ in stream_chat(client, "gpt-4o", messages, log=log, temperature=0.3):
+            pass
+    stats = log.stats()
+    server.shutdown()
+
+    print(f"\n{'mode':<10} {'first text (p50)':>17} {'total (p50)':>12}")
+    print(f"{'blocking':<10} {p50(blocking):>16.2f}s {p50(blocking):>11.2f}s")
+    print(f"{'streaming':<10} {stats['p50_first_token_seconds']:>16.2f}s {stats['p50_total_seconds']:>11.2f}s")
+
+if __name__ == "__main__":
+    main()
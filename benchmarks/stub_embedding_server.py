@@ -0,0 +1,248 @@
+"""
+A local stand-in for OpenAI's /v1/embeddings endpoint, for testing 05_embed.py and the
+embedding engine without an API key or any cost.
+
+Returns deterministic vectors (seeded by the text), simulates latency, enforces request/token
+per-minute limits with the same x-ratelimit-* headers and 429s as the real API, rejects
+over-sized batches with a 400, and can inject random 500s.
+
+Also serves /v1/chat/completions with a canned answer, streamed (stream=True, server-sent events)
+one word per chunk after --first-token-latency (plus --prefill-per-1k-tokens of prompt), every
+--token-interval seconds, so the streaming front ends can be exercised without the API.
+
+Usage:
+    python benchmarks/stub_embedding_server.py --port 8808 --rpm 3000 --tpm 1000000
+    python scripts/05_embed.py --base-url http://127.0.0.1:8808/v1
+    OPENAI_BASE_URL=http://127.0.0.1:8808/v1 python rag_app.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VECTOR_SIZE = 1536
+MAX_INPUTS = 2048
+MAX_REQUEST_TOKENS = 300_000
+
+# Words of filler in each chat answer, after a line echoing the question
+ANSWER_WORDS = 150
+
+def count_tokens(text):
+    # Roughly 4 characters per token for English
+    return max(1, len(text) // 4)
+
+def format_reset(seconds):
+    if seconds < 1:
+        return f"{int(seconds * 1000)}ms"
+    return f"{seconds:.1f}s"
+
+def fake_vector(text, size):
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(size)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+class Bucket:
+    """Refills continuously to `per_minute` (how OpenAI's limits behave)."""
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reset_seconds(self):
+        return (self.capacity - self.level) / self.rate
+
+def fake_answer(messages):
+    question = messages[-1]["content"].rsplit("Question:", 1)[-1].strip()
+    context_chars = sum(len(message["content"]) for message in messages)
+    rng = random.Random(question)
+    filler = " ".join(rng.choice(["markets", "incentives", "knowledge", "prices", "trade", "emergent",
+                                  "order", "institutions", "Hayek", "Smith", "voting", "rules"])
+                      for _ in range(ANSWER_WORDS))
+    return f"Stub answer to \"{question}\" ({context_chars} characters of prompt).\n\n{filler}."
+
+class StubState:
+    def __init__(self, rpm, tpm, latency, latency_per_1k_tokens, error_rate,
+                 first_token_latency=0.5, token_interval=0.02, prefill_per_1k_tokens=0.0):
+        self.requests = Bucket(rpm)
+        self.tokens = Bucket(tpm)
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.error_rate = error_rate
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.prefill_per_1k_tokens = prefill_per_1k_tokens
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self, tokens):
+        """Returns (admitted, rate-limit headers)."""
+        with self.lock:
+            self.requests.refill()
+            self.tokens.refill()
+            admitted = self.requests.level >= 1 and self.tokens.level >= tokens
+            if admitted:
+                self.requests.level -= 1
+                self.tokens.level -= tokens
+                self.served += 1
+            else:
+                self.rejected += 1
+            headers = {
+                "x-ratelimit-limit-requests": str(self.requests.capacity),
+                "x-ratelimit-limit-tokens": str(self.tokens.capacity),
+                "x-ratelimit-remaining-requests": str(int(self.requests.level)),
+                "x-ratelimit-remaining-tokens": str(int(self.tokens.level)),
+                "x-ratelimit-reset-requests": format_reset(self.requests.reset_seconds()),
+                "x-ratelimit-reset-tokens": format_reset(self.tokens.reset_seconds()),
+            }
+            if not admitted:
+                wait = max((1 - self.requests.level) / self.requests.rate,
+                           (tokens - self.tokens.level) / self.tokens.rate, 0.0)
+                headers["retry-after-ms"] = str(int(wait * 1000) + 1)
+            return admitted, headers
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_error_json(self, status, message, headers=None, code=None):
+            self.send_json(status, {"error": {"message": message, "type": "invalid_request_error", "code": code}}, headers)
+
+        def send_event(self, data):
+            self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        def chat_completion(self, body):
+            tokens = sum(count_tokens(message["content"]) for message in body["messages"])
+            admitted, headers = state.admit(tokens)
+            if not admitted:
+                return self.send_error_json(429, "Rate limit reached.", headers, code="rate_limit_exceeded")
+
+            answer = fake_answer(body["messages"])
+            created = int(time.time())
+            # Longer prompts take longer to read before the first token
+            time.sleep(state.first_token_latency + state.prefill_per_1k_tokens * tokens / 1000)
+            if not body.get("stream"):
+                time.sleep(state.token_interval * len(answer.split(" ")))
+                return self.send_json(200, {
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": tokens, "completion_tokens": count_tokens(answer),
+                              "total_tokens": tokens + count_tokens(answer)}
+                }, headers)
+
+            # Server-sent events: one chunk per word, then a finish chunk and [DONE]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            words = answer.split(" ")
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                if i == 0:
+                    delta["role"] = "assistant"
+                self.send_event(json.dumps({
+                    "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                    "model": body.get("model"), "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+                }))
+                time.sleep(state.token_interval)
+            self.send_event(json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                "model": body.get("model"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            }))
+            self.send_event("[DONE]")
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if self.path.rstrip('/').endswith("/chat/completions"):
+                return self.chat_completion(body)
+            if not self.path.rstrip('/').endswith("/embeddings"):
+                return self.send_error_json(404, f"Unknown path {self.path}")
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            tokens = sum(count_tokens(text) for text in texts)
+
+            if len(texts) > MAX_INPUTS or tokens > MAX_REQUEST_TOKENS:
+                return self.send_error_json(400, f"Too many inputs or tokens in one request ({len(texts)} inputs, {tokens} tokens).")
+
+            admitted, headers = state.admit(tokens)
+            if not admitted:
+                return self.send_error_json(429, "Rate limit reached.", headers, code="rate_limit_exceeded")
+
+            time.sleep(state.latency + state.latency_per_1k_tokens * tokens / 1000)
+            if random.random() < state.error_rate:
+                return self.send_error_json(500, "Injected server error.", headers)
+
+            size = body.get("dimensions") or VECTOR_SIZE
+            data = []
+            for i, text in enumerate(texts):
+                vector = fake_vector(text, size)
+                if body.get("encoding_format") == "base64":
+                    vector = base64.b64encode(array('f', vector).tobytes()).decode('ascii')
+                data.append({"object": "embedding", "index": i, "embedding": vector})
+            self.send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+            }, headers)
+    return Handler
+
+def start_server(port=0, rpm=3000, tpm=1_000_000, latency=0.2, latency_per_1k_tokens=0.01, error_rate=0.0,
+                 first_token_latency=0.5, token_interval=0.02, prefill_per_1k_tokens=0.0):
+    """Starts the stub in a background thread. Returns (server, state); base URL is http://127.0.0.1:<port>/v1."""
+    state = StubState(rpm, tpm, latency, latency_per_1k_tokens, error_rate, first_token_latency, token_interval,
+                      prefill_per_1k_tokens)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Local OpenAI-compatible embeddings and chat stub.")
+    arg_parser.add_argument("--port", type=int, default=8808)
+    arg_parser.add_argument("--rpm", type=int, default=3000, help="Requests per minute before 429s.")
+    arg_parser.add_argument("--tpm", type=int, default=1_000_000, help="Tokens per minute before 429s.")
+    arg_parser.add_argument("--latency", type=float, default=0.2, help="Base seconds per request.")
+    arg_parser.add_argument("--latency-per-1k-tokens", type=float, default=0.01)
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500.")
+    arg_parser.add_argument("--first-token-latency", type=float, default=0.5, help="Seconds before a chat answer starts.")
+    arg_parser.add_argument("--token-interval", type=float, default=0.02, help="Seconds between streamed chat chunks.")
+    arg_parser.add_argument("--prefill-per-1k-tokens", type=float, default=0.0,
+                            help="Extra seconds before a chat answer starts per 1,000 prompt tokens.")
+    return arg_parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    server, state = start_server(args.port, args.rpm, args.tpm, args.latency, args.latency_per_1k_tokens, args.error_rate,
+                                 args.first_token_latency, args.token_interval, args.prefill_per_1k_tokens)
+    print(f"Stub OpenAI API on http://127.0.0.1:{server.server_port}/v1 (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"\nServed {state.served} requests, rejected {state.rejected} with 429.")
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import deque
+
+# Per-request timings kept for the p50 figures in GenerationLog.stats()
+TIMING_WINDOW = 1000
+
+class GenerationLog:
+    """Time-to-first-token and total generation time of every streamed answer."""
+    def __init__(self, window=TIMING_WINDOW):
+        self.records = deque(maxlen=window)  # (first_token_seconds, total_seconds)
+        self.lock = threading.Lock()
+
+    def record(self, first_token_seconds, total_seconds):
+        with self.lock:
+            self.records.append((first_token_seconds, total_seconds))
+
+    def last(self):
+        with self.lock:
+            return self.records[-1] if self.records else None
+
+    def stats(self):
+        with self.lock:
+            first_tokens = sorted(record[0] for record in self.records)
+            totals = sorted(record[1] for record in self.records)
+        middle = len(totals) // 2
+        return {
+            "requests": len(totals),
+            "p50_first_token_seconds": first_tokens[middle] if totals else None,
+            "p50_total_seconds": totals[middle] if totals else None
+        }
+
+def describe_timing(first_token_seconds, total_seconds):
+    return f"first token {first_token_seconds:.2f}s, total {total_seconds:.2f}s"
+
+def stream_chat(client, model, messages, log=None, timing=None, **kwargs):
+    """
+    Streams a chat completion, yielding the answer text piece by piece as it arrives.
+
+    Once the stream ends, the time to the first piece of text and the total time (both from
+    sending the request) are recorded in log, and stored in the timing dict if one is given.
+    """
+    started = time.perf_counter()
+    first_token = None
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            yield delta
+
+    total = time.perf_counter() - started
+    first_token = first_token if first_token is not None else total
+    if log is not None:
+        log.record(first_token, total)
+    if timing is not None:
+        timing.update(first_token_seconds=first_token, total_seconds=total)
@@ -0,0 +1,88 @@
+import os
+
+from qdrant_client.models import (
+    Distance, VectorParams, HnswConfigDiff, SearchParams, QuantizationSearchParams,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig
+)
+
+# Profile used by 06_load_db.py and the front ends unless QDRANT_PROFILE overrides it (they must
+# agree, since the search parameters only make sense for the collection layout they were tuned for)
+DEFAULT_PROFILE = "default"
+
+def configured_profile():
+    """
+    The profile named by QDRANT_PROFILE, else DEFAULT_PROFILE. Read at call time: the front ends
+    import this module before load_dotenv() runs.
+    """
+    return os.getenv("QDRANT_PROFILE", DEFAULT_PROFILE)
+
+# Named collection layouts. "quantization": None, "scalar" (int8, 4x smaller) or "binary"
+# (1 bit per dimension, 32x smaller; works well on 1536-dim OpenAI embeddings). Quantized vectors
+# stay in RAM while the originals can live on disk, and are used to rescore the oversampled top hits.
+PROFILES = {
+    "default": {
+        "description": "Everything in RAM, no quantization (the original layout)",
+        "m": 16, "ef_construct": 100, "quantization": None,
+        "on_disk": False, "on_disk_payload": False,
+        "hnsw_ef": 128, "oversampling": None,
+    },
+    "high_recall": {
+        "description": "Denser HNSW graph and wider search, everything in RAM",
+        "m": 32, "ef_construct": 256, "quantization": None,
+        "on_disk": False, "on_disk_payload": False,
+        "hnsw_ef": 256, "oversampling": None,
+    },
+    "scalar": {
+        "description": "int8 quantized vectors in RAM, originals on disk, rescored",
+        "m": 16, "ef_construct": 100, "quantization": "scalar",
+        "on_disk": True, "on_disk_payload": False,
+        "hnsw_ef": 128, "oversampling": 2.0,
+    },
+    "binary": {
+        "description": "Binary quantized vectors in RAM, originals on disk, rescored",
+        "m": 16, "ef_construct": 100, "quantization": "binary",
+        "on_disk": True, "on_disk_payload": False,
+        "hnsw_ef": 128, "oversampling": 3.0,
+    },
+    "low_memory": {
+        "description": "Scalar quantization; vectors, payloads and HNSW graph on disk",
+        "m": 16, "ef_construct": 100, "quantization": "scalar",
+        "on_disk": True, "on_disk_payload": True, "hnsw_on_disk": True,
+        "hnsw_ef": 128, "oversampling": 2.0,
+    },
+}
+
+def get_profile(name=DEFAULT_PROFILE):
+    if name not in PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}'. Choose from: {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+def collection_config(name, vector_size):
+    """Keyword arguments for client.create_collection() under the given profile."""
+    profile = get_profile(name)
+    quantization = None
+    if profile["quantization"] == "scalar":
+        quantization = ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True
+        ))
+    elif profile["quantization"] == "binary":
+        quantization = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+
+    return {
+        "vectors_config": VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=profile["on_disk"]),
+        "hnsw_config": HnswConfigDiff(m=profile["m"], ef_construct=profile["ef_construct"],
+                                      on_disk=profile.get("hnsw_on_disk", False)),
+        "quantization_config": quantization,
+        "on_disk_payload": profile["on_disk_payload"],
+    }
+
+def search_params(name=DEFAULT_PROFILE, hnsw_ef=None, oversampling=None, exact=False):
+    """SearchParams matching the profile; hnsw_ef / oversampling override the profile's values."""
+    profile = get_profile(name)
+    quantization = None
+    if profile["quantization"]:
+        quantization = QuantizationSearchParams(
+            rescore=True, oversampling=oversampling or profile["oversampling"]
+        )
+    return SearchParams(hnsw_ef=hnsw_ef or profile["hnsw_ef"], exact=exact, quantization=quantization)
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+from episode_store import episode_header
+from token_counter import get_token_counter
+
+# Tokens of context (headers included) the packed prompt may carry (env CONTEXT_TOKEN_BUDGET)
+CONTEXT_TOKEN_BUDGET = 4000
+
+# Chunk bodies are speaker turns joined by a blank line (04_chunk.py)
+TURN_SEPARATOR = "\n\n"
+
+# Between passages of one episode that aren't adjacent in the transcript
+GAP_MARKER = "[...]"
+
+def context_token_budget():
+    """CONTEXT_TOKEN_BUDGET from the environment, read at call time (the front ends load .env after importing this)."""
+    return int(os.getenv("CONTEXT_TOKEN_BUDGET", str(CONTEXT_TOKEN_BUDGET)))
+
+def format_hits(hits):
+    """Every hit verbatim, one block each: the context as it was before packing."""
+    context_parts = []
+    for hit in hits:
+        if 'metadata' not in hit.payload:
+            # Not in the episode store (a chunk replaced since the collection was loaded)
+            continue
+        meta = hit.payload['metadata']
+        context_parts.append(f"--- EPISODE: {meta['title']} ({meta['date']}) ---\n{hit.payload['text']}\n")
+    return "\n".join(context_parts)
+
+def split_turns(hit):
+    """The hit's speaker turns, without the episode header repeated at the top of every chunk."""
+    text = hit.payload['text']
+    header = episode_header(hit.payload['metadata'])
+    if text.startswith(header):
+        text = text[len(header):]
+    return text.split(TURN_SEPARATOR)
+
+def merge_turns(turns, following):
+    """Appends the next chunk's turns, minus the ones it repeats from the end of this one (chunk overlap)."""
+    for k in range(min(len(turns), len(following)), 0, -1):
+        if turns[-k:] == following[:k]:
+            return turns + following[k:]
+    return turns + following
+
+def build_passages(hits):
+    """
+    Groups hits by episode and merges runs of consecutive chunks (by position) into passages:
+    {"meta", "position", "score" (best hit), "spans", "turns"}, in transcript order per episode.
+    spans holds each merged hit's (first, end) range of new turns, so a passage cut short can
+    tell which hits still made it in.
+    """
+    episodes = {}
+    for hit in hits:
+        if 'metadata' in hit.payload:
+            episodes.setdefault(hit.payload['metadata']['url'], []).append(hit)
+
+    passages = []
+    for episode_hits in episodes.values():
+        episode_hits.sort(key=lambda hit: hit.payload.get('position', 0))
+        passage = None
+        for hit in episode_hits:
+            position = hit.payload.get('position')
+            if passage and position is not None and passage['end'] is not None and position == passage['end'] + 1:
+                first = len(passage['turns'])
+                passage['turns'] = merge_turns(passage['turns'], split_turns(hit))
+                passage['score'] = max(passage['score'], hit.score)
+                passage['spans'].append((first, len(passage['turns'])))
+            else:
+                turns = split_turns(hit)
+                passage = {"meta": hit.payload['metadata'], "position": position, "score": hit.score,
+                           "spans": [(0, len(turns))], "turns": turns}
+                passages.append(passage)
+            passage['end'] = position
+    return passages
+
+def hits_kept(passage, kept):
+    """Hits of a passage with turns among its first `kept` (one whose turns were all overlap counts once the rest is in)."""
+    return sum(1 for first, end in passage['spans'] if first < kept or end <= kept)
+
+def group_header(meta):
+    """Title and date once, in the delimiter line format_hits uses, then the guest."""
+    return f"--- EPISODE: {meta['title']} ({meta['date']}) ---\nGuest: {meta['guest']}\n\n"
+
+def pack_context(hits, budget=None, counter=None):
+    """
+    Packs the hits into the LLM context: one block per episode (header once), consecutive chunks
+    merged without their overlapping turns, episodes ordered by their best score. Passages are
+    taken best-first while they fit the token budget; the first one that doesn't is cut at a turn.
+
+    budget defaults to context_token_budget(). Returns (context_text, report) with the token
+    counts before and after packing.
+    """
+    started = time.perf_counter()
+    budget = budget if budget is not None else context_token_budget()
+    counter = counter or get_token_counter()
+    passages = build_passages(hits)
+
+    used = 0
+    selected = {}  # url -> passages that fit
+    for passage in sorted(passages, key=lambda passage: -passage['score']):
+        url = passage['meta']['url']
+        cost = 0 if url in selected else counter.count(group_header(passage['meta']))
+        turns = []
+        for turn in passage['turns']:
+            turn_tokens = counter.count(turn + TURN_SEPARATOR)
+            if used + cost + turn_tokens > budget:
+                break
+            turns.append(turn)
+            cost += turn_tokens
+        if turns:
+            selected.setdefault(url, []).append(dict(passage, turns=turns))
+            used += cost
+
+    # Episodes by best score; passages in transcript order within an episode
+    groups = sorted(selected.values(), key=lambda group: -max(passage['score'] for passage in group))
+    blocks = []
+    for group in groups:
+        group.sort(key=lambda passage: passage['position'] if passage['position'] is not None else 0)
+        body = f"{TURN_SEPARATOR}{GAP_MARKER}{TURN_SEPARATOR}".join(
+            TURN_SEPARATOR.join(passage['turns']) for passage in group
+        )
+        blocks.append(f"{group_header(group[0]['meta'])}{body}\n")
+    context_text = "\n".join(blocks)
+
+    unpacked = format_hits(hits)
+    tokens_before = counter.count(unpacked)
+    tokens_after = counter.count(context_text)
+    report = {
+        "hits": len(hits),
+        "hits_used": sum(hits_kept(passage, len(passage['turns'])) for group in groups for passage in group),
+        "episodes": len(groups),
+        "passages": sum(len(group) for group in groups),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "chars_before": len(unpacked),
+        "chars_after": len(context_text),
+        "pack_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+    return context_text, report
+
+def describe_packing(report):
+    """One-line summary of a packed context, for the answer caption and CLI output."""
+    reduction = report['tokens_saved'] / report['tokens_before'] if report['tokens_before'] else 0.0
+    return (f"context {report['tokens_before']:,} -> {report['tokens_after']:,} tokens ({reduction:.0%} smaller), "
+            f"{report['hits_used']}/{report['hits']} chunks in {report['episodes']} episodes, "
+            f"packed in {report['pack_ms']} ms")
+
+class PackingLog:
+    """Running totals of context packing across requests."""
+    def __init__(self):
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.lock = threading.Lock()
+
+    def record(self, report):
+        with self.lock:
+            self.requests += 1
+            self.tokens_before += report['tokens_before']
+            self.tokens_after += report['tokens_after']
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "reduction": 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+            }
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(ROOT_DIR, "data", "embedding_cache.sqlite")
+
+# Query embeddings are evicted (least recently used first) beyond this many entries.
+# Document embeddings are never evicted: they are what a re-chunk or resume would pay for again.
+MAX_QUERY_ENTRIES = 20000
+
+KIND_DOCUMENT = "document"
+KIND_QUERY = "query"
+
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text):
+    """The exact text sent to the embedding API (and hashed for the cache key)."""
+    return WHITESPACE.sub(' ', text).strip()
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def pack_vector(vector):
+    return array('f', vector).tobytes()
+
+def unpack_vector(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model, dimensions, hash of normalized text).
+
+    Vectors are stored as float32 bytes (~6 KB for 1536 dims instead of ~30 KB of JSON).
+    Shared by 05_embed.py and the chat front ends, so identical text is only ever paid for once.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_query_entries=MAX_QUERY_ENTRIES):
+        self.path = path
+        self.max_query_entries = max_query_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, dimensions, text_hash)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(kind, last_used)")
+        self.conn.commit()
+
+    def get_many(self, model, texts, dimensions=None, kind=KIND_DOCUMENT):
+        """Returns one vector (or None on a miss) per already-normalized text."""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self.lock:
+            # Chunked to stay under SQLite's host-parameter limit
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND dimensions = ? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, dimensions or 0] + batch
+                ).fetchall()
+                found.update(rows)
+
+            if kind == KIND_QUERY and found:
+                # Keep recently asked questions from being evicted
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(time.time(), model, dimensions or 0, h) for h in found]
+                )
+                self.conn.commit()
+
+            self.hits += len([h for h in hashes if h in found])
+            self.misses += len([h for h in hashes if h not in found])
+        return [unpack_vector(found[h]) if h in found else None for h in hashes]
+
+    def put_many(self, model, texts, vectors, dimensions=None, kind=KIND_DOCUMENT):
+        now = time.time()
+        with self.lock:
+            # A document entry is never downgraded to an evictable query entry
+            self.conn.executemany("""
+                INSERT INTO embeddings (model, dimensions, text_hash, kind, vector, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(model, dimensions, text_hash) DO UPDATE SET
+                    last_used = excluded.last_used,
+                    kind = CASE WHEN embeddings.kind = 'document' THEN 'document' ELSE excluded.kind END
+            """, [(model, dimensions or 0, text_hash(text), kind, pack_vector(vector), now)
+                  for text, vector in zip(texts, vectors)])
+            if kind == KIND_QUERY:
+                self._evict_queries()
+            self.conn.commit()
+
+    def _evict_queries(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings WHERE kind = ?", (KIND_QUERY,)).fetchone()[0]
+        excess = count - self.max_query_entries
+        if excess > 0:
+            self.conn.execute("""
+                DELETE FROM embeddings WHERE rowid IN (
+                    SELECT rowid FROM embeddings WHERE kind = ? ORDER BY last_used LIMIT ?
+                )
+            """, (KIND_QUERY, excess))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        self.conn.close()
+
+def embed_with_cache(cache, texts, embed_fn, model, dimensions=None, kind=KIND_DOCUMENT):
+    """
+    Returns one vector per text, calling embed_fn(list_of_normalized_texts) only for cache misses.
+    embed_fn may return None (e.g. an API error); the result is then None as well.
+    """
+    normalized = [normalize_text(text) for text in texts]
+    vectors = cache.get_many(model, normalized, dimensions, kind)
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        # Identical texts within one call are only sent once
+        unique_texts = list(dict.fromkeys(normalized[i] for i in missing))
+        new_vectors = embed_fn(unique_texts)
+        if new_vectors is None:
+            return None
+        cache.put_many(model, unique_texts, new_vectors, dimensions, kind)
+        by_text = dict(zip(unique_texts, new_vectors))
+        for i in missing:
+            vectors[i] = by_text[normalized[i]]
+    return vectors
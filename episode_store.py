@@ -0,0 +1,219 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# Default location, shared by the pipeline scripts and the chat front ends
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(ROOT_DIR, "data", "econtalk.sqlite")
+
+def episode_header(meta):
+    """The context block at the top of every chunk (helps the embedding model and the LLM place it)."""
+    return (
+        f"Podcast: {meta['title']}\n"
+        f"Date: {meta['date']}\n"
+        f"Guest: {meta['guest']}\n\n"
+    )
+
+def date_timestamp(date, end=False):
+    """
+    Unix timestamp (UTC) of a "YYYY-MM-DD", "YYYY-MM" or "YYYY" date: its first second, or with
+    end=True its last (so "2020" as an upper bound covers all of 2020). None if it isn't one.
+    """
+    for fmt in ("%Y-%m-%d", "%Y-%m", "%Y"):
+        try:
+            start = datetime.strptime(str(date).strip()[:10], fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if not end:
+            return int(start.timestamp())
+        if fmt == "%Y":
+            following = start.replace(year=start.year + 1)
+        elif fmt == "%Y-%m":
+            following = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            following = datetime.fromtimestamp(start.timestamp() + 86400, tz=timezone.utc)
+        return int(following.timestamp()) - 1
+    return None
+
+def contextualize(meta, body):
+    """Full chunk text as embedded and shown to the LLM: episode header + dialogue."""
+    return episode_header(meta) + body
+
+class EpisodeStore:
+    """
+    Local SQLite store for episode metadata and chunk text.
+
+    Episodes get a small integer episode_id; chunks only store their dialogue and that ID.
+    Qdrant payloads and vector files carry IDs alone, and the front ends resolve text and
+    metadata here by primary key.
+    """
+    def __init__(self, path=DEFAULT_DB_PATH, read_only=False):
+        self.path = path
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_tables()
+        # Streamlit serves sessions from several threads; serialize access to the connection
+        self.lock = threading.Lock()
+
+    def _create_tables(self):
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # AUTOINCREMENT: IDs of removed episodes are never handed out again, so vector-store
+        # records and Qdrant payloads left over for them can't point at a different episode
+        episodes_table = """
+            CREATE TABLE {name} (
+                episode_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                slug TEXT UNIQUE NOT NULL,
+                url TEXT,
+                title TEXT,
+                guest TEXT,
+                date TEXT,
+                date_ts INTEGER
+            )
+        """
+        existing = self.conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'episodes'").fetchone()
+        if existing is None:
+            self.conn.execute(episodes_table.format(name="episodes"))
+        elif "AUTOINCREMENT" not in existing[0].upper():
+            # Stores created before episode IDs were AUTOINCREMENT: rebuild the table, keeping every ID
+            if "date_ts" not in self._columns("episodes"):
+                self.conn.execute("ALTER TABLE episodes ADD COLUMN date_ts INTEGER")
+            self.conn.execute(episodes_table.format(name="episodes_new"))
+            self.conn.execute("""
+                INSERT INTO episodes_new (episode_id, slug, url, title, guest, date, date_ts)
+                SELECT episode_id, slug, url, title, guest, date, date_ts FROM episodes
+            """)
+            self.conn.execute("DROP TABLE episodes")
+            self.conn.execute("ALTER TABLE episodes_new RENAME TO episodes")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                source_id TEXT PRIMARY KEY,
+                episode_id INTEGER NOT NULL REFERENCES episodes(episode_id),
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                speakers TEXT NOT NULL DEFAULT '[]'
+            )
+        """)
+        # Filter fields added after the first release; re-chunking (CHUNKER_VERSION 3) fills them in
+        for table, column, definition in (("episodes", "date_ts", "INTEGER"),
+                                          ("chunks", "speakers", "TEXT NOT NULL DEFAULT '[]'")):
+            if column not in self._columns(table):
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_episode ON chunks(episode_id, position)")
+        self.conn.commit()
+
+    def _columns(self, table):
+        return {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+    # --- Writing (04_chunk.py) ---
+    def upsert_episode(self, slug, meta):
+        """Inserts or updates an episode and returns its episode_id (stable across runs)."""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO episodes (slug, url, title, guest, date, date_ts) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(slug) DO UPDATE SET
+                    url = excluded.url, title = excluded.title, guest = excluded.guest, date = excluded.date,
+                    date_ts = excluded.date_ts
+            """, (slug, meta['url'], meta['title'], meta['guest'], meta['date'], date_timestamp(meta['date'])))
+            return self.conn.execute("SELECT episode_id FROM episodes WHERE slug = ?", (slug,)).fetchone()[0]
+
+    def replace_chunks(self, episode_id, chunks):
+        """Replaces an episode's chunks with [(source_id, body_text, speakers), ...]."""
+        with self.lock:
+            self.conn.execute("DELETE FROM chunks WHERE episode_id = ?", (episode_id,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (source_id, episode_id, position, text, speakers) VALUES (?, ?, ?, ?, ?)",
+                [(source_id, episode_id, position, text, json.dumps(speakers))
+                 for position, (source_id, text, speakers) in enumerate(chunks)]
+            )
+
+    def remove_episode(self, slug):
+        with self.lock:
+            row = self.conn.execute("SELECT episode_id FROM episodes WHERE slug = ?", (slug,)).fetchone()
+            if row:
+                self.conn.execute("DELETE FROM chunks WHERE episode_id = ?", (row[0],))
+                self.conn.execute("DELETE FROM episodes WHERE episode_id = ?", row)
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    # --- Reading (pipeline and front ends) ---
+    def episodes(self):
+        """Returns {episode_id: metadata dict} for every episode."""
+        with self.lock:
+            rows = self.conn.execute("SELECT episode_id, url, title, guest, date FROM episodes").fetchall()
+        return {row[0]: {"url": row[1], "title": row[2], "guest": row[3], "date": row[4]} for row in rows}
+
+    def slugs(self):
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT slug FROM episodes")}
+
+    def chunk_episode_ids(self):
+        """Returns {source_id: episode_id} for every chunk."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT source_id, episode_id FROM chunks"))
+
+    def filter_fields(self):
+        """
+        Returns {source_id: {"episode_id", "date_ts", "guest", "speakers"}} for every chunk: the
+        fields retrieval can filter on (Qdrant payloads, and the in-process indexes' masks).
+        """
+        with self.lock:
+            # Stores written before the filter fields existed have neither column yet
+            has_fields = "speakers" in self._columns("chunks") and "date_ts" in self._columns("episodes")
+            rows = self.conn.execute(f"""
+                SELECT c.source_id, c.episode_id, {"e.date_ts" if has_fields else "NULL"}, e.guest,
+                       {"c.speakers" if has_fields else "'[]'"}
+                FROM chunks c JOIN episodes e ON e.episode_id = c.episode_id
+            """).fetchall()
+        return {
+            source_id: {"episode_id": episode_id, "date_ts": date_ts, "guest": guest, "speakers": json.loads(speakers)}
+            for source_id, episode_id, date_ts, guest, speakers in rows
+        }
+
+    def iter_chunks(self):
+        """Yields (source_id, episode_id, full chunk text) for every chunk, in episode order."""
+        episodes = self.episodes()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT source_id, episode_id, text FROM chunks ORDER BY episode_id, position"
+            ).fetchall()
+        for source_id, episode_id, body in rows:
+            yield source_id, episode_id, contextualize(episodes[episode_id], body)
+
+    def get_chunks(self, source_ids):
+        """Returns {source_id: {"text": full chunk text, "metadata": episode metadata, "position": index in its episode}}."""
+        if not source_ids:
+            return {}
+        placeholders = ",".join("?" * len(source_ids))
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT c.source_id, c.position, c.text, e.url, e.title, e.guest, e.date
+                FROM chunks c JOIN episodes e ON e.episode_id = c.episode_id
+                WHERE c.source_id IN ({placeholders})
+            """, list(source_ids)).fetchall()
+
+        results = {}
+        for source_id, position, body, url, title, guest, date in rows:
+            meta = {"title": title, "guest": guest, "date": date, "url": url}
+            results[source_id] = {"text": contextualize(meta, body), "metadata": meta, "position": position}
+        return results
+
+    def resolve_hits(self, hits):
+        """
+        Fills text/metadata into Qdrant hit payloads, which only carry IDs. Returns the hits that
+        could be resolved: a chunk 04_chunk.py has replaced stays in Qdrant until the next delta
+        load, and is dropped here rather than handed to the front ends without text.
+        """
+        chunks = self.get_chunks([hit.payload['source_id'] for hit in hits if 'text' not in hit.payload])
+        for hit in hits:
+            if hit.payload['source_id'] in chunks:
+                hit.payload.update(chunks[hit.payload['source_id']])
+        return [hit for hit in hits if 'text' in hit.payload]
+
+    def close(self):
+        self.conn.close()
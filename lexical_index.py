@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import shutil
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from retrieval import Hit, FilterColumns
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_DIR = os.path.join(ROOT_DIR, "data", "lexical_index")
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Files inside the index directory
+META_FILE = "meta.json"               # {"docs": ..., "terms": ..., "postings": ..., "avgdl": ..., "k1": ..., "b": ...}
+TERMS_FILE = "terms.json"             # term i <-> postings offsets[i]:offsets[i + 1]
+OFFSETS_FILE = "offsets.npy"          # int64, len(terms) + 1
+POSTING_DOCS_FILE = "docs.npy"        # uint32 doc number per posting, grouped by term
+POSTING_WEIGHTS_FILE = "weights.npy"  # float16 BM25 tf component per posting (idf applied at query time)
+DOC_IDS_FILE = "doc_ids.json"         # doc number <-> chunk source_id
+EPISODE_IDS_FILE = "episode_ids.npy"  # int64 episode_id per doc, for filters
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words too common to say anything about a chunk; names and rare terms are what the index is for
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves s t don yeah um uh okay kind sort like know think really
+thing things going get got say said
+""".split())
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens minus stopwords. No stemming: names and jargon match exactly."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def _save_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def build_lexical_index(chunks, path=DEFAULT_INDEX_DIR, k1=K1, b=B):
+    """
+    Builds a BM25 index from (source_id, episode_id, text) tuples and writes it to path.
+
+    Postings are flat arrays grouped by term, so a query reads one contiguous slice per term.
+    Each posting stores its precomputed BM25 tf weight, tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)),
+    leaving one multiply-add per posting at query time. The index is written to a temporary
+    directory and swapped in, so the front ends never see a half-written index.
+    """
+    vocabulary = {}
+    term_ids, doc_numbers, frequencies = array('I'), array('I'), array('H')
+    doc_ids, episode_ids, doc_lengths = [], [], []
+
+    for doc, (source_id, episode_id, text) in enumerate(chunks):
+        tokens = tokenize(text)
+        doc_ids.append(source_id)
+        episode_ids.append(episode_id)
+        doc_lengths.append(len(tokens))
+        for term, count in Counter(tokens).items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            doc_numbers.append(doc)
+            frequencies.append(min(count, 0xFFFF))
+
+    term_ids = np.frombuffer(term_ids, dtype=np.uint32)
+    # Stable sort keeps each term's postings in doc order
+    order = np.argsort(term_ids, kind='stable')
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=offsets[1:])
+
+    lengths = np.array(doc_lengths, dtype=np.float32)
+    avgdl = float(lengths.mean()) if len(lengths) else 0.0
+    doc_norms = k1 * (1 - b + b * lengths / max(avgdl, 1.0))
+    posting_docs = np.frombuffer(doc_numbers, dtype=np.uint32)[order]
+    tf = np.frombuffer(frequencies, dtype=np.uint16)[order].astype(np.float32)
+    weights = tf * (k1 + 1) / (tf + doc_norms[posting_docs])
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, OFFSETS_FILE), offsets)
+    np.save(os.path.join(tmp_path, POSTING_DOCS_FILE), posting_docs)
+    np.save(os.path.join(tmp_path, POSTING_WEIGHTS_FILE), weights.astype(np.float16))
+    np.save(os.path.join(tmp_path, EPISODE_IDS_FILE), np.array(episode_ids, dtype=np.int64))
+    _save_json(os.path.join(tmp_path, TERMS_FILE), sorted(vocabulary, key=vocabulary.get))
+    _save_json(os.path.join(tmp_path, DOC_IDS_FILE), doc_ids)
+    _save_json(os.path.join(tmp_path, META_FILE), {
+        "docs": len(doc_ids), "terms": len(vocabulary), "postings": len(term_ids),
+        "avgdl": avgdl, "k1": k1, "b": b
+    })
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(doc_ids), len(vocabulary), len(term_ids)
+
+class LexicalIndex:
+    """
+    BM25 search over the index written by build_lexical_index().
+
+    Postings are memory-mapped; a query scores only the docs in its terms' postings
+    (a dense score array plus argpartition): a few milliseconds at most.
+    """
+    def __init__(self, path=DEFAULT_INDEX_DIR, filter_fields=None):
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No lexical index in {path}. Run 04_chunk.py first.")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, TERMS_FILE), 'r', encoding='utf-8') as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(path, DOC_IDS_FILE), 'r', encoding='utf-8') as f:
+            self.source_ids = json.load(f)
+
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        self.posting_docs = np.load(os.path.join(path, POSTING_DOCS_FILE), mmap_mode='r')
+        self.posting_weights = np.load(os.path.join(path, POSTING_WEIGHTS_FILE), mmap_mode='r')
+        self.episode_ids = np.load(os.path.join(path, EPISODE_IDS_FILE))
+        # Metadata filter columns (EpisodeStore.filter_fields()); None without them
+        self.columns = FilterColumns(self.source_ids, filter_fields) if filter_fields is not None else None
+
+        # Precomputed BM25 idf per term
+        doc_freq = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log(1 + (len(self.source_ids) - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def __len__(self):
+        return len(self.source_ids)
+
+    def search(self, query, top_k, episode_ids=None, filters=None):
+        """
+        Top-k chunks for the query text by BM25, as Hits carrying source_id/episode_id payloads.
+        episode_ids and metadata filters (retrieval.make_filters()) restrict the docs returned.
+        """
+        term_ids = [self.terms[term] for term in set(tokenize(query)) if term in self.terms]
+        if not term_ids or top_k <= 0:
+            return []
+
+        scores = np.zeros(len(self.source_ids), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.posting_docs[start:end]
+            # Each doc appears once per term's postings, so fancy-index += is safe here
+            scores[docs] += self.idf[term_id] * self.posting_weights[start:end]
+        if episode_ids:
+            scores[~np.isin(self.episode_ids, list(episode_ids))] = 0
+        if filters:
+            if self.columns is None:
+                raise ValueError("Metadata filters need the filter fields; pass filter_fields=EpisodeStore.filter_fields().")
+            scores[~self.columns.mask(filters)] = 0
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Hit(int(doc), float(scores[doc]),
+                {"source_id": self.source_ids[doc], "episode_id": int(self.episode_ids[doc])})
+            for doc in top if scores[doc] > 0
+        ]
+
+def load_lexical_index(path=DEFAULT_INDEX_DIR, filter_fields=None):
+    """The lexical index, or None (vector-only search) if 04_chunk.py hasn't built one yet."""
+    try:
+        return LexicalIndex(path, filter_fields)
+    except FileNotFoundError as e:
+        print(f"Warning: {e} Falling back to vector-only search.")
+        return None
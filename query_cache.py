@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Layer 1: normalized question -> query vector. Embeddings of a given text never change,
+# the TTL only bounds memory held by questions nobody repeats.
+QUERY_VECTOR_ENTRIES = 2048
+QUERY_VECTOR_TTL = 24 * 3600
+
+# Layer 2: question + filters + search settings + collection version -> resolved hit list.
+# The collection version is part of the key, so a reload is never answered from the old hits;
+# the TTL bounds how long a delta load that leaves the version unchanged can go unnoticed.
+RESULT_ENTRIES = 512
+RESULT_TTL = 600
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries also expire after ttl seconds.
+
+    Each entry remembers how long it took to compute, so every hit adds that to the
+    latency saved. Shared by all Streamlit sessions (one process).
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (value, expires_at, compute_seconds)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def lookup(self, key):
+        """Returns (found, value), counting a hit or a miss."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                return True, entry[0]
+            if entry:
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def store(self, key, value, compute_seconds):
+        """Caches value, noting how long it took to compute (credited as saved on every hit)."""
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl, compute_seconds)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "entries": len(self.entries)
+            }
+
+def describe(stats):
+    """One-line summary for the sidebar and CLI logs."""
+    return (f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"saved {stats['saved_seconds']:.2f}s")
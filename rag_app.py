@@ -1,14 +1,40 @@
 import os
+import time
+import argparse
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
 from openai import OpenAI
 
+from retrieval_service import connect as connect_retrieval, describe_service, EMBEDDING_MODEL, HYBRID_TOP_K, VECTOR_TOP_K
+from retrieval import make_filters
+from query_cache import describe
+from chat_stream import GenerationLog, stream_chat, describe_timing
+from context_packer import context_token_budget, PackingLog, pack_context, describe_packing
+from answer_cache import (
+    AnswerCache, answer_cache_enabled, context_key, source_entries, source_hits, describe as describe_answers
+)
+
 # --- 1. Load secrets & config ---
 # Load environment variables from the .env file
 load_dotenv()
 
-QDRANT_URL = "http://localhost:6333"  
-COLLECTION_NAME = "econtalk_episodes" 
+# Retrieval (Qdrant or NumPy backend, hybrid search, query caches) lives in retrieval_service.py:
+# a shared service when RETRIEVAL_SERVICE_URL is set, the same service in this process otherwise.
+# Its settings (QDRANT_URL, QDRANT_PATH, RETRIEVAL_BACKEND, HYBRID_SEARCH, MMR_RERANK) are read from .env too.
+
+CHAT_MODEL = "gpt-4o"
+SYSTEM_PROMPT = """
+You are an expert research assistant for the 'EconTalk' podcast archives. 
+
+Your Role:
+Answer the user's question using ONLY the provided Context (podcast transcripts).
+
+Guidelines:
+1. CITATION IS MANDATORY: Always attribute ideas to the specific guest or episode.
+2. REASONABLE INFERENCE: If an author is discussing their own book, you may treat that as the book being "recommended" or "featured."
+3. NO OUTSIDE KNOWLEDGE: Do not use external training data.
+4. TONE: Intellectual, curious, and charitable.
+"""
+
 API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Check if key exists
@@ -19,95 +45,175 @@ if not API_KEY:
 
 # Initialize clients
 try:
-    q_client = QdrantClient(url=QDRANT_URL)
-    # Test connection to ensure Docker is running
-    q_client.get_collections()
+    retrieval = connect_retrieval()
+    retrieval_info = retrieval.info()
     o_client = OpenAI(api_key=API_KEY)
 except Exception as e:
     print(f"\nConnection error: {e}")
-    print("Make sure your Docker container is running.")
+    print("Make sure your Docker container (and the retrieval service, if RETRIEVAL_SERVICE_URL is set) is running,")
+    print("and that the pipeline (04_chunk.py) has built the episode store.")
     exit(1)
 
+# Hybrid (BM25 + vector) unless HYBRID_SEARCH=0 or the lexical index is missing
+HYBRID = retrieval_info['hybrid']
+# Diversity re-ranking of the results when MMR_RERANK=1
+MMR = retrieval_info['mmr']
+
+# Metadata filters for every question of the session (--since/--until/--guest/--speaker)
+FILTERS = None
+
+# Answers to earlier questions, reused for paraphrases (ANSWER_CACHE=0 disables it)
+answer_cache = AnswerCache() if answer_cache_enabled() else None
+
+# Time to first token / total generation time of every streamed answer
+generation_log = GenerationLog()
+
+# Tokens saved by context packing
+packing_log = PackingLog()
+
 # --- Helper functions (RAG logic) ---
 def get_embedding(text):
-    text = text.replace("\n", " ")
-    return o_client.embeddings.create(input=[text], model="text-embedding-3-small").data[0].embedding
+    return retrieval.embed(text)
 
-def retrieve_context(query, top_k=15):
+def retrieve_hits(query, top_k=None, episode_ids=None, hnsw_ef=None, oversampling=None, query_vector=None,
+                  filters=None):
     """
-    Searches the vector database for the top_k most relevant chunks.
+    Searches the vector database (fused with BM25 unless HYBRID_SEARCH=0) for the top_k most relevant chunks.
+    episode_ids restricts the search to those episodes, and filters (make_filters()) to a date range,
+    guest or speaker; hnsw_ef / oversampling override the collection profile's search parameters.
+    query_vector skips the embedding lookup when the caller already has it.
     """
     print(f"Searching for: '{query}'...")
-    query_vector = get_embedding(query)
-    response = q_client.query_points(
-        collection_name=COLLECTION_NAME,
-        query=query_vector,
-        limit=top_k
-    )
-    
-    # Access the points from the response object
-    hits = response.points
-    
-    # Format the results into a single string for LLM
-    context_parts = []
-    for hit in hits:
+    return retrieval.retrieve(query, top_k=top_k, episode_ids=episode_ids, hnsw_ef=hnsw_ef,
+                              oversampling=oversampling, query_vector=query_vector, filters=filters)
+
+def format_context(hits):
+    """Packs the hits into a single string for the LLM (see pack_context()); returns (context, report)."""
+    context_text, report = pack_context(hits)
+    packing_log.record(report)
+    return context_text, report
+
+def retrieve_context(query, **search_args):
+    """The top chunks for the query (see retrieve_hits), packed into one context string."""
+    return format_context(retrieve_hits(query, **search_args))[0]
+
+def answer_context():
+    """Everything besides the question that shapes an answer; part of the answer cache key."""
+    return context_key(SYSTEM_PROMPT, CHAT_MODEL, EMBEDDING_MODEL, HYBRID_TOP_K if HYBRID else VECTOR_TOP_K, HYBRID,
+                       context_token_budget(), MMR, FILTERS)
+
+def print_sources(hits):
+    print("\nSources:")
+    for i, hit in enumerate(hits):
         meta = hit.payload['metadata']
-        text = hit.payload['text']
-        context_parts.append(f"--- EPISODE: {meta['title']} ({meta['date']}) ---\n{text}\n")
-    
-    return "\n".join(context_parts)
+        print(f"  {i+1}. {meta['title']} ({meta['date']}) [score {hit.score:.4f}]")
 
 def generate_answer(question):
     """
-    1. Retrieves context.
-    2. Sends context and question to LLM.
-    3. Returns answer.
+    Returns the cached answer if a near-identical question was answered before. Otherwise:
+    1. Retrieves context (sources are printed right away).
+    2. Sends context and question to LLM, printing the answer as it streams in.
+    3. Caches and returns the answer.
     """
-    # 1. Build the context string
-    context_text = retrieve_context(question)
+    started = time.perf_counter()
+    index_version = retrieval.version()
+    query_vector = get_embedding(question)
+    if answer_cache is not None:
+        cached = answer_cache.lookup(query_vector, index_version, answer_context())
+        if cached:
+            print_sources(source_hits(cached['sources']))
+            print(f"\n(Answer reused from \"{cached['question']}\", similarity {cached['similarity']:.3f}.)")
+            print(f"\nEconTalk Bot:\n{cached['answer']}")
+            answer_cache.record(time.perf_counter() - started, hit=True)
+            return cached['answer']
+
+    # 1. Retrieve and pack the context string
+    hits = retrieve_hits(question, query_vector=query_vector, filters=FILTERS)
+    context_text, report = format_context(hits)
     
     if not context_text:
-        return "I couldn't find any relevant episodes to answer that question."
-
-    # 2. Build the prompt
-    system_prompt = """
-You are an expert research assistant for the 'EconTalk' podcast archives. 
-
-Your Role:
-Answer the user's question using ONLY the provided Context (podcast transcripts).
-
-Guidelines:
-1. CITATION IS MANDATORY: Always attribute ideas to the specific guest or episode.
-2. REASONABLE INFERENCE: If an author is discussing their own book, you may treat that as the book being "recommended" or "featured."
-3. NO OUTSIDE KNOWLEDGE: Do not use external training data.
-4. TONE: Intellectual, curious, and charitable.
-"""
+        answer = "I couldn't find any relevant episodes to answer that question."
+        print(f"\nEconTalk Bot:\n{answer}")
+        return answer
+    print_sources(hits)
+    print(f"({describe_packing(report).capitalize()})")
 
-    # 3. Call LLM
-    response = o_client.chat.completions.create(
-        model="gpt-4o", 
-        messages=[
-            {"role": "system", "content": system_prompt},
+    # 2. Call LLM (SYSTEM_PROMPT is also part of the answer cache key)
+    print("\nEconTalk Bot:")
+    timing = {}
+    pieces = []
+    for piece in stream_chat(
+        o_client,
+        CHAT_MODEL,
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion: {question}"}
         ],
+        log=generation_log,
+        timing=timing,
         temperature=0.3
-    )
+    ):
+        pieces.append(piece)
+        print(piece, end="", flush=True)
+    print(f"\n\n({describe_timing(timing['first_token_seconds'], timing['total_seconds'])})")
+    answer = "".join(pieces)
 
-    return response.choices[0].message.content
+    # 3. Cache the answer (with its sources) for paraphrases of this question
+    if answer_cache is not None:
+        answer_cache.store(question, query_vector, answer, source_entries(hits), index_version, answer_context())
+        answer_cache.record(time.perf_counter() - started, hit=False)
+    return answer
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Chat with the EconTalk archives.")
+    arg_parser.add_argument("--since", help="Only episodes from this date on (2015, 2015-06 or 2015-06-30).")
+    arg_parser.add_argument("--until", help="Only episodes up to this date (inclusive, same formats).")
+    arg_parser.add_argument("--guest", help="Only episodes with this guest (exact name).")
+    arg_parser.add_argument("--speaker", help="Only chunks where this person speaks (exact name).")
+    return arg_parser.parse_args()
 
 def main():
+    global FILTERS
+    args = parse_args()
+    try:
+        FILTERS = make_filters(date_from=args.since, date_to=args.until, guest=args.guest, speaker=args.speaker)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
     print("Welcome to the EconTalk RAG Chatbot! (Type 'quit' to exit)")
+    if FILTERS:
+        described = [f"{name} {value}" for name, value in
+                     (("since", args.since), ("until", args.until), ("guest", args.guest), ("speaker", args.speaker)) if value]
+        print(f"Filters: {', '.join(described)}")
     print("-" * 50)
     
     while True:
         user_input = input("\nYou: ")
         if user_input.lower() in ["quit", "exit"]:
+            stats = retrieval.stats()
+            if stats['embedding_cache']:
+                print(f"Embedding cache: {stats['embedding_cache']['hits']} hits, "
+                      f"{stats['embedding_cache']['misses']} misses this session.")
+            print(f"Query vectors: {describe(stats['query_vectors'])}")
+            print(f"Search results: {describe(stats['results'])}")
+            print(f"Retrieval service: {describe_service(stats)}")
+            if answer_cache is not None:
+                print(f"Answers: {describe_answers(answer_cache.stats())}")
+            packing_stats = packing_log.stats()
+            if packing_stats["requests"]:
+                print(f"Context packing ({packing_stats['requests']} prompts): "
+                      f"{packing_stats['tokens_saved']:,} tokens saved ({packing_stats['reduction']:.0%})")
+            generation_stats = generation_log.stats()
+            if generation_stats["requests"]:
+                print(f"Generation ({generation_stats['requests']} answers): p50 "
+                      f"{describe_timing(generation_stats['p50_first_token_seconds'], generation_stats['p50_total_seconds'])}")
             break
         
         print("\nAI is thinking...")
         try:
-            answer = generate_answer(user_input)
-            print(f"\nEconTalk Bot:\n{answer}")
+            # Prints the sources, then the answer as it streams in
+            generate_answer(user_input)
         except Exception as e:
             print(f"Error generating answer: {e}")
             
@@ -0,0 +1,361 @@
+import os
+import time
+import uuid
+
+import numpy as np
+from qdrant_client.models import Filter, FieldCondition, MatchAny, MatchValue, Range, QueryRequest
+
+from vector_store import VectorStore, DEFAULT_VECTOR_DIR
+from collection_profiles import configured_profile, search_params
+from episode_store import date_timestamp
+
+# Which backend the front ends search: "qdrant" (server or local mode) or "numpy" (in-process)
+DEFAULT_BACKEND = os.getenv("RETRIEVAL_BACKEND", "qdrant")
+BACKENDS = ("qdrant", "numpy")
+
+# Fuse BM25 (lexical_index.py) with vector search; HYBRID_SEARCH=0 compares against vector-only
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1").lower() not in ("0", "false", "no")
+
+# Rows scored per matrix product; bounds the temporary float32 copy of a float16 matrix
+BLOCK_ROWS = 16384
+
+# OpenAI embeddings come unit-length; the stored matrix is only re-normalized if it isn't
+NORM_TOLERANCE = 1e-3
+
+# Filters letting through less than this share of rows score only those rows (gathered);
+# wider ones score every row and mask the rest, which beats copying most of the matrix
+GATHER_FRACTION = 0.25
+
+# Hybrid search: rank constant for reciprocal rank fusion (60 is the value from the original paper),
+# and how many candidates per top_k each side contributes to the fusion
+RRF_K = 60
+CANDIDATE_MULTIPLIER = 3
+
+# How often QdrantBackend.version() looks up the alias target again (result caches key on it)
+VERSION_CHECK_SECONDS = 10
+
+# Diversity re-ranking (maximal marginal relevance); MMR_RERANK=1 turns it on by default
+MMR_RERANK = os.getenv("MMR_RERANK", "0").lower() not in ("0", "false", "no")
+# Candidates fetched per final hit, relevance vs. novelty weight (1.0 = plain ranking),
+# and how many of the final hits one episode may take (while other episodes have candidates)
+MMR_CANDIDATE_MULTIPLIER = 4
+MMR_LAMBDA = 0.7
+MMR_EPISODE_CAP = 2
+
+# Metadata filters: name -> the payload field it applies to (06_load_db.py indexes each one)
+FILTER_FIELDS = {"date_from": "date_ts", "date_to": "date_ts", "guest": "guest", "speaker": "speakers"}
+
+def make_filters(date_from=None, date_to=None, guest=None, speaker=None):
+    """
+    Metadata filters for retrieve(), or None. Dates are "YYYY", "YYYY-MM" or "YYYY-MM-DD" and
+    inclusive ("2020" to "2020" is the whole year); guest and speaker match exactly.
+    """
+    filters = {}
+    if date_from:
+        filters["date_from"] = date_timestamp(date_from)
+    if date_to:
+        filters["date_to"] = date_timestamp(date_to, end=True)
+    if None in filters.values():
+        raise ValueError(f"Dates must look like 2020, 2020-06 or 2020-06-30 (got {date_from!r} / {date_to!r}).")
+    if guest:
+        filters["guest"] = guest
+    if speaker:
+        filters["speaker"] = speaker
+    return filters or None
+
+def filter_key(filters):
+    """Hashable form of a filter dict, for cache and batch keys."""
+    return tuple(sorted((filters or {}).items()))
+
+def qdrant_filter(episode_ids=None, filters=None):
+    """Qdrant filter on the indexed payload fields (episode_id, date_ts, guest, speakers), or None."""
+    conditions = []
+    if episode_ids:
+        conditions.append(FieldCondition(key="episode_id", match=MatchAny(any=list(episode_ids))))
+    filters = filters or {}
+    if "date_from" in filters or "date_to" in filters:
+        conditions.append(FieldCondition(key="date_ts", range=Range(gte=filters.get("date_from"),
+                                                                    lte=filters.get("date_to"))))
+    if "guest" in filters:
+        conditions.append(FieldCondition(key="guest", match=MatchValue(value=filters["guest"])))
+    if "speaker" in filters:
+        # speakers is a list; a keyword match on it matches any element
+        conditions.append(FieldCondition(key="speakers", match=MatchValue(value=filters["speaker"])))
+    return Filter(must=conditions) if conditions else None
+
+class FilterColumns:
+    """
+    The filter fields of an in-process index (NumPy matrix rows, BM25 docs) as columns aligned
+    with its rows, so a filter becomes a boolean row mask in a few vectorized comparisons.
+    fields is EpisodeStore.filter_fields(); rows missing from it match no filter.
+    """
+    def __init__(self, source_ids, fields):
+        records = [fields.get(source_id) for source_id in source_ids]
+        self.date_ts = np.array([record['date_ts'] if record and record['date_ts'] is not None else -1
+                                 for record in records], dtype=np.int64)
+        self.guest_codes = {}
+        self.guests = np.array([self.guest_codes.setdefault(record['guest'], len(self.guest_codes)) if record else -1
+                                for record in records], dtype=np.int32)
+        # Speakers as a flat list of codes plus the row each one belongs to
+        self.speaker_codes = {}
+        speaker_rows, speakers = [], []
+        for row, record in enumerate(records):
+            for speaker in (record['speakers'] if record else ()):
+                speaker_rows.append(row)
+                speakers.append(self.speaker_codes.setdefault(speaker, len(self.speaker_codes)))
+        self.speaker_rows = np.array(speaker_rows, dtype=np.int64)
+        self.speakers = np.array(speakers, dtype=np.int32)
+
+    def mask(self, filters):
+        """Boolean row mask for a make_filters() dict."""
+        mask = np.ones(len(self.date_ts), dtype=bool)
+        if "date_from" in filters or "date_to" in filters:
+            mask &= self.date_ts >= max(filters.get("date_from", 0), 0)
+            if "date_to" in filters:
+                mask &= self.date_ts <= filters["date_to"]
+        if "guest" in filters:
+            mask &= self.guests == self.guest_codes.get(filters["guest"], -2)
+        if "speaker" in filters:
+            speaks = np.zeros(len(mask), dtype=bool)
+            speaks[self.speaker_rows[self.speakers == self.speaker_codes.get(filters["speaker"], -2)]] = True
+            mask &= speaks
+        return mask
+
+def point_id(source_id):
+    """Deterministic Qdrant point ID for a chunk ID."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, source_id))
+
+class Hit:
+    """A search result shaped like Qdrant's ScoredPoint (id, score, payload, and vector if requested)."""
+    __slots__ = ("id", "score", "payload", "vector")
+
+    def __init__(self, id, score, payload, vector=None):
+        self.id = id
+        self.score = score
+        self.payload = payload
+        self.vector = vector
+
+def reciprocal_rank_fusion(result_lists, top_k, k=RRF_K):
+    """
+    Merges ranked hit lists by reciprocal rank fusion: score = sum of 1 / (k + rank).
+    Only ranks matter, so BM25 and cosine scores never need to be put on one scale.
+    Hits are matched by source_id; the first list's hit object (and vector) is kept.
+    """
+    fused, hits = {}, {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            source_id = hit.payload['source_id']
+            fused[source_id] = fused.get(source_id, 0.0) + 1.0 / (k + rank)
+            hits.setdefault(source_id, hit)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [Hit(hits[source_id].id, fused[source_id], hits[source_id].payload, hits[source_id].vector)
+            for source_id in ranked]
+
+def hybrid_search(backend, lexical_index, query, vector, top_k, episode_ids=None, **params):
+    """
+    Vector search fused with BM25 over the chunk text. Each side fetches CANDIDATE_MULTIPLIER * top_k
+    candidates so a chunk ranked highly by only one of them still makes the cut.
+    """
+    depth = top_k * CANDIDATE_MULTIPLIER
+    vector_hits = backend.search(vector, depth, episode_ids=episode_ids, **params)
+    lexical_hits = lexical_index.search(query, depth, episode_ids=episode_ids)
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+
+def mmr_rerank(query_vector, hits, top_k, diversity=MMR_LAMBDA, episode_cap=MMR_EPISODE_CAP):
+    """
+    Picks top_k of the hits by maximal marginal relevance: each pick maximizes
+    diversity * relevance - (1 - diversity) * (cosine similarity to the closest hit already picked).
+    Relevance is the hit's own score rescaled to 0..1 (cosine or fused), so it works after hybrid
+    fusion too. An episode stops taking picks after episode_cap of them, unless every remaining
+    candidate is from a capped episode. Hits need vectors (with_vectors=True or fetch_vectors()).
+    """
+    if len(hits) <= 1 or top_k <= 0:
+        return hits[:top_k]
+    vectors = np.asarray([hit.vector for hit in hits], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+
+    scores = np.array([hit.score for hit in hits], dtype=np.float32)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(hits), dtype=np.float32)
+    episodes = np.array([hit.payload.get('episode_id', -1) for hit in hits])
+
+    picked = []
+    closest = np.zeros(len(hits), dtype=np.float32)  # similarity to the closest picked hit
+    available = np.ones(len(hits), dtype=bool)
+    counts = {}
+    for _ in range(min(top_k, len(hits))):
+        if not available.any():
+            # Only capped episodes left: fill up from them rather than return fewer hits
+            available[:] = True
+            available[picked] = False
+        marginal = np.where(available, diversity * relevance - (1 - diversity) * closest, -np.inf)
+        best = int(np.argmax(marginal))
+        picked.append(best)
+        available[best] = False
+        np.maximum(closest, similarity[best], out=closest)
+        counts[episodes[best]] = counts.get(episodes[best], 0) + 1
+        if counts[episodes[best]] >= episode_cap:
+            available[episodes == episodes[best]] = False
+    return [hits[i] for i in picked]
+
+class NumpyBackend:
+    """
+    Exact cosine search over the memory-mapped vector store, in process (no network hop).
+
+    Queries are scored with one matrix product per block of rows and the top k picked with
+    argpartition. A whole batch of queries shares one pass over the matrix.
+    """
+    name = "numpy"
+
+    def __init__(self, path=DEFAULT_VECTOR_DIR, filter_fields=None):
+        store = VectorStore(path, read_only=True)
+        self.source_ids = store.ids()
+        self.episode_ids = np.array(store.episode_ids(), dtype=np.int64)
+        matrix = store.vectors()
+        # Metadata filter columns (EpisodeStore.filter_fields()); None without them
+        self.columns = FilterColumns(self.source_ids, filter_fields) if filter_fields is not None else None
+
+        self.rows = None  # source_id -> row, built by the first fetch_vectors()
+
+        norms = np.concatenate([np.linalg.norm(np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32), axis=1)
+                                for start in range(0, len(matrix), BLOCK_ROWS)]) if len(matrix) else np.ones(0)
+        if len(norms) and np.abs(norms - 1).max() > NORM_TOLERANCE:
+            # Normalize once into memory so every query is a plain dot product
+            matrix = (np.asarray(matrix, dtype=np.float32) / norms[:, None]).astype(store.dtype)
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.source_ids)
+
+    def version(self):
+        """The vectors are loaded once per process, so they only change with a restart."""
+        return f"numpy:{len(self)}"
+
+    def episode_mask(self, episode_ids):
+        """Boolean row mask for a metadata filter on episode_id."""
+        return np.isin(self.episode_ids, list(episode_ids))
+
+    def filter_mask(self, filters):
+        """Boolean row mask for a make_filters() dict."""
+        if self.columns is None:
+            raise ValueError("Metadata filters need the filter fields; pass filter_fields=EpisodeStore.filter_fields().")
+        return self.columns.mask(filters)
+
+    def search_batch(self, vectors, top_k, episode_ids=None, mask=None, with_vectors=False, filters=None, **params):
+        """
+        Top-k hits for each query vector, in one pass over the matrix. episode_ids, metadata filters
+        (make_filters()) or a prebuilt boolean row mask restrict the rows searched; only those rows
+        are scored, so a narrow filter makes the search cheaper rather than dearer.
+        with_vectors attaches each hit's stored vector. params (hnsw_ef, oversampling) are accepted
+        for parity with Qdrant; this search is always exact.
+        """
+        if episode_ids:
+            mask = self.episode_mask(episode_ids) if mask is None else mask & self.episode_mask(episode_ids)
+        if filters:
+            mask = self.filter_mask(filters) if mask is None else mask & self.filter_mask(filters)
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        # Rows to score: everything, or just the ones a narrow filter lets through
+        row_ids = np.flatnonzero(mask) if mask is not None else None
+        if row_ids is not None and len(row_ids) > GATHER_FRACTION * len(self.matrix):
+            row_ids = None
+        else:
+            mask = None
+        candidates = len(self.matrix) if row_ids is None else len(row_ids)
+        scores = np.empty((candidates, len(queries)), dtype=np.float32)
+        for start in range(0, candidates, BLOCK_ROWS):
+            if row_ids is None:
+                block = self.matrix[start:start + BLOCK_ROWS]
+            else:
+                block = self.matrix[row_ids[start:start + BLOCK_ROWS]]
+            scores[start:start + len(block)] = np.asarray(block, dtype=np.float32) @ queries.T
+        if mask is not None:
+            scores[~mask] = -np.inf
+
+        k = min(top_k, len(scores))
+        if k == 0:
+            return [[] for _ in queries]
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+
+        results = []
+        for q in range(len(queries)):
+            hits = []
+            for index in top[np.argsort(-scores[top[:, q], q]), q]:
+                if scores[index, q] == -np.inf:
+                    continue
+                row = int(index) if row_ids is None else int(row_ids[index])
+                hits.append(Hit(row, float(scores[index, q]),
+                                {"source_id": self.source_ids[row], "episode_id": int(self.episode_ids[row])},
+                                np.asarray(self.matrix[row], dtype=np.float32) if with_vectors else None))
+            results.append(hits)
+        return results
+
+    def search(self, vector, top_k, episode_ids=None, **params):
+        return self.search_batch([vector], top_k, episode_ids, **params)[0]
+
+    def fetch_vectors(self, source_ids):
+        """{source_id: vector} for stored chunks (e.g. BM25-only hits that came without one)."""
+        if self.rows is None:
+            self.rows = {source_id: row for row, source_id in enumerate(self.source_ids)}
+        return {source_id: np.asarray(self.matrix[self.rows[source_id]], dtype=np.float32)
+                for source_id in source_ids if source_id in self.rows}
+
+class QdrantBackend:
+    """Search through a Qdrant collection (or alias), with the collection profile's search parameters."""
+    name = "qdrant"
+
+    def __init__(self, client, collection_name, profile=None):
+        self.client = client
+        self.collection_name = collection_name
+        self.profile = profile or configured_profile()
+        self._version = None
+        self._version_checked = 0.0
+
+    def version(self):
+        """
+        Identifies what the alias serves: the versioned collection behind it (new on every rebuild)
+        and its point count (changed by delta loads). Looked up at most every VERSION_CHECK_SECONDS.
+        """
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > VERSION_CHECK_SECONDS:
+            target = next((alias.collection_name for alias in self.client.get_aliases().aliases
+                           if alias.alias_name == self.collection_name), self.collection_name)
+            self._version = f"{target}:{self.client.get_collection(collection_name=target).points_count}"
+            self._version_checked = now
+        return self._version
+
+    def _request(self, vector, top_k, episode_ids=None, hnsw_ef=None, oversampling=None, filters=None):
+        return {
+            "query": list(map(float, vector)),
+            "limit": top_k,
+            "filter": qdrant_filter(episode_ids, filters),
+            "params": search_params(self.profile, hnsw_ef=hnsw_ef, oversampling=oversampling),
+        }
+
+    def search(self, vector, top_k, episode_ids=None, hnsw_ef=None, oversampling=None, with_vectors=False,
+               filters=None):
+        request = self._request(vector, top_k, episode_ids, hnsw_ef, oversampling, filters)
+        return self.client.query_points(
+            collection_name=self.collection_name,
+            query=request["query"],
+            limit=top_k,
+            query_filter=request["filter"],
+            search_params=request["params"],
+            with_vectors=with_vectors
+        ).points
+
+    def search_batch(self, vectors, top_k, episode_ids=None, hnsw_ef=None, oversampling=None, with_vectors=False,
+                     filters=None):
+        requests = [QueryRequest(**self._request(vector, top_k, episode_ids, hnsw_ef, oversampling, filters),
+                                 with_payload=True, with_vector=with_vectors)
+                    for vector in vectors]
+        responses = self.client.query_batch_points(collection_name=self.collection_name, requests=requests)
+        return [response.points for response in responses]
+
+    def fetch_vectors(self, source_ids):
+        """{source_id: vector} for chunks by point ID (e.g. BM25-only hits that came without one)."""
+        points = self.client.retrieve(collection_name=self.collection_name, ids=[point_id(s) for s in source_ids],
+                                      with_payload=["source_id"], with_vectors=True)
+        return {point.payload['source_id']: point.vector for point in points}
@@ -0,0 +1,489 @@
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+from embedding_cache import EmbeddingCache, normalize_text, KIND_QUERY
+from episode_store import EpisodeStore
+from lexical_index import load_lexical_index
+from query_cache import TTLCache, QUERY_VECTOR_ENTRIES, QUERY_VECTOR_TTL, RESULT_ENTRIES, RESULT_TTL
+from retrieval import (
+    DEFAULT_BACKEND, HYBRID_SEARCH, CANDIDATE_MULTIPLIER, MMR_RERANK, MMR_CANDIDATE_MULTIPLIER,
+    Hit, NumpyBackend, QdrantBackend, reciprocal_rank_fusion, mmr_rerank, filter_key
+)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+COLLECTION_NAME = "econtalk_episodes"  # alias, repointed by 06_load_db.py after each rebuild
+
+# Chunks per answer. Exact names and rare terms are caught by the BM25 side of hybrid search,
+# so it needs far fewer chunks in the prompt than vector-only search did
+HYBRID_TOP_K = 8
+VECTOR_TOP_K = 15
+
+# Micro-batching: concurrent queries arriving within BATCH_WINDOW seconds share one embeddings
+# call and one batched search (a lone query waits at most this long)
+BATCH_WINDOW = 0.005
+MAX_EMBED_BATCH = 256
+MAX_SEARCH_BATCH = 64
+
+# Front ends talk to a shared service over HTTP when this is set (python retrieval_service.py),
+# and run the same service in process otherwise
+SERVICE_URL_ENV = "RETRIEVAL_SERVICE_URL"
+DEFAULT_PORT = 8700
+
+# Request latencies / queue waits kept for percentiles, and the window throughput is measured over
+METRICS_WINDOW = 1000
+THROUGHPUT_WINDOW = 60
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests: items submitted within `window` seconds of the first one
+    (or until `max_batch` are waiting) are handed to `flush(items)` in a single call, which
+    returns one result per item. Records batch sizes and how long requests waited to be sent.
+    """
+    def __init__(self, flush, window=BATCH_WINDOW, max_batch=MAX_EMBED_BATCH):
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = []  # (item, future, submitted_at)
+        self.timer = None
+        self.batches = 0
+        self.items = 0
+        self.queue_waits = deque(maxlen=METRICS_WINDOW)
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        if len(self.pending) >= self.max_batch:
+            self._flush_pending()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush_pending)
+        return await future
+
+    def _flush_pending(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        self.queue_waits.extend(started - submitted for _, _, submitted in batch)
+        try:
+            results = await self.flush([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "p50_queue_wait_ms": milliseconds(percentile(self.queue_waits, 0.5)),
+            "p99_queue_wait_ms": milliseconds(percentile(self.queue_waits, 0.99))
+        }
+
+class RetrievalService:
+    """
+    Query embedding + search for both front ends, on one asyncio event loop.
+
+    One pooled AsyncOpenAI client and one search backend (Qdrant client or in-process NumPy)
+    serve every caller. Concurrent query embeddings are micro-batched into single API calls,
+    and their searches into single batched backend calls. The query vector and result caches
+    (query_cache.py) and the persistent embedding cache sit in front of both.
+    """
+    def __init__(self, backend, episode_store, openai_client, embedding_cache=None, lexical_index=None,
+                 hybrid=HYBRID_SEARCH, mmr=MMR_RERANK, embedding_model=EMBEDDING_MODEL):
+        self.backend = backend
+        self.episode_store = episode_store
+        self.openai_client = openai_client
+        self.embedding_cache = embedding_cache
+        self.lexical_index = lexical_index
+        self.hybrid = hybrid and lexical_index is not None
+        self.mmr = mmr
+        self.embedding_model = embedding_model
+        self.embedder = MicroBatcher(self._embed_batch, max_batch=MAX_EMBED_BATCH)
+        self.searcher = MicroBatcher(self._search_batch, max_batch=MAX_SEARCH_BATCH)
+        self.query_vector_cache = TTLCache(QUERY_VECTOR_ENTRIES, QUERY_VECTOR_TTL)
+        self.result_cache = TTLCache(RESULT_ENTRIES, RESULT_TTL)
+        self.api_calls = 0
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.mmr_latencies = deque(maxlen=METRICS_WINDOW)
+        self.completed = deque()  # completion times within THROUGHPUT_WINDOW
+        self.started = time.perf_counter()
+        self._filter_options = None  # built by the first filter_options()
+
+    @classmethod
+    def from_env(cls):
+        """Builds the service from the same settings (.env) the front ends use."""
+        from openai import AsyncOpenAI
+        from qdrant_client import QdrantClient
+
+        store = EpisodeStore(read_only=True)
+        hybrid = os.getenv("HYBRID_SEARCH", "1").lower() not in ("0", "false", "no")
+        backend_name = os.getenv("RETRIEVAL_BACKEND", DEFAULT_BACKEND)
+        # The in-process indexes filter on columns built from the store; Qdrant on its payload indexes
+        fields = store.filter_fields() if backend_name == "numpy" or hybrid else None
+        if backend_name == "numpy":
+            backend = NumpyBackend(filter_fields=fields)
+        else:
+            qdrant_path = os.getenv("QDRANT_PATH")
+            client = (QdrantClient(path=qdrant_path) if qdrant_path
+                      else QdrantClient(url=os.getenv("QDRANT_URL", "http://localhost:6333")))
+            # Test connection to ensure Docker is running
+            client.get_collections()
+            backend = QdrantBackend(client, COLLECTION_NAME)
+
+        mmr = os.getenv("MMR_RERANK", "0").lower() not in ("0", "false", "no")
+        return cls(
+            backend,
+            store,
+            AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+            embedding_cache=EmbeddingCache(),
+            lexical_index=load_lexical_index(filter_fields=fields) if hybrid else None,
+            hybrid=hybrid,
+            mmr=mmr
+        )
+
+    # --- Batched calls ---
+    async def _embed_batch(self, texts):
+        """One embeddings call for every distinct text the persistent cache doesn't have."""
+        unique = list(dict.fromkeys(texts))
+        cached = (self.embedding_cache.get_many(self.embedding_model, unique, kind=KIND_QUERY)
+                  if self.embedding_cache else [None] * len(unique))
+        by_text = {text: vector for text, vector in zip(unique, cached) if vector is not None}
+        missing = [text for text in unique if text not in by_text]
+        if missing:
+            self.api_calls += 1
+            response = await self.openai_client.embeddings.create(input=missing, model=self.embedding_model)
+            vectors = [data.embedding for data in response.data]
+            if self.embedding_cache:
+                self.embedding_cache.put_many(self.embedding_model, missing, vectors, kind=KIND_QUERY)
+            by_text.update(zip(missing, vectors))
+        return [by_text[text] for text in texts]
+
+    async def _search_batch(self, requests):
+        """Runs the queued searches as one batched backend call per distinct set of search settings."""
+        groups = {}
+        for i, (vector, *settings) in enumerate(requests):
+            groups.setdefault(tuple(settings), []).append(i)
+
+        results = [None] * len(requests)
+        for (depth, episode_ids, hnsw_ef, oversampling, with_vectors, filters), indexes in groups.items():
+            # The backends are synchronous (NumPy, Qdrant's pooled HTTP client); keep the loop free
+            batch = await asyncio.to_thread(
+                self.backend.search_batch, [requests[i][0] for i in indexes], depth,
+                list(episode_ids) or None, hnsw_ef=hnsw_ef, oversampling=oversampling, with_vectors=with_vectors,
+                filters=dict(filters) or None
+            )
+            for i, points in zip(indexes, batch):
+                results[i] = points
+        return results
+
+    # --- Service API ---
+    async def embed(self, text):
+        """Query vector for the text (whitespace-normalized), through the caches and the embedding batcher."""
+        text = normalize_text(text)
+        key = (self.embedding_model, text)
+        found, vector = self.query_vector_cache.lookup(key)
+        if not found:
+            started = time.perf_counter()
+            vector = await self.embedder.submit(text)
+            self.query_vector_cache.store(key, vector, time.perf_counter() - started)
+        return vector
+
+    async def retrieve(self, query, top_k=None, hybrid=None, episode_ids=None, hnsw_ef=None, oversampling=None,
+                       query_vector=None, mmr=None, filters=None):
+        """
+        The top_k chunks for the query, text and metadata filled in. Vector search is fused with
+        BM25 when hybrid (default: HYBRID_SEARCH). episode_ids restricts the search to those episodes,
+        and filters (retrieval.make_filters()) to a date range, guest or speaker, inside the search
+        itself; hnsw_ef / oversampling override the collection profile's search parameters.
+        query_vector skips the embedding lookup when the caller already has it.
+        mmr (default: MMR_RERANK) re-ranks MMR_CANDIDATE_MULTIPLIER * top_k candidates for diversity.
+        """
+        started = time.perf_counter()
+        hybrid = (self.hybrid if hybrid is None else hybrid) and self.lexical_index is not None
+        mmr = self.mmr if mmr is None else mmr
+        top_k = top_k or (HYBRID_TOP_K if hybrid else VECTOR_TOP_K)
+        episode_ids = tuple(sorted(episode_ids or ()))
+        filters = filter_key(filters)
+
+        # Keyed on the collection version, so a reload (06_load_db.py) never serves the old hit list
+        key = (normalize_text(query), top_k, hybrid, mmr, episode_ids, filters, hnsw_ef, oversampling,
+               await self.version())
+        found, hits = self.result_cache.lookup(key)
+        if not found:
+            vector = query_vector if query_vector is not None else await self.embed(query)
+            candidates = top_k * MMR_CANDIDATE_MULTIPLIER if mmr else top_k
+            depth = candidates * CANDIDATE_MULTIPLIER if hybrid else candidates
+            points = await self.searcher.submit((vector, depth, episode_ids, hnsw_ef, oversampling, mmr, filters))
+            if hybrid:
+                lexical_points = self.lexical_index.search(query, depth, episode_ids=episode_ids,
+                                                           filters=dict(filters) or None)
+                points = reciprocal_rank_fusion([points, lexical_points], candidates)
+            if mmr:
+                points = await self._diversify(vector, points, top_k)
+            # Fill in text/metadata locally
+            hits = self.episode_store.resolve_hits(points)
+            self.result_cache.store(key, hits, time.perf_counter() - started)
+
+        finished = time.perf_counter()
+        self.latencies.append(finished - started)
+        self.completed.append(finished)
+        return list(hits)
+
+    async def _diversify(self, vector, points, top_k):
+        """MMR re-ranking of the candidates; BM25-only candidates get their vectors fetched first."""
+        missing = [point.payload['source_id'] for point in points if point.vector is None]
+        if missing:
+            fetched = await asyncio.to_thread(self.backend.fetch_vectors, missing)
+            points = [point for point in points
+                      if point.vector is not None or point.payload['source_id'] in fetched]
+            for point in points:
+                if point.vector is None:
+                    point.vector = fetched[point.payload['source_id']]
+
+        started = time.perf_counter()
+        points = mmr_rerank(vector, points, top_k)
+        self.mmr_latencies.append(time.perf_counter() - started)
+        for point in points:
+            # Not needed past here; keeps cached and serialized hits small
+            point.vector = None
+        return points
+
+    async def version(self):
+        return await asyncio.to_thread(self.backend.version)
+
+    def filter_options(self):
+        """The values the filters can take: {"guests", "speakers", "date_from", "date_to"} (dates as YYYY-MM-DD)."""
+        if self._filter_options is None:
+            fields = self.episode_store.filter_fields().values()
+            dates = [record['date_ts'] for record in fields if record['date_ts'] is not None]
+            self._filter_options = {
+                "guests": sorted({record['guest'] for record in fields if record['guest']}),
+                "speakers": sorted({speaker for record in fields for speaker in record['speakers']}),
+                "date_from": time.strftime("%Y-%m-%d", time.gmtime(min(dates))) if dates else None,
+                "date_to": time.strftime("%Y-%m-%d", time.gmtime(max(dates))) if dates else None
+            }
+        return self._filter_options
+
+    def info(self):
+        return {"backend": self.backend.name, "hybrid": self.hybrid, "mmr": self.mmr,
+                "embedding_model": self.embedding_model}
+
+    def stats(self):
+        now = time.perf_counter()
+        while self.completed and now - self.completed[0] > THROUGHPUT_WINDOW:
+            self.completed.popleft()
+        return {
+            # Over the last THROUGHPUT_WINDOW seconds, or the service's lifetime if shorter
+            "requests_per_second": len(self.completed) / max(min(now - self.started, THROUGHPUT_WINDOW), 1e-9),
+            "p50_latency_ms": milliseconds(percentile(self.latencies, 0.5)),
+            "p99_latency_ms": milliseconds(percentile(self.latencies, 0.99)),
+            "embedding_api_calls": self.api_calls,
+            "embedding_batches": self.embedder.stats(),
+            "search_batches": self.searcher.stats(),
+            "query_vectors": self.query_vector_cache.stats(),
+            "results": self.result_cache.stats(),
+            "mmr_reranks": len(self.mmr_latencies),
+            "p50_mmr_ms": milliseconds(percentile(self.mmr_latencies, 0.5)),
+            "p99_mmr_ms": milliseconds(percentile(self.mmr_latencies, 0.99)),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None
+        }
+
+def hit_to_json(hit):
+    return {"id": hit.id, "score": hit.score, "payload": hit.payload}
+
+def hit_from_json(data):
+    return Hit(data["id"], data["score"], data["payload"])
+
+class LocalRetrieval:
+    """
+    The retrieval service in this process, on an event loop in a background thread. Called
+    synchronously; concurrent callers (Streamlit sessions) share its batches and caches.
+    """
+    def __init__(self, service=None):
+        self.service = service or RetrievalService.from_env()
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def embed(self, text):
+        return self._call(self.service.embed(text))
+
+    def retrieve(self, query, **options):
+        return self._call(self.service.retrieve(query, **options))
+
+    def version(self):
+        return self._call(self.service.version())
+
+    def info(self):
+        return self.service.info()
+
+    def filter_options(self):
+        return self._call(asyncio.to_thread(self.service.filter_options))
+
+    def stats(self):
+        # Read on the loop's thread, so the metrics aren't mutated mid-read
+        async def read():
+            return self.service.stats()
+        return self._call(read())
+
+class RetrievalClient:
+    """
+    Thin client for a shared service started with `python retrieval_service.py`. Same methods as
+    LocalRetrieval; keeps one keep-alive connection per calling thread.
+    """
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or DEFAULT_PORT
+        self.local = threading.local()
+
+    def _request(self, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        for attempt in range(2):
+            if getattr(self.local, "connection", None) is None:
+                self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.local.connection.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+                response = self.local.connection.getresponse()
+                data = json.loads(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Idle keep-alive connection closed by the server; reconnect once
+                self.local.connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Retrieval service error ({response.status}): {data.get('error')}")
+        return data
+
+    def embed(self, text):
+        return self._request("POST", "/embed", {"text": text})["vector"]
+
+    def retrieve(self, query, **options):
+        hits = self._request("POST", "/retrieve", dict(options, query=query))["hits"]
+        return [hit_from_json(hit) for hit in hits]
+
+    def version(self):
+        return self._request("GET", "/version")["version"]
+
+    def info(self):
+        return self._request("GET", "/info")
+
+    def filter_options(self):
+        return self._request("GET", "/filters")
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+def connect(url=None):
+    """The shared service at RETRIEVAL_SERVICE_URL if set, else the service in this process."""
+    url = url or os.getenv(SERVICE_URL_ENV)
+    return RetrievalClient(url) if url else LocalRetrieval()
+
+def describe_service(stats):
+    """One-line summary of throughput and batching, for the sidebar and CLI logs."""
+    embedding, search = stats["embedding_batches"], stats["search_batches"]
+    summary = (f"{stats['requests_per_second']:.2f} req/s, p50 {stats['p50_latency_ms']} ms; "
+               f"embed batch {embedding['mean_batch_size']:.1f} (queue wait p50 {embedding['p50_queue_wait_ms']} ms), "
+               f"search batch {search['mean_batch_size']:.1f} (queue wait p50 {search['p50_queue_wait_ms']} ms)")
+    if stats["mmr_reranks"]:
+        summary += f"; MMR p50 {stats['p50_mmr_ms']} ms / p99 {stats['p99_mmr_ms']} ms"
+    return summary
+
+def make_handler(local):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients reuse their connection
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/version":
+                return self.send_json(200, {"version": local.version()})
+            if self.path == "/info":
+                return self.send_json(200, local.info())
+            if self.path == "/filters":
+                return self.send_json(200, local.filter_options())
+            if self.path == "/stats":
+                return self.send_json(200, local.stats())
+            self.send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            try:
+                if self.path == "/embed":
+                    return self.send_json(200, {"vector": local.embed(body["text"])})
+                if self.path == "/retrieve":
+                    query = body.pop("query")
+                    return self.send_json(200, {"hits": [hit_to_json(hit) for hit in local.retrieve(query, **body)]})
+                self.send_json(404, {"error": f"Unknown path {self.path}"})
+            except Exception as e:
+                self.send_json(500, {"error": str(e)})
+    return Handler
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Shared retrieval service for app.py and rag_app.py.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    load_dotenv()
+    local = LocalRetrieval()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(local))
+    server.daemon_threads = True
+    info = local.info()
+    print(f"Retrieval service ({info['backend']} backend, hybrid {'on' if info['hybrid'] else 'off'}, "
+          f"MMR {'on' if info['mmr'] else 'off'}) "
+          f"on http://{args.host}:{server.server_port}")
+    print(f"Point the front ends at it with {SERVICE_URL_ENV}=http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{describe_service(local.stats())}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
 import pandas as pd
 import json
+import hashlib
 import os
 import time
 import random
 import re
+import argparse
+import asyncio
+import httpx
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 from bs4 import BeautifulSoup
 from dateutil import parser
 from datetime import datetime
 import pytz
 
+from html_cache import HtmlCache
+from scrape_manifest import ScrapeManifest, normalize_url, STATUS_NO_TRANSCRIPT, STATUS_FAILED
+
 # --- Path configuration ---
 # Get absolute path of the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,93 +33,600 @@ INPUT_CSV = os.path.join(DATA_DIR, "econtalk_episode_list.csv")
 # Output: the raw transcript JSON files
 OUTPUT_DIR = os.path.join(DATA_DIR, "raw")
 
+# Scrape state: URL -> slug, content hash, status, ETag/Last-Modified
+MANIFEST_FILE = os.path.join(DATA_DIR, "scrape_manifest.sqlite")
+
+# Compressed archive of every fetched page (lets extraction be re-run without re-scraping)
+HTML_CACHE_FILE = os.path.join(DATA_DIR, "html_cache.sqlite")
+
 # Cutoff date configuration
 CUTOFF_DATE = datetime(2012, 1, 23, tzinfo=pytz.UTC)
 
+# Browser configuration
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+PAGE_TIMEOUT_MS = 60000
+HTTP_TIMEOUT_SECONDS = 30
+
+# Concurrent mode configuration
+DEFAULT_CONCURRENCY = 4      # number of reusable browser pages
+DEFAULT_RATE = 1.0           # requests per second allowed per host
+DEFAULT_BURST = 2            # requests a host may receive back-to-back
+MIN_RATE = 0.05              # never slow down below one request every 20 seconds
+SLOW_RESPONSE_SECONDS = 8.0  # responses slower than this count as "the server is struggling"
+BLOCKED_BACKOFF_SECONDS = 30 # pause for a host after a 429/403
+MAX_ATTEMPTS = 3             # tries per episode before giving up
+BLOCKED_STATUSES = {403, 429}
+
+# Resource types that never affect the transcript HTML (skipped to load pages faster)
+BLOCKED_RESOURCE_TYPES = {"image", "stylesheet", "font", "media"}
+
 # Create output directory if it doesn't exist
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def get_existing_urls():
-    """Scans the output directory to see which URLs have already scraped."""
-    existing_urls = set()
-    for filename in os.listdir(OUTPUT_DIR):
-        if filename.endswith(".json"):
-            try:
-                with open(os.path.join(OUTPUT_DIR, filename), 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if "url" in data:
-                        existing_urls.add(data["url"])
-            except:
-                pass # Ignore corrupted files
-    return existing_urls
-
-def scrape_episode(context, url, title, published_date):
-    """Scrapes a single episode page for the transcript."""
+def content_hash(data):
+    """Hash of the transcript text, recorded in the manifest to detect changed episodes."""
+    return hashlib.sha256(data.get("content", "").encode('utf-8')).hexdigest()
+
+def extract_transcript(content_html, url, title, published_date):
+    """Pulls the transcript and date out of an episode page's HTML. Returns None if there is no transcript."""
+    soup = BeautifulSoup(content_html, 'html.parser')
+
+    # --- Extract transcript ---
+    transcript_text = ""
+    # Strategy 1: Standard 'audio-highlight' class
+    transcript_div = soup.find('div', class_='audio-highlight')
+
+    if not transcript_div:
+        # Strategy 2: Look for header "AUDIO TRANSCRIPT"
+        header = soup.find(string=lambda text: text and "AUDIO TRANSCRIPT" in text)
+        if header:
+            transcript_div = header.find_parent().find_next('div')
+
+    if transcript_div:
+        transcript_text = transcript_div.get_text(separator='\n', strip=True)
+    else:
+        return None
+
+    # --- Extract Date ---
+    # We use the RSS date if available, otherwise try to extract from text
+    final_date = published_date
+    if not final_date or str(final_date) == "nan":
+        # Try to grab it from the transcript text if RSS didn't have it
+        date_match = re.search(r"Recording date: (.*?)]", transcript_text)
+        if date_match:
+            final_date = date_match.group(1)
+        else:
+            date_tag = soup.find('time')
+            if date_tag:
+                final_date = date_tag.get_text(strip=True)
+
+    # Build the Data Object
+    return {
+        "url": url,
+        "title": title,
+        "date": str(final_date), # Ensure it's a string
+        "content": transcript_text
+    }
+
+def scrape_episode(context, url, title, published_date, cache):
+    """Scrapes a single episode page for the transcript. Returns (data, outcome)."""
     page = context.new_page()
     
     # Set User-Agent to match a real browser (crucial for bypassing 403)
     page.set_extra_http_headers({
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
+        "User-Agent": USER_AGENT
     })
 
     try:
         # Navigate
-        page.goto(url, wait_until='domcontentloaded', timeout=60000)
+        page.goto(url, wait_until='domcontentloaded', timeout=PAGE_TIMEOUT_MS)
         
-        # Parse content
+        # Keep the page, then parse content
         content_html = page.content()
-        soup = BeautifulSoup(content_html, 'html.parser')
-        
-        # --- Extract transcript ---
-        transcript_text = ""
-        # Strategy 1: Standard 'audio-highlight' class
-        transcript_div = soup.find('div', class_='audio-highlight')
-        
-        if not transcript_div:
-            # Strategy 2: Look for header "AUDIO TRANSCRIPT"
-            header = soup.find(string=lambda text: text and "AUDIO TRANSCRIPT" in text)
-            if header:
-                transcript_div = header.find_parent().find_next('div')
-        
-        if transcript_div:
-            transcript_text = transcript_div.get_text(separator='\n', strip=True)
-        else:
+        cache.put(url, content_html, title, published_date)
+        data = extract_transcript(content_html, url, title, published_date)
+        page.close()
+        if not data:
             # If no transcript is found, we log it but don't crash
             print(f"  Warning: No transcript text found for: {title}")
-            page.close()
-            return None
-
-        # --- Extract Date ---
-        # We use the RSS date if available, otherwise try to extract from text
-        final_date = published_date
-        if not final_date or str(final_date) == "nan": 
-            # Try to grab it from the transcript text if RSS didn't have it
-            date_match = re.search(r"Recording date: (.*?)]", transcript_text)
-            if date_match:
-                final_date = date_match.group(1)
-            else:
-                date_tag = soup.find('time')
-                if date_tag:
-                    final_date = date_tag.get_text(strip=True)
-
-        # Build the Data Object
-        data = {
-            "url": url,
-            "title": title,
-            "date": str(final_date), # Ensure it's a string
-            "content": transcript_text
-        }
-        
-        page.close()
-        return data
+            return None, "browser_no_transcript"
+        return data, "browser_ok"
 
     except Exception as e:
         print(f"  Error: Failed processing {url}: {e}")
         page.close()
+        return None, "browser_failed"
+
+def episode_filename(url, index):
+    """Creates a safe filename from the URL slug."""
+    slug = url.strip('/').split('/')[-1]
+    if not slug:
+        slug = f"episode_{index}"
+    return f"{OUTPUT_DIR}/{slug}.json"
+
+def write_episode_file(filename, result):
+    """Writes a raw episode atomically (temp file + rename), so a crash never leaves half a file."""
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, filename)
+
+def slug_from_filename(filename):
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def save_episode(manifest, url, filename, result, validators):
+    """Saves an episode to disk and records it in the manifest."""
+    write_episode_file(filename, result)
+    manifest.record_saved(url, slug_from_filename(filename), content_hash(result),
+                          validators.get(normalize_url(url)))
+
+def record_unsaved(manifest, url, filename, outcome):
+    """Records an episode with no transcript (or a failed fetch) so it isn't retried blindly."""
+    status = STATUS_NO_TRANSCRIPT if outcome == "browser_no_transcript" else STATUS_FAILED
+    manifest.record_failure(url, slug_from_filename(filename), status, outcome)
+
+def conditional_headers(url, validators):
+    """Builds If-None-Match/If-Modified-Since headers so unchanged pages come back as 304."""
+    headers = {}
+    saved = validators.get(normalize_url(url), {})
+    if saved.get("etag"):
+        headers["If-None-Match"] = saved["etag"]
+    if saved.get("last_modified"):
+        headers["If-Modified-Since"] = saved["last_modified"]
+    return headers
+
+def handle_static_response(response, url, title, published_date, validators, cache):
+    """
+    Interprets a plain-HTTP response. Returns (data, outcome) where outcome is one of
+    'http', 'not_modified', 'fallback_blocked' or 'fallback_no_transcript'.
+    """
+    if response.status_code == 304:
+        return None, "not_modified"
+    if response.status_code != 200:
+        return None, "fallback_blocked"
+
+    cache.put(url, response.text, title, published_date)
+    data = extract_transcript(response.text, url, title, published_date)
+    if not data:
+        return None, "fallback_no_transcript"
+
+    validators[normalize_url(url)] = {
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified")
+    }
+    return data, "http"
+
+def fetch_static(client, url, title, published_date, validators, cache, stats):
+    """Fetches an episode over plain HTTP (no browser). Returns (data, outcome)."""
+    started = time.monotonic()
+    try:
+        response = client.get(url, headers=conditional_headers(url, validators))
+        data, outcome = handle_static_response(response, url, title, published_date, validators, cache)
+    except httpx.HTTPError as e:
+        print(f"  HTTP fetch failed ({e.__class__.__name__}), falling back to browser.")
+        data, outcome = None, "fallback_blocked"
+    stats.record("http", outcome, time.monotonic() - started)
+    return data, outcome
+
+async def fetch_static_async(client, limiter, url, title, published_date, validators, cache, stats):
+    """Async version of fetch_static() that also feeds the host rate limiter."""
+    await limiter.acquire(url)
+    started = time.monotonic()
+    status = None
+    try:
+        response = await client.get(url, headers=conditional_headers(url, validators))
+        status = response.status_code
+        data, outcome = handle_static_response(response, url, title, published_date, validators, cache)
+    except httpx.HTTPError as e:
+        print(f"  HTTP fetch failed ({e.__class__.__name__}), falling back to browser.")
+        data, outcome = None, "fallback_blocked"
+    latency = time.monotonic() - started
+    limiter.record(url, status, latency)
+    stats.record("http", outcome, latency)
+    return data, outcome
+
+def make_http_client_kwargs(connections):
+    """Shared settings for the pooled keep-alive HTTP clients."""
+    return {
+        "headers": {"User-Agent": USER_AGENT},
+        "timeout": HTTP_TIMEOUT_SECONDS,
+        "follow_redirects": True,
+        "limits": httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    }
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+class ScrapeStats:
+    """Counts how each episode was fetched and records latency per fetch path ('http' or 'browser')."""
+    def __init__(self):
+        self.outcomes = {}
+        self.latencies = {"http": [], "browser": []}
+
+    def record(self, path, outcome, latency):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.latencies[path].append(latency)
+
+    def report(self):
+        print("Fetch outcomes:")
+        for outcome, count in sorted(self.outcomes.items()):
+            print(f"  {outcome}: {count}")
+        for path, values in self.latencies.items():
+            if values:
+                print(f"  {path} latency: p50 {percentile(values, 50):.2f}s, "
+                      f"p95 {percentile(values, 95):.2f}s ({len(values)} requests)")
+
+def report_throughput(pages, started):
+    """Prints pages/minute so sequential and concurrent runs can be compared."""
+    elapsed = time.time() - started
+    per_minute = pages / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Processed {pages} pages in {elapsed:.1f}s ({per_minute:.1f} pages/min).")
+
+class HostRateLimiter:
+    """
+    Token bucket per host. The refill rate is halved (and the host paused) on 429/403s,
+    reduced on slow responses, and creeps back up towards the configured rate on healthy ones.
+    """
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.burst = burst
+        self.hosts = {}
+        self.lock = asyncio.Lock()
+
+    def _state(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = {
+                "rate": self.max_rate,
+                "tokens": float(self.burst),
+                "updated": time.monotonic(),
+                "paused_until": 0.0
+            }
+        return self.hosts[host]
+
+    async def acquire(self, url):
+        host = urlparse(url).netloc
+        while True:
+            async with self.lock:
+                state = self._state(host)
+                now = time.monotonic()
+                state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * state["rate"])
+                state["updated"] = now
+
+                if now >= state["paused_until"] and state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    return
+
+                wait = max(state["paused_until"] - now, (1 - state["tokens"]) / state["rate"])
+            await asyncio.sleep(wait)
+
+    def record(self, url, status, latency):
+        """Adapts the host's rate to the response it just gave us."""
+        state = self._state(urlparse(url).netloc)
+
+        if status in BLOCKED_STATUSES:
+            state["rate"] = max(MIN_RATE, state["rate"] / 2)
+            state["tokens"] = 0.0
+            state["paused_until"] = time.monotonic() + BLOCKED_BACKOFF_SECONDS
+            print(f"  Rate limit: got {status}, slowing to {state['rate']:.2f} req/s")
+        elif latency > SLOW_RESPONSE_SECONDS:
+            state["rate"] = max(MIN_RATE, state["rate"] * 0.75)
+        else:
+            state["rate"] = min(self.max_rate, state["rate"] + self.max_rate * 0.1)
+
+class PagePool:
+    """A fixed set of browser pages that are reused across episodes instead of opened per URL."""
+    def __init__(self, context, size):
+        self.context = context
+        self.size = size
+        self.pages = asyncio.Queue()
+
+    async def start(self):
+        for _ in range(self.size):
+            await self.pages.put(await self.context.new_page())
+
+    async def acquire(self):
+        return await self.pages.get()
+
+    async def release(self, page):
+        await self.pages.put(page)
+
+    async def close(self):
+        while not self.pages.empty():
+            await (self.pages.get_nowait()).close()
+
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def scrape_episode_async(pool, limiter, url, title, published_date, cache, stats):
+    """Scrapes one episode on a pooled page. Returns (data, outcome, status)."""
+    await limiter.acquire(url)
+    page = await pool.acquire()
+    started = time.monotonic()
+    status = None
+    data = None
+    outcome = "browser_failed"
+    try:
+        response = await page.goto(url, wait_until='domcontentloaded', timeout=PAGE_TIMEOUT_MS)
+        status = response.status if response else None
+
+        if status not in BLOCKED_STATUSES:
+            content_html = await page.content()
+            cache.put(url, content_html, title, published_date)
+            data = extract_transcript(content_html, url, title, published_date)
+            if data:
+                outcome = "browser_ok"
+            else:
+                outcome = "browser_no_transcript"
+                print(f"  Warning: No transcript text found for: {title}")
+
+    except Exception as e:
+        print(f"  Error: Failed processing {url}: {e}")
+    finally:
+        await pool.release(page)
+
+    latency = time.monotonic() - started
+    limiter.record(url, status, latency)
+    stats.record("browser", outcome, latency)
+    return data, outcome, status
+
+async def scrape_concurrent(pending_episodes, total, concurrency, rate, burst, use_http, validators, cache,
+                            manifest):
+    """Scrapes pending episodes with a pool of pages, throttled per host."""
+    queue = asyncio.Queue()
+    for index, row in pending_episodes.iterrows():
+        queue.put_nowait((index, row, 1))
+
+    limiter = HostRateLimiter(rate, burst)
+    stats = ScrapeStats()
+    counts = {"saved": 0, "skipped": 0, "unchanged": 0, "processed": 0}
+    started = time.time()
+
+    # The browser is only started once an episode actually needs it
+    browser_state = {"browser": None, "pool": None}
+    browser_lock = asyncio.Lock()
+
+    async def get_pool(p):
+        async with browser_lock:
+            if browser_state["pool"] is None:
+                browser = await p.chromium.launch(headless=True)
+                context = await browser.new_context(user_agent=USER_AGENT)
+                await context.route("**/*", block_heavy_resources)
+                pool = PagePool(context, concurrency)
+                await pool.start()
+                browser_state["browser"] = browser
+                browser_state["pool"] = pool
+            return browser_state["pool"]
+
+    async def worker(p, client):
+        while True:
+            try:
+                index, row, attempt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            url = row['url']
+            title = row['title']
+            published = row.get('date', row.get('published'))
+            filename = episode_filename(url, index)
+
+            result, outcome, status = None, None, None
+            if client:
+                result, outcome = await fetch_static_async(client, limiter, url, title, published,
+                                                           validators, cache, stats)
+
+            if outcome == "not_modified":
+                manifest.record_checked(url)
+                counts["processed"] += 1
+                counts["unchanged"] += 1
+                print(f"Unchanged ({index}/{total}): {title[:30]}... (304)")
+                continue
+
+            if result is None:
+                pool = await get_pool(p)
+                result, outcome, status = await scrape_episode_async(pool, limiter, url, title, published,
+                                                                     cache, stats)
+
+                if status in BLOCKED_STATUSES and attempt < MAX_ATTEMPTS:
+                    # Try again later, once the limiter has backed off
+                    queue.put_nowait((index, row, attempt + 1))
+                    continue
+
+            counts["processed"] += 1
+            if result:
+                save_episode(manifest, url, filename, result, validators)
+                counts["saved"] += 1
+                print(f"Saved ({index}/{total}): {title[:30]}... -> {filename}")
+            else:
+                record_unsaved(manifest, url, filename, outcome)
+                counts["skipped"] += 1
+                print(f"Skipped ({index}/{total}): {title[:30]}... (No transcript or error)")
+
+            if counts["processed"] % 25 == 0:
+                report_throughput(counts["processed"], started)
+
+    client = httpx.AsyncClient(**make_http_client_kwargs(concurrency)) if use_http else None
+    try:
+        async with async_playwright() as p:
+            await asyncio.gather(*(worker(p, client) for _ in range(concurrency)))
+            if browser_state["pool"] is not None:
+                await browser_state["pool"].close()
+                await browser_state["browser"].close()
+    finally:
+        if client:
+            await client.aclose()
+
+    print("-" * 40)
+    print(f"Concurrent scrape complete. Saved {counts['saved']}, unchanged {counts['unchanged']}, "
+          f"skipped {counts['skipped']}.")
+    report_throughput(counts["processed"], started)
+    stats.report()
+
+def scrape_sequential(pending_episodes, total, use_http, validators, cache, manifest):
+    """The original one-page-at-a-time loop with a polite random sleep."""
+    started = time.time()
+    processed = 0
+    stats = ScrapeStats()
+    client = httpx.Client(**make_http_client_kwargs(1)) if use_http else None
+
+    with sync_playwright() as p:
+        # The browser is only launched once an episode needs it (static fetch blocked or empty)
+        browser = None
+        context = None
+
+        # Iterate through pending episodes
+        for index, row in pending_episodes.iterrows():
+            url = row['url']
+            title = row['title']
+            # Use 'date' if available, else 'published'
+            published = row.get('date', row.get('published')) 
+            
+            filename = episode_filename(url, index)
+
+            print(f"Scraping ({index}/{total}): {title[:30]}...")
+
+            # Try the plain-HTTP fast path first
+            result, outcome = None, None
+            if client:
+                result, outcome = fetch_static(client, url, title, published, validators, cache, stats)
+
+            if result is None and outcome != "not_modified":
+                if outcome:
+                    print(f"  -> Static fetch gave no transcript ({outcome}), using browser...")
+                if context is None:
+                    # Launch browser (headless is faster, but set False if you want to watch)
+                    browser = p.chromium.launch(headless=True)
+                    context = browser.new_context()
+
+                # Run the scraper function
+                browser_started = time.monotonic()
+                result, outcome = scrape_episode(context, url, title, published, cache)
+                stats.record("browser", outcome, time.monotonic() - browser_started)
+            processed += 1
+
+            if outcome == "not_modified":
+                manifest.record_checked(url)
+                print(f"  -> Unchanged since last scrape (304)")
+            elif result:
+                # Save immediately to disk
+                save_episode(manifest, url, filename, result, validators)
+                print(f"  -> Saved to {filename}")
+            else:
+                record_unsaved(manifest, url, filename, outcome)
+                print(f"  -> Skipped (No transcript or error)")
+
+            # Polite sleep (random 2-4 seconds) to avoid getting banned
+            time.sleep(random.uniform(2, 4))
+
+        if browser:
+            browser.close()
+
+    if client:
+        client.close()
+
+    print("-" * 40)
+    print("Batch scrape complete.")
+    report_throughput(processed, started)
+    stats.report()
+
+# --- Re-extraction from the HTML cache (no network) ---
+_worker_cache = None
+
+def _open_worker_cache(path):
+    global _worker_cache
+    _worker_cache = HtmlCache(path)
+
+def reextract_page(job):
+    """
+    Worker: rebuilds one raw JSON file from its cached HTML, under the slug the scrape saved it
+    as (from the manifest). Returns (url, filename, hash) or None.
+    """
+    (rowid, url, title, published, sha), slug = job
+    html = _worker_cache.read_blob(sha)
+    if html is None:
+        return None
+    data = extract_transcript(html, url, title, published)
+    if not data:
         return None
+    filename = f"{OUTPUT_DIR}/{slug}.json"
+    write_episode_file(filename, data)
+    return url, filename, content_hash(data)
+
+def reextract_from_cache(workers):
+    """Re-runs transcript extraction over every cached page in parallel and rewrites data/raw/*.json."""
+    if not os.path.exists(HTML_CACHE_FILE):
+        print(f"Error: No HTML cache at {HTML_CACHE_FILE}. Run a scrape first.")
+        return
+
+    cache = HtmlCache(HTML_CACHE_FILE)
+    page_rows = cache.pages()
+    pages, blobs, raw_bytes, stored_bytes = cache.stats()
+    cache.close()
+
+    # Same filenames as the scrape wrote: the slug it recorded, not one derived from cache row IDs
+    manifest = ScrapeManifest(MANIFEST_FILE)
+    jobs = []
+    for page_row in page_rows:
+        entry = manifest.get(page_row[1])
+        if entry is not None and entry["slug"]:
+            jobs.append((page_row, entry["slug"]))
+    manifest.close()
+    if len(jobs) < len(page_rows):
+        print(f"Skipping {len(page_rows) - len(jobs)} cached pages the scrape manifest has no slug for.")
+    print(f"Re-extracting {pages} cached pages ({blobs} distinct, "
+          f"{raw_bytes / 1e6:.1f} MB raw, {stored_bytes / 1e6:.1f} MB compressed)...")
+
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_cache,
+                             initargs=(HTML_CACHE_FILE,)) as executor:
+        results = list(executor.map(reextract_page, jobs, chunksize=16))
+
+    # Keep the manifest's content hashes in step with the rewritten files
+    manifest = ScrapeManifest(MANIFEST_FILE)
+    saved = 0
+    for result in results:
+        if result:
+            url, filename, new_hash = result
+            manifest.record_saved(url, slug_from_filename(filename), new_hash)
+            saved += 1
+    manifest.close()
+
+    print(f"Done. Rebuilt {saved} transcripts ({len(results) - saved} without transcript) "
+          f"in {time.time() - started:.1f}s.")
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Scrape EconTalk transcripts.")
+    arg_parser.add_argument("--concurrent", action="store_true",
+                            help="Scrape with a pool of async browser pages instead of one at a time.")
+    arg_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                            help="Number of workers (and pooled browser pages) in concurrent mode.")
+    arg_parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                            help="Maximum requests per second per host in concurrent mode.")
+    arg_parser.add_argument("--burst", type=int, default=DEFAULT_BURST,
+                            help="Requests a host may receive back-to-back in concurrent mode.")
+    arg_parser.add_argument("--browser-only", action="store_true",
+                            help="Skip the plain-HTTP fast path and load every page in Playwright.")
+    arg_parser.add_argument("--refresh", action="store_true",
+                            help="Re-check already scraped episodes (unchanged pages are skipped via ETag/Last-Modified).")
+    arg_parser.add_argument("--retry-missing", action="store_true",
+                            help="Retry episodes previously recorded as having no transcript.")
+    arg_parser.add_argument("--reextract", action="store_true",
+                            help="Rebuild data/raw/*.json from the HTML cache without any network access.")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Parallel processes for --reextract.")
+    return arg_parser.parse_args()
 
 def main():
+    args = parse_args()
+
+    if args.reextract:
+        reextract_from_cache(args.workers)
+        return
+
     # 1. Load the CSV
     if not os.path.exists(INPUT_CSV):
         print(f"Error: Could not find {INPUT_CSV}. Make sure it is in this folder.")
@@ -119,8 +636,11 @@ def main():
     print(f"Loaded {len(df)} episodes from CSV.")
 
     # 2. Check what is already done
-    existing_urls = get_existing_urls()
-    print(f"Found {len(existing_urls)} episodes already scraped in folder.")
+    manifest = ScrapeManifest(MANIFEST_FILE)
+    if len(manifest) == 0:
+        print("New scrape manifest: importing existing files from data/raw (one-off)...")
+        manifest.import_legacy(OUTPUT_DIR, content_hash)
+    print(f"Scrape manifest tracks {len(manifest)} episodes.")
 
     # --- 3. Filter by date ---
     print(f"Filtering for episodes on or after {CUTOFF_DATE.date()}...")
@@ -145,49 +665,33 @@ def main():
 
     # 4. Filter out episodes already on disk
     df_filtered['normalized_url'] = df_filtered['url'].astype(str).str.strip().str.rstrip('/')
-    pending_episodes = df_filtered[~df_filtered['url'].isin(existing_urls)]
+    if args.refresh:
+        # Conditional requests make re-checking unchanged pages cheap
+        pending_episodes = df_filtered
+    else:
+        # Skips saved episodes, known no-transcript pages and failures still in backoff
+        already_handled = df_filtered['normalized_url'].apply(
+            lambda url: manifest.should_skip(url, retry_missing=args.retry_missing)
+        )
+        pending_episodes = df_filtered[~already_handled]
     
     print(f"Starting scrape for {len(pending_episodes)} new pending episodes...")
     print("-" * 40)
 
-    # 5. Start the browser loop
-    with sync_playwright() as p:
-        # Launch browser (headless is faster, but set False if you want to watch)
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
-
-        # Iterate through pending episodes
-        for index, row in pending_episodes.iterrows():
-            url = row['url']
-            title = row['title']
-            # Use 'date' if available, else 'published'
-            published = row.get('date', row.get('published')) 
-            
-            # Create a safe filename from the URL slug
-            slug = url.strip('/').split('/')[-1]
-            if not slug: 
-                slug = f"episode_{index}"
-            filename = f"{OUTPUT_DIR}/{slug}.json"
-
-            print(f"Scraping ({index}/{len(df)}): {title[:30]}...")
-
-            # Run the scraper function
-            result = scrape_episode(context, url, title, published)
-
-            if result:
-                # Save immediately to disk
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, indent=4, ensure_ascii=False)
-                print(f"  -> Saved to {filename}")
-            else:
-                print(f"  -> Skipped (No transcript or error)")
-
-            # Polite sleep (random 2-4 seconds) to avoid getting banned
-            time.sleep(random.uniform(2, 4))
-
-        browser.close()
-        print("-" * 40)
-        print("Batch scrape complete.")
+    # 5. Start the fetch loop (plain HTTP first, browser as fallback)
+    use_http = not args.browser_only
+    validators = manifest.validators()
+    cache = HtmlCache(HTML_CACHE_FILE)
+    try:
+        if args.concurrent:
+            print(f"Concurrent mode: {args.concurrency} workers, {args.rate} req/s per host (burst {args.burst}).")
+            asyncio.run(scrape_concurrent(pending_episodes, len(df), args.concurrency, args.rate, args.burst,
+                                          use_http, validators, cache, manifest))
+        else:
+            scrape_sequential(pending_episodes, len(df), use_http, validators, cache, manifest)
+    finally:
+        cache.close()
+        manifest.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,11 +1,16 @@
 import json
-import re
 import os
 import glob
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from dateutil import parser
 from datetime import datetime
 import pytz
 
+from transcript_cleaner import clean_transcript
+
 # --- Path configuration ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
@@ -16,6 +21,12 @@ INPUT_DIR = os.path.join(DATA_DIR, "raw")
 # Output: the cleaned JSON files
 OUTPUT_DIR = os.path.join(DATA_DIR, "clean")
 
+# Record of which raw file (hash + stat) and cleaner version produced each clean file
+MANIFEST_FILE = os.path.join(DATA_DIR, "clean_manifest.json")
+
+# Bump whenever the cleaning logic changes so every episode is reprocessed once
+CLEANER_VERSION = 1
+
 # Dates for "Era" logic
 ERA_START_DATE = datetime(2012, 1, 23, tzinfo=pytz.UTC)
 ERA_NEW_FORMAT_DATE = datetime(2016, 8, 29, tzinfo=pytz.UTC)
@@ -32,109 +43,27 @@ def parse_date(date_str):
     except:
         return None
 
-def clean_transcript_new_era(lines):
-    """Cleaning logic for modern episodes (Starting 8/29/2016)."""
-    cleaned_dialogue = []
-    current_speaker = "Narrator/Intro"
-    current_text_buffer = []
-    
-    timestamp_pattern = re.compile(r'^\d{1,2}:\d{2}$') 
-    speaker_pattern = re.compile(r'^([A-Za-z \.\-]+):$') 
-    ignore_phrases = ["Time", "Podcast Episode Highlights", "Hide Highlights"]
-
-    for line in lines:
-        line = line.strip()
-        if not line: continue
-        if line in ignore_phrases: continue
-        if timestamp_pattern.match(line): continue
-
-        speaker_match = speaker_pattern.match(line)
-        if speaker_match:
-            if current_text_buffer:
-                cleaned_dialogue.append({
-                    "speaker": current_speaker,
-                    "text": " ".join(current_text_buffer)
-                })
-                current_text_buffer = []
-            current_speaker = speaker_match.group(1)
-            continue
-
-        line = re.sub(r'\[.*?\]', '', line) 
-        current_text_buffer.append(line)
-
-    if current_text_buffer:
-        cleaned_dialogue.append({
-            "speaker": current_speaker,
-            "text": " ".join(current_text_buffer)
-        })
-        
-    return cleaned_dialogue
-
-def clean_transcript_old_era(lines):
-    """Cleaning logic for episodes between 1/23/2012 & 8/29/2016."""
-    cleaned_dialogue = []
-    current_speaker = "Narrator/Intro"
-    current_text_buffer = []
-    
-    speaker_inline_pattern = re.compile(r'^(Russ|Guest|Roberts|[A-Z][a-z]+ [A-Z][a-z]+): (.*)')
-    full_text = " ".join(lines)
-    full_text = re.sub(r'(Russ:|Guest:|Roberts:)', r'\n\1', full_text)
-    
-    split_lines = full_text.split('\n')
-
-    for line in split_lines:
-        line = line.strip()
-        if not line: continue
-        
-        if "Time Podcast Episode Highlights" in line: continue
-        
-        match = speaker_inline_pattern.match(line)
-        
-        if match:
-            if current_text_buffer:
-                cleaned_dialogue.append({
-                    "speaker": current_speaker,
-                    "text": " ".join(current_text_buffer).strip()
-                })
-                current_text_buffer = []
-            
-            current_speaker = match.group(1)
-            content = match.group(2)
-            content = re.sub(r'\[.*?\]', '', content) 
-            current_text_buffer.append(content)
-            
-        else:
-            line = re.sub(r'\[.*?\]', '', line)
-            current_text_buffer.append(line)
-
-    if current_text_buffer:
-        cleaned_dialogue.append({
-            "speaker": current_speaker,
-            "text": " ".join(current_text_buffer).strip()
-        })
-
-    return cleaned_dialogue
-
 def process_file(file_path):
+    """Cleans one raw file. Returns (status, raw_hash) where status is 'cleaned' or 'skipped'."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+        raw_hash = hashlib.sha256(raw_bytes).hexdigest()
+        raw_data = json.loads(raw_bytes.decode('utf-8'))
     except:
-        return
+        return "skipped", None
 
     # 1. Identify era
     date_obj = parse_date(raw_data.get("date"))
     if not date_obj or date_obj < ERA_START_DATE:
-        return 
+        return "skipped", raw_hash
 
     raw_text = raw_data.get("content", "")
-    lines = raw_text.split('\n') if isinstance(raw_text, str) else []
+    if not isinstance(raw_text, str):
+        raw_text = ""
 
-    # 2. Select strategy
-    if date_obj < ERA_NEW_FORMAT_DATE:
-        cleaned_dialogue = clean_transcript_old_era(lines)
-    else:
-        cleaned_dialogue = clean_transcript_new_era(lines)
+    # 2. Select strategy (old era before 8/29/2016, new era after)
+    cleaned_dialogue = clean_transcript(raw_text, new_format=date_obj >= ERA_NEW_FORMAT_DATE)
 
     # 3. Extract guest name
     raw_title = raw_data.get("title", "")
@@ -175,16 +104,116 @@ def process_file(file_path):
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(clean_data, f, indent=4, ensure_ascii=False)
 
+    return "cleaned", raw_hash
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except:
+        return {}
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def is_up_to_date(file_path, entry, stat):
+    """
+    True if the recorded clean output still matches this raw file and cleaner version.
+    An unchanged size/mtime is trusted without reading the file; otherwise the content hash decides.
+    """
+    if not entry or entry.get("cleaner_version") != CLEANER_VERSION:
+        return False
+
+    filename = os.path.basename(file_path)
+    if entry.get("status") == "cleaned" and not os.path.exists(os.path.join(OUTPUT_DIR, filename)):
+        return False
+
+    if entry.get("raw_size") == stat.st_size and entry.get("raw_mtime_ns") == stat.st_mtime_ns:
+        return True
+    if entry.get("raw_hash") == file_hash(file_path):
+        # Touched but not changed: refresh the stat so the next run skips the hash
+        entry["raw_size"] = stat.st_size
+        entry["raw_mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Clean raw EconTalk transcripts.")
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Number of processes to clean with (1 = serial).")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="Reprocess every raw file, even if its clean output is up to date.")
+    return arg_parser.parse_args()
+
 def main():
+    args = parse_args()
+    started = time.time()
+
     files = glob.glob(f"{INPUT_DIR}/*.json")
-    print(f"Processing {len(files)} files...")
-    
-    for i, file_path in enumerate(files):
-        process_file(file_path)
-        if (i + 1) % 100 == 0:
-            print(f"  Processed {i + 1}...")
-            
-    print(f"Done. Clean files saved to {OUTPUT_DIR}/")
+    # Loaded under --full too: the cleanup below needs to know which outputs exist
+    manifest = load_manifest()
+
+    # 1. Work out which raw files changed since their clean output was written
+    pending = []
+    stats = {}
+    for file_path in files:
+        filename = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        stats[filename] = stat
+        if args.full or not is_up_to_date(file_path, manifest.get(filename), stat):
+            pending.append(file_path)
+
+    # 2. Forget raw files that no longer exist (and drop their clean output)
+    for filename in set(manifest) - set(stats):
+        del manifest[filename]
+        stale_output = os.path.join(OUTPUT_DIR, filename)
+        if os.path.exists(stale_output):
+            os.remove(stale_output)
+
+    print(f"Processing {len(pending)} of {len(files)} files ({len(files) - len(pending)} up to date)...")
+
+    # 3. Clean, in parallel when there is enough work to pay for the process pool
+    if len(pending) > 1 and args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(process_file, pending, chunksize=8))
+    else:
+        results = []
+        for i, file_path in enumerate(pending):
+            results.append(process_file(file_path))
+            if (i + 1) % 100 == 0:
+                print(f"  Processed {i + 1}...")
+
+    # 4. Record what produced each output
+    cleaned = 0
+    for file_path, (status, raw_hash) in zip(pending, results):
+        filename = os.path.basename(file_path)
+        if status == "skipped":
+            # Pre-era or unreadable now: a clean output from an earlier version must not linger
+            stale_output = os.path.join(OUTPUT_DIR, filename)
+            if os.path.exists(stale_output):
+                os.remove(stale_output)
+        if raw_hash is None:
+            continue # unreadable: try again next run
+        manifest[filename] = {
+            "raw_hash": raw_hash,
+            "raw_size": stats[filename].st_size,
+            "raw_mtime_ns": stats[filename].st_mtime_ns,
+            "cleaner_version": CLEANER_VERSION,
+            "status": status
+        }
+        cleaned += status == "cleaned"
+    save_manifest(manifest)
+
+    print(f"Done. Cleaned {cleaned} files in {time.time() - started:.2f}s. Clean files saved to {OUTPUT_DIR}/")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
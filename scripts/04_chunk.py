@@ -1,6 +1,11 @@
 import json
 import os
+import re
+import sys
 import glob
+import hashlib
+import argparse
+from collections import deque
 
 # --- Path configuration ---
 # Get absolute path of the directory where this script is located
@@ -9,17 +14,62 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 # Define paths relative to the script (Go up one level (..) to root, then into 'data')
 DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
 
+# Shared modules live in the project root
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+from token_counter import get_token_counter, TOKEN_COUNTERS
+from episode_store import EpisodeStore, DEFAULT_DB_PATH, episode_header
+from lexical_index import build_lexical_index, DEFAULT_INDEX_DIR
+
 # Input: the cleaned JSON files (from 03_clean.py)
 INPUT_DIR = os.path.join(DATA_DIR, "clean")
 
-# Output: the final JSONL file for Qdrant
-OUTPUT_FILE = os.path.join(DATA_DIR, "econtalk_chunks.jsonl")
+# Output: one JSONL file of chunks per episode, plus an index of what produced them
+CHUNK_DIR = os.path.join(DATA_DIR, "chunks")
+CHUNK_INDEX_FILE = os.path.join(CHUNK_DIR, "index.json")
+
+# Output: episode table + chunk text, read by the pipeline and the chat front ends
+EPISODE_DB = DEFAULT_DB_PATH
+
+# Output: chunk IDs added/removed since the last load (consumed by 05_embed.py and 06_load_db.py)
+DELTA_FILE = os.path.join(DATA_DIR, "chunk_delta.json")
+
+# Output: BM25 index over the chunk text, for hybrid search in the front ends
+LEXICAL_INDEX_DIR = DEFAULT_INDEX_DIR
 
 # Target chunk size (in characters).
 # 1500 chars is roughly 300-400 tokens, a sweet spot for RAG
 TARGET_CHUNK_SIZE = 1500 
 OVERLAP_TURNS = 1 # how many previous turns to keep for context
 
+# Token mode: a hard per-chunk budget (header included) and overlap measured in tokens
+MAX_CHUNK_TOKENS = 400
+OVERLAP_TOKENS = 60
+SEPARATOR_TOKENS = 1 # the "\n\n" between turns
+
+# Over-long turns are split at sentence boundaries
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+# Bump whenever the chunking logic changes so every episode is re-chunked once
+# (3: chunks record their speakers, episodes a numeric date_ts, for metadata filters)
+CHUNKER_VERSION = 3
+
+if not os.path.exists(CHUNK_DIR):
+    os.makedirs(CHUNK_DIR)
+
+def chunker_settings(args):
+    """Everything that affects chunk output besides the transcript itself."""
+    settings = {"version": CHUNKER_VERSION, "mode": args.mode, "tokenizer": args.tokenizer}
+    if args.mode == "tokens":
+        settings.update({"max_tokens": args.max_tokens, "overlap_tokens": args.overlap_tokens})
+    else:
+        settings.update({"target_chunk_size": TARGET_CHUNK_SIZE, "overlap_turns": OVERLAP_TURNS})
+    return settings
+
+def make_chunk_id(url, text):
+    """Content-derived chunk ID: unchanged text keeps its ID across runs."""
+    digest = hashlib.sha256(f"{url}\n{text}".encode('utf-8')).hexdigest()[:16]
+    return f"{url}#{digest}"
+
 def create_chunks_for_episode(data):
     chunks = []
     meta = data['meta']
@@ -30,7 +80,28 @@ def create_chunks_for_episode(data):
         return []
 
     current_chunk_turns = []
+    current_chunk_speakers = []
     current_char_count = 0
+    seen_ids = set()
+
+    def seal_chunk(turns, speakers):
+        # 1. Join turns into one block of text
+        chunk_text = "\n\n".join(turns)
+
+        # 2. The ID covers the episode header (Title + Date + Guest) that gets embedded with the text
+        chunk_id = make_chunk_id(meta['url'], episode_header(meta) + chunk_text)
+        if chunk_id in seen_ids:
+            # repeated text within an episode still gets a unique ID
+            chunk_id = f"{chunk_id}_{len(chunks)}"
+        seen_ids.add(chunk_id)
+
+        # 3. Create chunk object (metadata lives in the episode table, not in every chunk;
+        #    the caller adds the episode_id once the chunks are known to be good)
+        chunks.append({
+            "id": chunk_id,                        # unique, content-derived ID
+            "text": chunk_text,                    # the dialogue (header is added back when embedding)
+            "speakers": sorted(set(speakers))      # filter field (guest and date_ts live in the episode table)
+        })
     
     # Iterate through the dialogue turns
     for i, turn in enumerate(transcript):
@@ -41,79 +112,289 @@ def create_chunks_for_episode(data):
         formatted_turn = f"{speaker}: {text}"
         
         current_chunk_turns.append(formatted_turn)
+        current_chunk_speakers.append(speaker)
         current_char_count += len(formatted_turn)
         
         # If target size is hit, seal chunk
         if current_char_count >= TARGET_CHUNK_SIZE:
-            
-            # 1. Join turns into one block of text
-            chunk_text = "\n\n".join(current_chunk_turns)
-            
-            # 2. Add rich context (Title + Date) to the top of the chunk (helping embedding model understand the topic immediately)
-            contextualized_text = (
-                f"Podcast: {meta['title']}\n"
-                f"Date: {meta['date']}\n"
-                f"Guest: {meta['guest']}\n\n"
-                f"{chunk_text}"
-            )
-            
-            # 3. Create chunk object
-            chunk_record = {
-                "id": f"{meta['url']}_{len(chunks)}", # unique ID
-                "text": contextualized_text,           # the content to embed
-                "metadata": meta                       # original metadata for filtering later
-            }
-            chunks.append(chunk_record)
+            seal_chunk(current_chunk_turns, current_chunk_speakers)
             
             # 4. Reset for next chunk (with overlap)
             # Keep the last N turns to maintain flow
             overlap = current_chunk_turns[-OVERLAP_TURNS:]
             current_chunk_turns = overlap
+            current_chunk_speakers = current_chunk_speakers[-OVERLAP_TURNS:]
             current_char_count = sum(len(t) for t in overlap)
 
     # Take care of last leftover chunk
     if current_chunk_turns:
-        chunk_text = "\n\n".join(current_chunk_turns)
-        contextualized_text = (
-            f"Podcast: {meta['title']}\n"
-            f"Date: {meta['date']}\n"
-            f"Guest: {meta['guest']}\n\n"
-            f"{chunk_text}"
-        )
-        chunk_record = {
-            "id": f"{meta['url']}_{len(chunks)}",
-            "text": contextualized_text,
-            "metadata": meta
-        }
-        chunks.append(chunk_record)
+        seal_chunk(current_chunk_turns, current_chunk_speakers)
+
+    return chunks
+
+def split_long_turn(speaker, text, budget, counter):
+    """
+    Splits a turn that can't fit in one chunk into parts of at most `budget` tokens,
+    cutting at sentence boundaries (and between words for a single run-on sentence).
+    Every part keeps the speaker label. Returns [(formatted_text, tokens), ...].
+    """
+    label = f"{speaker}: "
+    label_tokens = counter.count(label)
+    room = max(1, budget - label_tokens)
+
+    units = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        tokens = counter.count(sentence)
+        if tokens <= room:
+            units.append((sentence, tokens))
+            continue
+        # A single sentence over budget: fall back to word boundaries
+        for word in sentence.split():
+            tokens = counter.count(word)
+            if tokens <= room:
+                units.append((word, tokens))
+                continue
+            # Last resort for a giant "word" (e.g. a pasted URL list): cut it into character slices
+            step = max(1, len(word) * room // (tokens + 1))
+            units.extend((word[i:i + step], counter.count(word[i:i + step])) for i in range(0, len(word), step))
+
+    parts = []
+    current, current_tokens = [], 0
+    for unit, tokens in units:
+        # +1 for the space that joins units
+        if current and current_tokens + 1 + tokens > room:
+            parts.append(current)
+            current, current_tokens = [], 0
+        current_tokens += tokens + (1 if current else 0)
+        current.append(unit)
+    if current:
+        parts.append(current)
+
+    results = []
+    for part in parts:
+        formatted = label + " ".join(part)
+        results.append((formatted, counter.count(formatted)))
+    return results
+
+def create_token_chunks_for_episode(data, counter, max_tokens, overlap_tokens):
+    """
+    Token-budgeted chunking: every chunk (header included) stays within max_tokens.
+    Turns are packed whole where they fit, over-long turns are split at sentence boundaries,
+    and consecutive chunks share up to overlap_tokens of trailing turns.
+    """
+    chunks = []
+    meta = data['meta']
+    transcript = data['transcript']
+    if not transcript:
+        return []
+
+    header = episode_header(meta)
+    budget = max_tokens - counter.count(header)
+    if budget <= 0:
+        # Every chunk would be over budget before any dialogue; raise --max-tokens instead
+        raise ValueError(f"the episode header alone is {counter.count(header)} tokens, "
+                         f"which leaves no room under --max-tokens {max_tokens}")
+    seen_ids = set()
+
+    # 1. Turn the transcript into (text, tokens, speaker) pieces that each fit in a chunk on their own
+    pieces = []
+    for turn in transcript:
+        formatted_turn = f"{turn['speaker']}: {turn['text']}"
+        tokens = counter.count(formatted_turn)
+        if tokens <= budget:
+            pieces.append((formatted_turn, tokens, turn['speaker']))
+        else:
+            pieces.extend((part, part_tokens, turn['speaker'])
+                          for part, part_tokens in split_long_turn(turn['speaker'], turn['text'], budget, counter))
+
+    # 2. Pack pieces; the window and its token total are updated incrementally
+    window = deque()
+    window_tokens = 0
+    has_new_content = False
+
+    def seal_chunk():
+        chunk_text = "\n\n".join(text for text, _, _ in window)
+        chunk_id = make_chunk_id(meta['url'], header + chunk_text)
+        if chunk_id in seen_ids:
+            chunk_id = f"{chunk_id}_{len(chunks)}"
+        seen_ids.add(chunk_id)
+        chunks.append({
+            "id": chunk_id,
+            "text": chunk_text,
+            "speakers": sorted({speaker for _, _, speaker in window})
+        })
+
+    for text, tokens, speaker in pieces:
+        if window and window_tokens + SEPARATOR_TOKENS + tokens > budget:
+            seal_chunk()
+            has_new_content = False
+
+            # Keep trailing pieces as overlap, as long as they fit the overlap budget
+            # and still leave room for the incoming piece
+            while window and (window_tokens > overlap_tokens or
+                              window_tokens + SEPARATOR_TOKENS + tokens > budget):
+                _, dropped, _ = window.popleft()
+                window_tokens -= dropped + (SEPARATOR_TOKENS if window else 0)
+
+        window_tokens += tokens + (SEPARATOR_TOKENS if window else 0)
+        window.append((text, tokens, speaker))
+        has_new_content = True
+
+    # Take care of last leftover chunk (unless it would only repeat the overlap)
+    if window and has_new_content:
+        seal_chunk()
 
     return chunks
 
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report_chunk_sizes(index, counter_name, max_tokens=None):
+    """Prints the chunk-size distribution (in tokens) over the whole chunk store."""
+    sizes = sorted(tokens for entry in index.values() for tokens in entry.get("chunk_tokens", []))
+    if not sizes:
+        return
+    print(f"Chunk sizes ({counter_name} tokens): min {sizes[0]}, p50 {percentile(sizes, 50)}, "
+          f"p90 {percentile(sizes, 90)}, p99 {percentile(sizes, 99)}, max {sizes[-1]}, "
+          f"mean {sum(sizes) / len(sizes):.0f}")
+    print(f"  Total: {sum(sizes)} tokens to embed across {len(sizes)} chunks.")
+    if max_tokens:
+        over = sum(1 for size in sizes if size > max_tokens)
+        print(f"  Chunks over the {max_tokens}-token budget: {over}")
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except:
+        return default
+
+def save_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def write_episode_chunks(slug, chunks):
+    path = os.path.join(CHUNK_DIR, f"{slug}.jsonl")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out_f:
+        for chunk in chunks:
+            # Write each chunk as a separate line (JSONL format)
+            out_f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+
+def merge_delta(added, removed, episodes):
+    """
+    Folds this run's changes into any delta the loader hasn't applied yet, so running
+    this stage twice before a load doesn't lose changes.
+    """
+    pending = load_json(DELTA_FILE, {"added": [], "removed": [], "episodes": []})
+    all_added = (set(pending["added"]) - removed) | added
+    all_removed = (set(pending["removed"]) - added) | removed
+    return {
+        "added": sorted(all_added),
+        "removed": sorted(all_removed),
+        "episodes": sorted(set(pending.get("episodes", [])) | episodes)
+    }
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Split clean EconTalk transcripts into chunks.")
+    arg_parser.add_argument("--mode", choices=["chars", "tokens"], default="chars",
+                            help="'chars': ~TARGET_CHUNK_SIZE characters per chunk (original). "
+                                 "'tokens': hard token budget per chunk.")
+    arg_parser.add_argument("--max-tokens", type=int, default=MAX_CHUNK_TOKENS,
+                            help="Token budget per chunk, header included (token mode).")
+    arg_parser.add_argument("--overlap-tokens", type=int, default=OVERLAP_TOKENS,
+                            help="Maximum tokens of trailing turns repeated in the next chunk (token mode).")
+    arg_parser.add_argument("--tokenizer", choices=sorted(TOKEN_COUNTERS), default="approx",
+                            help="Token counter used for budgets and size stats.")
+    return arg_parser.parse_args()
+
 def main():
+    args = parse_args()
+    counter = get_token_counter(args.tokenizer)
     files = glob.glob(f"{INPUT_DIR}/*.json")
-    print(f"Chunking {len(files)} episodes...")
+    index = load_json(CHUNK_INDEX_FILE, {})
+    store = EpisodeStore(EPISODE_DB)
+    stored_slugs = store.slugs()
+    settings_json = json.dumps(chunker_settings(args), sort_keys=True)
+    print(f"Chunking {len(files)} episodes ({args.mode} mode)...")
     
+    added, removed = set(), set()
+    changed_episodes = set()
     total_chunks = 0
-    
-    # Open output file in Write mode
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as out_f:
-        for file_path in files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
+    current_slugs = set()
+
+    for file_path in files:
+        slug = os.path.splitext(os.path.basename(file_path))[0]
+        current_slugs.add(slug)
+        try:
+            with open(file_path, 'rb') as f:
+                raw_bytes = f.read()
+
+            # Key = clean transcript + chunker settings; unchanged episodes are skipped
+            key = hashlib.sha256(raw_bytes + settings_json.encode('utf-8')).hexdigest()
+            entry = index.get(slug)
+            if (entry and entry["key"] == key and slug in stored_slugs
+                    and os.path.exists(os.path.join(CHUNK_DIR, f"{slug}.jsonl"))):
+                total_chunks += len(entry["chunk_ids"])
+                continue
+
+            data = json.loads(raw_bytes.decode('utf-8'))
+            # Chunk before touching the store, so an episode that fails to chunk leaves its row as it was
+            if args.mode == "tokens":
+                episode_chunks = create_token_chunks_for_episode(data, counter, args.max_tokens, args.overlap_tokens)
+            else:
                 episode_chunks = create_chunks_for_episode(data)
+            episode_id = store.upsert_episode(slug, data['meta'])
+            store.replace_chunks(episode_id, [(chunk["id"], chunk["text"], chunk["speakers"])
+                                              for chunk in episode_chunks])
+            for chunk in episode_chunks:
+                chunk["episode_id"] = episode_id  # key into the episode table
+            write_episode_chunks(slug, episode_chunks)
+            header = episode_header(data['meta'])
+
+            old_ids = set(entry["chunk_ids"]) if entry else set()
+            new_ids = [chunk["id"] for chunk in episode_chunks]
+            added |= set(new_ids) - old_ids
+            removed |= old_ids - set(new_ids)
+
+            index[slug] = {
+                "key": key,
+                "chunk_ids": new_ids,
+                "chunk_tokens": [counter.count(header + chunk["text"]) for chunk in episode_chunks]
+            }
+            changed_episodes.add(slug)
+            total_chunks += len(new_ids)
                 
-                for chunk in episode_chunks:
-                    # Write each chunk as a separate line (JSONL format)
-                    out_f.write(json.dumps(chunk, ensure_ascii=False) + '\n')
-                    total_chunks += 1
-                    
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+
+    # Episodes whose clean file disappeared lose all their chunks
+    for slug in set(index) - current_slugs:
+        removed |= set(index.pop(slug)["chunk_ids"])
+        store.remove_episode(slug)
+        stale_path = os.path.join(CHUNK_DIR, f"{slug}.jsonl")
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    # Commit the store before the index, so the index never points at chunks the store lacks
+    store.commit()
+    if changed_episodes or removed or not os.path.exists(LEXICAL_INDEX_DIR):
+        docs, terms, postings = build_lexical_index(store.iter_chunks(), LEXICAL_INDEX_DIR)
+        print(f"Lexical index: {docs} chunks, {terms} terms, {postings} postings.")
+    store.close()
+    save_json(CHUNK_INDEX_FILE, index)
+    if added or removed:
+        save_json(DELTA_FILE, merge_delta(added, removed, changed_episodes))
 
-    print(f"Done. Generated {total_chunks} chunks.")
-    print(f"Saved to '{OUTPUT_FILE}'")
+    print(f"Done. {total_chunks} chunks across {len(index)} episodes "
+          f"({len(changed_episodes)} episodes re-chunked, {len(added)} chunks added, {len(removed)} removed).")
+    report_chunk_sizes(index, args.tokenizer, args.max_tokens if args.mode == "tokens" else None)
+    print(f"Saved to '{CHUNK_DIR}'")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,9 @@
 import json
 import os
-import time
-from openai import OpenAI, RateLimitError
+import sys
+import asyncio
+import argparse
+from openai import AsyncOpenAI
 from tqdm import tqdm
 
 from dotenv import load_dotenv
@@ -12,13 +14,32 @@ load_dotenv()
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
 
-# Input: the final JSONL file for Qdrant (from 04_chunk.py)
-INPUT_FILE = os.path.join(DATA_DIR, "econtalk_chunks.jsonl")
+# Shared modules live in the project root
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+from episode_store import EpisodeStore, DEFAULT_DB_PATH, contextualize
+from embedding_cache import EmbeddingCache, normalize_text
+from token_counter import TOKEN_COUNTERS, get_token_counter
+from vector_store import VectorStore, DEFAULT_VECTOR_DIR, DTYPES
+from embed_engine import EmbeddingEngine, EmbeddingRequestError, pack_batches, openai_sender, MAX_BATCH_TOKENS, DEFAULT_CONCURRENCY
 
-# Output: the final vector JSONL file
-OUTPUT_FILE = os.path.join(DATA_DIR, "econtalk_vectors.jsonl")
+# Input: the per-episode chunk files and the pending chunk delta (from 04_chunk.py)
+CHUNK_DIR = os.path.join(DATA_DIR, "chunks")
+CHUNK_INDEX_FILE = os.path.join(CHUNK_DIR, "index.json")
+DELTA_FILE = os.path.join(DATA_DIR, "chunk_delta.json")
 
-BATCH_SIZE = 50
+# Input: episode metadata (from 04_chunk.py), used to rebuild each chunk's header for embedding
+EPISODE_DB = DEFAULT_DB_PATH
+
+# Output: binary vector store (float matrix + ID index)
+VECTOR_DIR = DEFAULT_VECTOR_DIR
+
+# Vectors written by older versions (JSON float lists), migrated on first run
+LEGACY_OUTPUT_FILE = os.path.join(DATA_DIR, "econtalk_vectors.jsonl")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Chunks read into memory at a time; the chunk files are streamed window by window
+WINDOW_SIZE = 5000
 
 api_key = os.getenv("OPENAI_API_KEY")
 
@@ -26,92 +47,200 @@ if not api_key:
     print("Error: OPENAI_API_KEY not found. Did you create the .env file?")
     exit(1)
 
-client = OpenAI(api_key=api_key)
-
-def get_existing_ids():
-    """Scans the output file to see which chunk IDs are already done."""
-    existing_ids = set()
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    existing_ids.add(data['id'])
-                except:
-                    pass
-    return existing_ids
-
-def get_embeddings_with_retry(texts, model="text-embedding-3-small"):
+# Identical text (e.g. after re-chunking) is never paid for twice
+embedding_cache = EmbeddingCache()
+
+def open_vector_store(dtype):
+    """Opens the binary vector store, migrating the old JSONL vector file into it the first time."""
+    vector_store = VectorStore(VECTOR_DIR, dtype=dtype)
+    if len(vector_store) == 0 and os.path.exists(LEGACY_OUTPUT_FILE):
+        print(f"Migrating {LEGACY_OUTPUT_FILE} into the binary vector store...")
+        store = EpisodeStore(EPISODE_DB, read_only=True)
+        imported = vector_store.import_jsonl(LEGACY_OUTPUT_FILE, store.chunk_episode_ids())
+        store.close()
+        print(f"Imported {imported} vectors. The old JSONL file is no longer used and can be deleted.")
+    return vector_store
+
+def load_delta():
+    """Returns the chunk delta written by 04_chunk.py, or None if there isn't one."""
+    if not os.path.exists(DELTA_FILE):
+        return None
+    with open(DELTA_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def keep_pending(index, slugs, embedded_ids):
+    """
+    Adds chunks of the scanned episodes that still have no vector to the chunk delta, so the next
+    run embeds them and 06_load_db.py --delta loads them, even if a load clears the delta first.
+    Returns how many there are.
     """
-    Tries to get embeddings. If it hits a rate limit (429), it waits and tries again automatically."""
-    # Normalize text
-    texts = [t.replace("\n", " ") for t in texts]
-    
-    while True:
-        try:
-            response = client.embeddings.create(input=texts, model=model)
-            return [data.embedding for data in response.data]
-        
-        except RateLimitError:
-            print("\nRate limit hit: Pausing for 10 seconds to cool down...")
-            time.sleep(10)  # Wait 10 seconds before retrying
-            
-        except Exception as e:
-            print(f"\nCritical error: {e}")
-            # For non-rate-limit errors, might want to skip or raise; for now, break to avoid infinite loops on bad data
-            return None
+    missing = {slug: [chunk_id for chunk_id in index[slug]["chunk_ids"] if chunk_id not in embedded_ids]
+               for slug in slugs if slug in index}
+    missing = {slug: chunk_ids for slug, chunk_ids in missing.items() if chunk_ids}
+    if not missing:
+        return 0
+    delta = load_delta() or {"added": [], "removed": [], "episodes": []}
+    delta["added"] = sorted(set(delta["added"]).union(*missing.values()))
+    delta["episodes"] = sorted(set(delta.get("episodes", [])) | set(missing))
+    tmp_path = DELTA_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(delta, f)
+    os.replace(tmp_path, DELTA_FILE)
+    return sum(len(chunk_ids) for chunk_ids in missing.values())
+
+def load_chunk_index():
+    with open(CHUNK_INDEX_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def get_current_chunk_ids(index):
+    """All chunk IDs currently in the chunk store, from its index (no chunk files are read)."""
+    return {chunk_id for entry in index.values() for chunk_id in entry["chunk_ids"]}
+
+def count_pending(index, slugs, existing_ids):
+    """Chunks still to embed, counted from the index alone."""
+    return sum(1 for slug in slugs if slug in index
+               for chunk_id in index[slug]["chunk_ids"] if chunk_id not in existing_ids)
+
+def read_chunks(slugs, skip_ids):
+    """Streams chunk records for the given episodes, skipping IDs that are already embedded."""
+    for slug in slugs:
+        path = os.path.join(CHUNK_DIR, f"{slug}.jsonl")
+        if not os.path.exists(path):
+            continue # episode was removed after the delta was written
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['id'] not in skip_ids:
+                    yield record
+
+def save_vectors(vector_store, records_by_text, texts, vectors):
+    # IDs + vector only; text and metadata stay in the episode store
+    records, rows = [], []
+    for text, vector in zip(texts, vectors):
+        for record in records_by_text[text]:
+            records.append(record)
+            rows.append(vector)
+    vector_store.append(records, rows)
+    return len(records)
+
+async def embed_window(window, episodes, vector_store, engine, batch_tokens, progress):
+    """Embeds one window of chunk records: cache hits first, then the misses through the engine."""
+    # Identical texts are only embedded once
+    records_by_text = {}
+    for record in window:
+        text = normalize_text(contextualize(episodes[record['episode_id']], record['text']))
+        records_by_text.setdefault(text, []).append(record)
+    texts = list(records_by_text)
+    cached = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+
+    hits = [(text, vector) for text, vector in zip(texts, cached) if vector is not None]
+    if hits:
+        progress.update(save_vectors(vector_store, records_by_text, *zip(*hits)))
+    missing = [text for text, vector in zip(texts, cached) if vector is None]
+
+    def on_result(batch_texts, vectors):
+        embedding_cache.put_many(EMBEDDING_MODEL, batch_texts, vectors)
+        # Each completed batch is committed to disk, so an interrupted run resumes from here
+        progress.update(save_vectors(vector_store, records_by_text, batch_texts, vectors))
+
+    await engine.run(pack_batches(missing, engine.counter, max_tokens=batch_tokens), on_result)
+
+async def embed_chunks(chunks, episodes, vector_store, engine, batch_tokens, progress):
+    """Embeds a stream of chunk records WINDOW_SIZE at a time, so memory stays bounded on any corpus."""
+    window = []
+    for record in chunks:
+        window.append(record)
+        if len(window) >= WINDOW_SIZE:
+            await embed_window(window, episodes, vector_store, engine, batch_tokens, progress)
+            window = []
+    if window:
+        await embed_window(window, episodes, vector_store, engine, batch_tokens, progress)
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Embed EconTalk chunks with OpenAI.")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="Scan every episode's chunks instead of only those changed in the chunk delta.")
+    arg_parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                            help="Maximum embedding requests in flight (lowered automatically on rate limits).")
+    arg_parser.add_argument("--batch-tokens", type=int, default=MAX_BATCH_TOKENS,
+                            help="Token budget per embedding request.")
+    arg_parser.add_argument("--tokenizer", choices=sorted(TOKEN_COUNTERS), default="approx",
+                            help="Token counter used to pack requests.")
+    arg_parser.add_argument("--base-url", default=None,
+                            help="OpenAI-compatible API base URL (e.g. a local stub server for testing).")
+    arg_parser.add_argument("--dtype", choices=DTYPES, default="float32",
+                            help="Storage precision for a new vector store (float16 halves its size).")
+    return arg_parser.parse_args()
 
 def main():
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: {INPUT_FILE} not found.")
+    args = parse_args()
+    if not os.path.exists(CHUNK_INDEX_FILE):
+        print(f"Error: {CHUNK_INDEX_FILE} not found. Did you run '04_chunk.py'?")
         return
 
     # 1. Check what's already done
     print("Checking existing progress...")
-    existing_ids = get_existing_ids()
-    print(f"Found {len(existing_ids)} vectors already saved.")
-
-    # 2. Read all chunks
-    print("Reading input chunks...")
-    all_chunks = []
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        for line in f:
-            all_chunks.append(json.loads(line))
-            
-    # 3. Filter out chunks that are already done
-    pending_chunks = [c for c in all_chunks if c['id'] not in existing_ids]
-    print(f"Remaining chunks to embed: {len(pending_chunks)}")
-
-    if not pending_chunks:
+    vector_store = open_vector_store(args.dtype)
+    existing_ids = set(vector_store.ids())
+    print(f"Found {len(existing_ids)} vectors already saved ({vector_store.dtype.name}).")
+
+    # 2. Drop vectors for chunks that no longer exist (removed/changed episodes, old positional IDs)
+    index = load_chunk_index()
+    stale_ids = existing_ids - get_current_chunk_ids(index)
+    if stale_ids:
+        kept = vector_store.remove(stale_ids)
+        existing_ids -= stale_ids
+        print(f"Pruned {len(stale_ids)} stale vectors ({kept} kept).")
+
+    # 3. Pick episodes to scan (only changed ones when a delta is available)
+    delta = load_delta()
+    if delta and not args.full:
+        slugs = delta["episodes"]
+        print(f"Scanning chunks for {len(slugs)} changed episodes...")
+    else:
+        slugs = sorted(index)
+        print("Scanning input chunks...")
+
+    # 4. Count what's left from the index; chunk files are only streamed below
+    pending = count_pending(index, slugs, existing_ids)
+    print(f"Remaining chunks to embed: {pending}")
+
+    if not pending:
         print("All chunks are already embedded. You are done.")
         return
 
-    # 4. Process in batches
-    with open(OUTPUT_FILE, 'a', encoding='utf-8') as outfile: # 'a' for Append mode
-        
-        batch_lines = []
-        batch_objects = []
-        
-        # Assume pending_chunks is the list to process
-        for i, record in enumerate(tqdm(pending_chunks)):
-            batch_lines.append(record['text'])
-            batch_objects.append(record)
-            
-            # Use >= comparison or check if it's the very last item
-            if len(batch_lines) >= BATCH_SIZE or i == len(pending_chunks) - 1:
-                
-                vectors = get_embeddings_with_retry(batch_lines)
-                
-                if vectors:
-                    for j, vector in enumerate(vectors):
-                        batch_objects[j]['embedding'] = vector
-                        outfile.write(json.dumps(batch_objects[j]) + '\n')
-                
-                # Reset batch
-                batch_lines = []
-                batch_objects = []
-
-    print(f"\nDone. Corpus embedding complete.")
+    # Chunks only carry an episode_id; the header (Title + Date + Guest) is embedded with the text
+    store = EpisodeStore(EPISODE_DB, read_only=True)
+    episodes = store.episodes()
+    store.close()
+
+    # 5. Embed: cache hits are saved straight away, misses go out with several requests in flight
+    counter = get_token_counter(args.tokenizer)
+    client = AsyncOpenAI(api_key=api_key, base_url=args.base_url, max_retries=0)
+    engine = EmbeddingEngine(openai_sender(client, EMBEDDING_MODEL), counter, max_concurrency=args.concurrency)
+    print(f"Embedding with up to {args.concurrency} requests in flight...")
+    progress = tqdm(total=pending)
+
+    try:
+        asyncio.run(embed_chunks(read_chunks(slugs, existing_ids), episodes, vector_store,
+                                 engine, args.batch_tokens, progress))
+    except EmbeddingRequestError as e:
+        print(f"\nCritical error: {e}")
+        return
+    finally:
+        progress.close()
+        engine.stats.report(engine.limiter)
+
+    if engine.failed:
+        pending = keep_pending(index, slugs, set(vector_store.ids()))
+        print(f"{pending} chunks could not be embedded; they stay in the chunk delta and will be "
+              f"retried on the next run, then loaded by 06_load_db.py --delta.")
+
+    cache_stats = embedding_cache.stats()
+    print(f"\nDone. Corpus embedding complete: {len(vector_store)} vectors, "
+          f"{vector_store.disk_bytes() / 1e6:.1f} MB on disk.")
+    print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"({cache_stats['hit_rate']:.0%} served without an API call).")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
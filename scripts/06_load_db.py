@@ -1,101 +1,366 @@
 import json
 import os
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    PointStruct, Filter, FieldCondition, MatchAny, FilterSelector,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation,
+    OptimizersConfigDiff, CollectionStatus, PayloadSchemaType
+)
 from tqdm import tqdm
 
+load_dotenv()
+
 # --- Path configuration ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(SCRIPT_DIR, '..', 'data')
 
-# Input: the final vector JSONL file (from 05_embed.py)
-INPUT_FILE = os.path.join(DATA_DIR, "econtalk_vectors.jsonl")
+# Shared modules live in the project root
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..'))
+from vector_store import VectorStore, DEFAULT_VECTOR_DIR, META_FILE
+from collection_profiles import PROFILES, configured_profile, collection_config
+from retrieval import point_id
+from episode_store import EpisodeStore
+
+# Input: the binary vector store (from 05_embed.py)
+VECTOR_DIR = DEFAULT_VECTOR_DIR
+
+# Input: chunk IDs added/removed since the last load (from 04_chunk.py)
+DELTA_FILE = os.path.join(DATA_DIR, "chunk_delta.json")
 
 # Qdrant configuration
+# The front ends query this name. It is an alias that a full rebuild repoints, in one atomic
+# operation, to a fresh versioned collection ("econtalk_episodes_v<timestamp>").
 COLLECTION_NAME = "econtalk_episodes"
-VECTOR_SIZE = 1536 
+VECTOR_SIZE = 1536
 BATCH_SIZE = 500
-QDRANT_URL = "http://localhost:6333"
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+# Set QDRANT_PATH to use Qdrant's local mode (a directory on disk, no server) instead of QDRANT_URL
+QDRANT_PATH = os.getenv("QDRANT_PATH")
 
-def load_data():
-    # 1. Check for input file
-    if not os.path.exists(INPUT_FILE):
-        print(f"Error: Could not find {INPUT_FILE}")
-        print("Did you run '05_embed.py'?")
-        return
+# Bulk mode: points per upload request, and the HNSW indexing threshold (KB) restored after
+# the load (Qdrant's default). Indexing is switched off (threshold 0) while points stream in.
+BULK_BATCH_SIZE = 256
+INDEXING_THRESHOLD_KB = 20000
+INDEX_WAIT_SECONDS = 1800
+# The optimizer picks up the re-enabled threshold asynchronously; until it does, the collection
+# still reports GREEN. If it hasn't started within this window, there is nothing to index
+# (every segment is below the threshold).
+OPTIMIZER_PICKUP_SECONDS = 15
+
+# Payload fields the front ends filter on, indexed so filtered searches stay inside the HNSW
+# traversal instead of scanning payloads (date_ts: episode date as a Unix timestamp)
+PAYLOAD_INDEXES = {
+    "episode_id": PayloadSchemaType.INTEGER,
+    "date_ts": PayloadSchemaType.INTEGER,
+    "guest": PayloadSchemaType.KEYWORD,
+    "speakers": PayloadSchemaType.KEYWORD,
+}
 
-    # 2. Connect to Qdrant (with error handling)
-    print(f"Connecting to Qdrant at {QDRANT_URL}...")
+# Older versions kept after a rebuild, so a bad load can be rolled back by repointing the alias
+KEEP_OLD_VERSIONS = 1
+
+def connect(grpc=False):
+    """Connects to Qdrant (with error handling). Returns None if the server isn't reachable."""
+    if QDRANT_PATH:
+        print(f"Opening local Qdrant at {QDRANT_PATH}...")
+        return QdrantClient(path=QDRANT_PATH)
+
+    print(f"Connecting to Qdrant at {QDRANT_URL}{' (gRPC)' if grpc else ''}...")
     try:
-        client = QdrantClient(url=QDRANT_URL)
+        client = QdrantClient(url=QDRANT_URL, prefer_grpc=grpc)
         # Test connection
         client.get_collections()
+        return client
     except Exception as e:
         print("\nConnection failed.")
         print(f"Could not connect to Qdrant at {QDRANT_URL}.")
         print("Is your Docker container running?")
         print("Try running: docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant")
-        return
+        return None
+
+def open_vector_store():
+    """Opens the vector store written by 05_embed.py, or returns None if there isn't one."""
+    if not os.path.exists(os.path.join(VECTOR_DIR, META_FILE)):
+        print(f"Error: Could not find the vector store in {VECTOR_DIR}")
+        print("Did you run '05_embed.py'?")
+        return None
+    # Read-only: opening for writing recovers (truncates) the files, which would cut off a running 05_embed.py
+    return VectorStore(VECTOR_DIR, read_only=True)
 
-    # 3. Reset collection (full refresh)
+def make_payload(record, fields):
+    """
+    Qdrant payloads hold IDs plus the filter fields (fields: EpisodeStore.filter_fields());
+    text and metadata are resolved from the episode store.
+    """
+    filter_fields = fields.get(record['id'], {})
+    return {
+        "source_id": record['id'],
+        "episode_id": record['episode_id'],
+        "date_ts": filter_fields.get('date_ts'),
+        "guest": filter_fields.get('guest'),
+        "speakers": filter_fields.get('speakers', [])
+    }
+
+def create_payload_indexes(client, collection_name):
+    """Indexes the filter fields (PAYLOAD_INDEXES); creating an existing index is a no-op."""
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        client.create_payload_index(collection_name=collection_name, field_name=field_name,
+                                    field_schema=schema, wait=True)
+
+def as_lists(matrix):
+    """Memmap rows -> plain float lists for the client (float16 stores are widened first)."""
+    return matrix.astype('float32', copy=False).tolist()
+
+def upsert_rows(client, collection_name, vector_store, rows, fields, progress=None):
+    """Upserts the given rows of the vector store, BATCH_SIZE points per request."""
+    matrix = vector_store.vectors()
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        points = [
+            PointStruct(
+                id=point_id(vector_store.records[row]['id']),
+                vector=vector,
+                payload=make_payload(vector_store.records[row], fields)
+            )
+            for row, vector in zip(batch, as_lists(matrix[batch]))
+        ]
+        client.upsert(collection_name=collection_name, wait=True, points=points)
+        if progress:
+            progress.update(len(points))
+
+def alias_target(client):
+    """The collection the alias currently points to, or None."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == COLLECTION_NAME:
+            return alias.collection_name
+    return None
+
+def resolve_collection(client):
+    """The collection the front ends are reading: the alias target, or a plain collection from older loads."""
+    target = alias_target(client)
+    if target:
+        return target
     if client.collection_exists(collection_name=COLLECTION_NAME):
-        client.delete_collection(collection_name=COLLECTION_NAME)
-        print(f"Deleted existing collection '{COLLECTION_NAME}'.")
+        return COLLECTION_NAME
+    return None
+
+def versioned_collections(client):
+    prefix = f"{COLLECTION_NAME}_v"
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(prefix))
+
+def finish_delta(vector_store, delta):
+    """
+    The collection now reflects every chunk change that has a vector, so the delta is done,
+    except for added chunks 05_embed.py couldn't embed yet: they stay pending for the next load.
+    """
+    embedded = set(vector_store.ids())
+    pending = [chunk_id for chunk_id in (delta or {}).get("added", []) if chunk_id not in embedded]
+    if pending:
+        with open(DELTA_FILE, 'w', encoding='utf-8') as f:
+            json.dump({"added": pending, "removed": [], "episodes": delta.get("episodes", [])}, f)
+        print(f"{len(pending)} added chunks have no vector yet; they stay in the delta for the next load.")
+    elif os.path.exists(DELTA_FILE):
+        os.remove(DELTA_FILE)
+
+def apply_delta(client, vector_store, delta, fields):
+    """Applies only the chunk changes from 04_chunk.py: deletes removed chunks, upserts added ones."""
+    added, removed = set(delta["added"]), delta["removed"]
+    collection_name = resolve_collection(client)
+    if collection_name is None:
+        print(f"Error: Collection '{COLLECTION_NAME}' does not exist. Run a full load first.")
+        return False
+    # Collections from older loads lack the indexes (and their points the filter fields: rebuild once)
+    create_payload_indexes(client, collection_name)
+
+    # 1. Delete points for chunks that were removed or changed
+    # (by source_id, which also matches points from loads that used positional IDs)
+    if removed:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(filter=Filter(must=[
+                FieldCondition(key="source_id", match=MatchAny(any=removed))
+            ])),
+            wait=True
+        )
+        print(f"Deleted points for {len(removed)} removed chunks.")
 
+    # 2. Upsert the new chunks' vectors (only their rows of the memmap are read).
+    # Point IDs come from the chunk ID, so re-applying the same delta is harmless.
+    rows = [row for row, source_id in enumerate(vector_store.ids()) if source_id in added]
+    upsert_rows(client, collection_name, vector_store, rows, fields)
+
+    print(f"Done. Applied delta to '{collection_name}': {len(added)} chunks added, {len(removed)} removed.")
+    return True
+
+def bulk_upload(client, collection_name, vector_store, parallel, fields):
+    """
+    Streams the memmap to Qdrant over `parallel` concurrent upload streams (worker processes that
+    each serialize and send their own batches, retrying failed requests).
+    """
+    records = vector_store.records
+    client.upload_collection(
+        collection_name=collection_name,
+        vectors=vector_store.vectors(),
+        payload=(make_payload(record, fields) for record in records),
+        ids=(point_id(record['id']) for record in records),
+        batch_size=BULK_BATCH_SIZE,
+        parallel=parallel,
+        max_retries=5,
+        wait=True
+    )
+
+def wait_for_indexing(client, collection_name):
+    """
+    Waits for the optimizer to finish building the index after a bulk load. Returns False if it
+    is still indexing after INDEX_WAIT_SECONDS.
+    """
+    started = time.time()
+    indexing = False
+    while time.time() - started < INDEX_WAIT_SECONDS:
+        info = client.get_collection(collection_name=collection_name)
+        if info.status != CollectionStatus.GREEN:
+            # The optimizer has picked up the change; wait for it to go back to GREEN
+            indexing = True
+        elif indexing or (info.indexed_vectors_count or 0) >= (info.points_count or 0):
+            print(f"Index built in {time.time() - started:.1f}s "
+                  f"({info.indexed_vectors_count or 0} of {info.points_count} vectors indexed).")
+            return True
+        elif time.time() - started > OPTIMIZER_PICKUP_SECONDS:
+            print(f"Nothing to index after {OPTIMIZER_PICKUP_SECONDS}s (segments below the indexing threshold).")
+            return True
+        time.sleep(1)
+    print(f"Error: '{collection_name}' is still indexing after {INDEX_WAIT_SECONDS}s.")
+    return False
+
+def check_point_count(client, collection_name, expected):
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count != expected:
+        print(f"Error: '{collection_name}' has {count} points, expected {expected}.")
+        return False
+    print(f"Consistency check passed: {count} points.")
+    return True
+
+def rebuild(client, vector_store, fields, bulk=False, parallel=1, profile=None, allow_unindexed=False):
+    """
+    Loads every vector into a new versioned collection, then repoints the alias to it.
+    The previous collection keeps serving queries until the swap (and keeps serving if the
+    new one fails its point-count check, or a bulk load's index isn't built in time unless
+    allow_unindexed). Returns the new collection's name, or None.
+    """
+    profile = profile or configured_profile()
+
+    # 1. Build the new version next to the live one
+    new_collection = f"{COLLECTION_NAME}_v{time.strftime('%Y%m%d%H%M%S')}"
     client.create_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=VECTOR_SIZE, distance=Distance.COSINE),
+        collection_name=new_collection,
+        # Bulk mode defers indexing: building HNSW while points stream in would redo work
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=0) if bulk else None,
+        **collection_config(profile, VECTOR_SIZE)
     )
-    print(f"Created fresh collection '{COLLECTION_NAME}'.")
-
-    # 4. Read and upload
-    points = []
-    
-    # Count lines for progress bar
-    total_lines = sum(1 for _ in open(INPUT_FILE, 'r', encoding='utf-8'))
-    print(f"Uploading {total_lines} vectors...")
-    
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-        for i, line in enumerate(tqdm(f, total=total_lines)):
-            try:
-                record = json.loads(line)
-                
-                # Check for errors in the record
-                if "embedding" not in record or not record["embedding"]:
-                    continue
-
-                point = PointStruct(
-                    id=i, 
-                    vector=record['embedding'],
-                    payload={
-                        "text": record['text'],
-                        "metadata": record['metadata'],
-                        "source_id": record['id']
-                    }
-                )
-                points.append(point)
-
-                # Batch upload
-                if len(points) >= BATCH_SIZE:
-                    client.upsert(
-                        collection_name=COLLECTION_NAME,
-                        wait=False,
-                        points=points
-                    )
-                    points = []
-            except json.JSONDecodeError:
-                continue
-
-    # Upload remaining points
-    if points:
-        client.upsert(
-            collection_name=COLLECTION_NAME,
-            wait=True,
-            points=points
+    # Payload indexes go in before the points, so they're built along with the vector index
+    create_payload_indexes(client, new_collection)
+    print(f"Created collection '{new_collection}' (profile '{profile}', payload indexes on {', '.join(PAYLOAD_INDEXES)}).")
+
+    started = time.time()
+    if bulk:
+        print(f"Bulk uploading {len(vector_store)} vectors over {parallel} streams...")
+        bulk_upload(client, new_collection, vector_store, parallel, fields)
+    else:
+        print(f"Uploading {len(vector_store)} vectors...")
+        with tqdm(total=len(vector_store)) as progress:
+            upsert_rows(client, new_collection, vector_store, list(range(len(vector_store))), fields, progress)
+    elapsed = time.time() - started
+    print(f"Uploaded {len(vector_store)} points in {elapsed:.1f}s "
+          f"({len(vector_store) / elapsed if elapsed > 0 else 0.0:.0f} points/s).")
+
+    if not check_point_count(client, new_collection, len(vector_store)):
+        print(f"The alias was not moved; '{new_collection}' is left for inspection.")
+        return None
+
+    if bulk:
+        # Re-enable indexing now that all points are in, and let it finish before going live
+        client.update_collection(
+            collection_name=new_collection,
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD_KB)
         )
+        if not wait_for_indexing(client, new_collection) and not allow_unindexed:
+            print(f"The alias was not moved; '{new_collection}' keeps indexing. "
+                  "Re-run with --allow-unindexed to swap to it anyway.")
+            return None
+
+    # 2. Swap the alias in a single request
+    old_target = alias_target(client)
+    if old_target is None and client.collection_exists(collection_name=COLLECTION_NAME):
+        # One-off migration: a plain collection from older loads holds the alias name
+        print(f"Replacing the plain collection '{COLLECTION_NAME}' with an alias (one-off, brief downtime).")
+        client.delete_collection(collection_name=COLLECTION_NAME)
+
+    operations = []
+    if old_target:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=COLLECTION_NAME)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(
+        collection_name=new_collection, alias_name=COLLECTION_NAME
+    )))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"Alias '{COLLECTION_NAME}' now points to '{new_collection}'" +
+          (f" (was '{old_target}')." if old_target else "."))
+
+    # 3. Drop versions older than the one we may want to roll back to
+    old_versions = [name for name in versioned_collections(client) if name != new_collection]
+    for name in old_versions[:max(0, len(old_versions) - KEEP_OLD_VERSIONS)]:
+        client.delete_collection(collection_name=name)
+        print(f"Deleted old collection '{name}'.")
+    return new_collection
+
+def parse_args():
+    arg_parser = argparse.ArgumentParser(description="Load EconTalk vectors into Qdrant.")
+    arg_parser.add_argument("--delta", action="store_true",
+                            help="Only apply chunks added/removed since the last load instead of rebuilding.")
+    arg_parser.add_argument("--bulk", action="store_true",
+                            help="Rebuild with parallel upload streams and indexing deferred until the load finishes.")
+    arg_parser.add_argument("--parallel", type=int, default=4,
+                            help="Concurrent upload streams in bulk mode.")
+    arg_parser.add_argument("--allow-unindexed", action="store_true",
+                            help="Bulk mode: move the alias even if the index isn't built within the wait.")
+    arg_parser.add_argument("--profile", choices=sorted(PROFILES), default=configured_profile(),
+                            help="Collection layout (quantization, HNSW, on-disk). Set QDRANT_PROFILE to match in the front ends.")
+    arg_parser.add_argument("--grpc", action="store_true",
+                            help="Talk to the Qdrant server over gRPC (port 6334) instead of REST.")
+    return arg_parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.delta and not os.path.exists(DELTA_FILE):
+        print("No chunk delta to apply. The collection is up to date.")
+        return
+
+    vector_store = open_vector_store()
+    if vector_store is None:
+        return
+    client = connect(grpc=args.grpc)
+    if client is None:
+        return
+    fields = EpisodeStore(read_only=True).filter_fields()
+
+    delta = None
+    if os.path.exists(DELTA_FILE):
+        with open(DELTA_FILE, 'r', encoding='utf-8') as f:
+            delta = json.load(f)
+
+    if args.delta:
+        if not apply_delta(client, vector_store, delta, fields):
+            return
+    else:
+        if rebuild(client, vector_store, fields, bulk=args.bulk, parallel=args.parallel, profile=args.profile,
+                   allow_unindexed=args.allow_unindexed) is None:
+            return
+        print("View your data at: http://localhost:6333/dashboard")
 
-    print("\Done. Data loaded into Docker container.")
-    print("View your data at: http://localhost:6333/dashboard")
+    finish_delta(vector_store, delta)
 
 if __name__ == "__main__":
-    load_data()
\ No newline at end of file
+    main()
@@ -0,0 +1,293 @@
+import asyncio
+import random
+import re
+import time
+
+# OpenAI embedding limits per request: 2,048 inputs and 300,000 tokens in total.
+# Batches stay a little under the token limit since our counts are estimates.
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 250_000
+
+DEFAULT_CONCURRENCY = 8
+
+# Transient failures (5xx, timeouts, dropped connections) are retried this many times before
+# the batch is split; rate limits (429) are retried separately, since they always clear eventually.
+MAX_ATTEMPTS = 5
+MAX_RATE_LIMIT_RETRIES = 30
+
+# Exponential backoff: BASE * 2^attempt seconds, capped, with jitter so workers don't retry in lockstep
+BACKOFF_BASE_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 60.0
+
+# Bad requests (e.g. a batch over the token limit) are split in half instead of retried as-is
+SPLIT_STATUSES = {400, 413}
+# Bad key, no access, unknown model: retrying cannot help
+FATAL_STATUSES = {401, 403, 404}
+
+# How often a worker waiting for a free request slot checks again
+POLL_SECONDS = 0.05
+
+RESET_PART_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+RESET_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+class EmbeddingRequestError(Exception):
+    """A failed embedding request. status is None for timeouts and connection errors."""
+    def __init__(self, message, status=None, headers=None, fatal=False):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        self.fatal = fatal or status in FATAL_STATUSES
+
+def parse_reset(value):
+    """Parses OpenAI's reset durations ("1s", "20ms", "6m0s") into seconds."""
+    if not value:
+        return None
+    parts = RESET_PART_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * RESET_UNITS[unit] for number, unit in parts)
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def retry_after_seconds(headers):
+    """Server-suggested wait from retry-after-ms / retry-after, if any."""
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 0.5)
+    delay = min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+def pack_batches(texts, counter, max_tokens=MAX_BATCH_TOKENS, max_inputs=MAX_BATCH_INPUTS):
+    """
+    Greedily packs texts (in order) into request batches by token count.
+    Returns [{"texts": [...], "tokens": n}, ...]; a text over the budget gets a batch of its own.
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for text in texts:
+        tokens = counter.count(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_inputs):
+            batches.append({"texts": current, "tokens": current_tokens})
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append({"texts": current, "tokens": current_tokens})
+    return batches
+
+def split_batch(batch, counter):
+    middle = len(batch["texts"]) // 2
+    return [pack_batches(half, counter, max_tokens=float("inf"))[0]
+            for half in (batch["texts"][:middle], batch["texts"][middle:])]
+
+class AdaptiveLimiter:
+    """
+    Caps requests in flight. The cap is halved (and every worker paused) on a 429 and grows
+    by one after each healthy response, up to max_concurrency (additive increase, multiplicative
+    decrease). The x-ratelimit-* headers on every response also hold back new requests once the
+    remaining request or token allowance runs out, until its reset time.
+    """
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.paused_until = 0.0
+        self.remaining_requests = None
+        self.requests_reset_at = 0.0
+        self.remaining_tokens = None
+        self.tokens_reset_at = 0.0
+
+    def _wait_time(self, tokens, now):
+        wait = self.paused_until - now
+        if self.remaining_requests is not None and self.remaining_requests < 1:
+            wait = max(wait, self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < tokens:
+            wait = max(wait, self.tokens_reset_at - now)
+        return max(0.0, wait)
+
+    async def acquire(self, tokens):
+        while True:
+            now = time.monotonic()
+            wait = self._wait_time(tokens, now)
+            if wait <= 0 and self.in_flight < max(1, int(self.limit)):
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                # Spend the allowance locally so concurrent workers don't all pass the same check
+                if self.remaining_requests is not None:
+                    self.remaining_requests -= 1
+                if self.remaining_tokens is not None:
+                    self.remaining_tokens -= tokens
+                return
+            await asyncio.sleep(wait if wait > 0 else POLL_SECONDS)
+
+    def _read_headers(self, headers):
+        now = time.monotonic()
+        remaining_requests = parse_int(headers.get("x-ratelimit-remaining-requests"))
+        if remaining_requests is not None:
+            self.remaining_requests = remaining_requests
+            self.requests_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-requests")) or 1.0)
+        remaining_tokens = parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        if remaining_tokens is not None:
+            self.remaining_tokens = remaining_tokens
+            self.tokens_reset_at = now + (parse_reset(headers.get("x-ratelimit-reset-tokens")) or 1.0)
+
+    def release(self, headers=None):
+        """Frees the slot after a completed request and adapts to its rate-limit headers."""
+        self.in_flight -= 1
+        self._read_headers(headers or {})
+        self.limit = min(self.max_concurrency, self.limit + 1)
+
+    def release_rate_limited(self, headers, delay):
+        self.in_flight -= 1
+        self._read_headers(headers or {})
+        self.limit = max(1.0, self.limit / 2)
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def release_failed(self):
+        self.in_flight -= 1
+
+class EmbedStats:
+    """Request counters and throughput for one engine run."""
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.splits = 0
+
+    def record(self, chunks, tokens):
+        self.requests += 1
+        self.chunks += chunks
+        self.tokens += tokens
+
+    def report(self, limiter=None):
+        elapsed = time.time() - self.started
+        chunks_per_second = self.chunks / elapsed if elapsed > 0 else 0.0
+        tokens_per_second = self.tokens / elapsed if elapsed > 0 else 0.0
+        print(f"Embedded {self.chunks} chunks ({self.tokens} tokens) in {self.requests} requests, {elapsed:.1f}s: "
+              f"{chunks_per_second:.1f} chunks/s, {tokens_per_second:.0f} tokens/s.")
+        print(f"Retries: {self.retries} (rate limited: {self.rate_limited}), batches split: {self.splits}.")
+        if limiter:
+            print(f"Peak requests in flight: {limiter.peak_in_flight} (final limit {int(limiter.limit)}).")
+
+class EmbeddingEngine:
+    """
+    Runs embedding batches with several requests in flight.
+
+    send(texts) is an async callable returning (vectors, headers, prompt_tokens) or raising
+    EmbeddingRequestError. Rate-limited batches are retried after a backoff, bad or persistently
+    failing batches are split in half, and only a single text that still fails is given up on
+    (it is listed in engine.failed and picked up again by the next run).
+    """
+    def __init__(self, send, counter, max_concurrency=DEFAULT_CONCURRENCY, max_attempts=MAX_ATTEMPTS):
+        self.send = send
+        self.counter = counter
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.stats = EmbedStats()
+        self.failed = []
+
+    async def run(self, batches, on_result):
+        """Embeds every batch, calling on_result(texts, vectors) as each one completes."""
+        queue = asyncio.Queue()
+        for batch in batches:
+            queue.put_nowait(batch)
+
+        workers = [asyncio.create_task(self._worker(queue, on_result)) for _ in range(self.max_concurrency)]
+        finished = asyncio.create_task(queue.join())
+        done, _ = await asyncio.wait([finished, *workers], return_when=asyncio.FIRST_COMPLETED)
+
+        for task in [finished, *workers]:
+            task.cancel()
+        await asyncio.gather(finished, *workers, return_exceptions=True)
+
+        # A worker only finishes early on a fatal error (bad key, no quota, unknown model)
+        for task in done:
+            if task is not finished:
+                task.result()
+
+    async def _worker(self, queue, on_result):
+        while True:
+            batch = await queue.get()
+            try:
+                await self._process(batch, queue, on_result)
+            finally:
+                queue.task_done()
+
+    async def _process(self, batch, queue, on_result):
+        attempts = 0
+        rate_limit_retries = 0
+        while True:
+            await self.limiter.acquire(batch["tokens"])
+            try:
+                vectors, headers, prompt_tokens = await self.send(batch["texts"])
+            except EmbeddingRequestError as e:
+                if e.fatal:
+                    self.limiter.release_failed()
+                    raise
+
+                if e.status == 429 and rate_limit_retries < MAX_RATE_LIMIT_RETRIES:
+                    rate_limit_retries += 1
+                    self.stats.rate_limited += 1
+                    self.stats.retries += 1
+                    # Pause everyone, not just this worker: the limit is per account
+                    self.limiter.release_rate_limited(e.headers, backoff_delay(rate_limit_retries, retry_after_seconds(e.headers)))
+                    continue
+
+                self.limiter.release_failed()
+                attempts += 1
+                if e.status in SPLIT_STATUSES or e.status == 429 or attempts >= self.max_attempts:
+                    if len(batch["texts"]) > 1:
+                        self.stats.splits += 1
+                        for half in split_batch(batch, self.counter):
+                            queue.put_nowait(half)
+                    else:
+                        print(f"\nGiving up on one chunk after {attempts} attempts: {e}")
+                        self.failed.extend(batch["texts"])
+                    return
+
+                self.stats.retries += 1
+                await asyncio.sleep(backoff_delay(attempts, retry_after_seconds(e.headers)))
+                continue
+
+            self.limiter.release(headers)
+            self.stats.record(len(batch["texts"]), prompt_tokens or batch["tokens"])
+            on_result(batch["texts"], vectors)
+            return
+
+def openai_sender(client, model, dimensions=None):
+    """Builds a send() for EmbeddingEngine from an openai.AsyncOpenAI client (created with max_retries=0)."""
+    from openai import APIConnectionError, APIStatusError
+
+    extra = {"dimensions": dimensions} if dimensions else {}
+
+    async def send(texts):
+        try:
+            raw = await client.embeddings.with_raw_response.create(input=texts, model=model, **extra)
+        except APIStatusError as e:
+            raise EmbeddingRequestError(str(e), e.status_code, e.response.headers,
+                                        fatal=getattr(e, "code", None) == "insufficient_quota")
+        except APIConnectionError as e:
+            raise EmbeddingRequestError(str(e))
+
+        response = raw.parse()
+        vectors = [data.embedding for data in sorted(response.data, key=lambda data: data.index)]
+        return vectors, raw.headers, response.usage.prompt_tokens if response.usage else None
+    return send
@@ -0,0 +1,97 @@
+import hashlib
+import sqlite3
+import time
+import zlib
+
+# Compression level for stored pages (zlib: 1 = fastest, 9 = smallest)
+COMPRESSION_LEVEL = 6
+
+def stored_date(published):
+    """The publish date as stored: text, or None when the CSV had no date (None / NaN)."""
+    if published is None or published != published:
+        return None
+    return str(published)
+
+class HtmlCache:
+    """
+    Content-addressed store for fetched episode pages, kept in a single SQLite archive.
+
+    Each distinct page body is stored once, zlib-compressed, under its SHA-256. A separate
+    table maps every episode URL to the body it last returned (plus the title/date needed
+    to re-run extraction), so transcripts can be rebuilt without touching the network.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                raw_size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+                title TEXT,
+                published TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        # Earlier versions stored missing dates as their string form
+        self.conn.execute("UPDATE pages SET published = NULL WHERE published IN ('None', 'nan', 'NaT')")
+        self.conn.commit()
+
+    def put(self, url, html, title, published):
+        """
+        Stores a page body (deduplicated by content) and points the URL at it. The body the URL
+        pointed at before is deleted once no page references it any more.
+        """
+        raw = html.encode('utf-8')
+        sha = hashlib.sha256(raw).hexdigest()
+        with self.conn:
+            previous = self.conn.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha256, raw_size, data) VALUES (?, ?, ?)",
+                (sha, len(raw), zlib.compress(raw, COMPRESSION_LEVEL))
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, sha256, title, published, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, sha, title, stored_date(published), time.time())
+            )
+            if previous and previous[0] != sha:
+                self.conn.execute(
+                    "DELETE FROM blobs WHERE sha256 = ? AND NOT EXISTS (SELECT 1 FROM pages WHERE sha256 = ?)",
+                    (previous[0], previous[0])
+                )
+        return sha
+
+    def read_blob(self, sha):
+        row = self.conn.execute("SELECT data FROM blobs WHERE sha256 = ?", (sha,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def get(self, url):
+        """Returns the cached HTML for a URL, or None."""
+        row = self.conn.execute("SELECT sha256 FROM pages WHERE url = ?", (url,)).fetchone()
+        return self.read_blob(row[0]) if row else None
+
+    def pages(self):
+        """Lists every cached page as (rowid, url, title, published, sha256)."""
+        return self.conn.execute(
+            "SELECT rowid, url, title, published, sha256 FROM pages ORDER BY rowid"
+        ).fetchall()
+
+    def stats(self):
+        """Returns (pages, distinct bodies, raw bytes, compressed bytes)."""
+        pages = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        blobs, raw_bytes, stored_bytes = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs"
+        ).fetchone()
+        return pages, blobs, raw_bytes, stored_bytes
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,133 @@
+import json
+import os
+import sqlite3
+import time
+
+# Statuses recorded per episode
+STATUS_OK = "ok"
+STATUS_NO_TRANSCRIPT = "no_transcript"
+STATUS_FAILED = "failed"
+
+# Failed episodes are retried with exponential backoff, up to a limit
+MAX_FAILED_ATTEMPTS = 5
+RETRY_BACKOFF_HOURS = 6
+
+def normalize_url(url):
+    return str(url).strip().rstrip('/')
+
+class ScrapeManifest:
+    """
+    Persistent record of every episode the scraper has attempted, keyed by normalized URL.
+
+    Replaces re-reading every file in data/raw on startup: lookups are a primary-key query,
+    and each row is written in its own transaction right after the episode is saved.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS episodes (
+                url TEXT PRIMARY KEY,
+                slug TEXT,
+                status TEXT NOT NULL,
+                content_hash TEXT,
+                scraped_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_attempt_at REAL,
+                last_error TEXT,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+
+    def get(self, url):
+        return self.conn.execute("SELECT * FROM episodes WHERE url = ?", (normalize_url(url),)).fetchone()
+
+    def should_skip(self, url, retry_missing=False):
+        """Decides whether an episode needs (another) scrape attempt."""
+        row = self.get(url)
+        if row is None:
+            return False
+        if row["status"] == STATUS_OK:
+            return True
+        if row["status"] == STATUS_NO_TRANSCRIPT:
+            return not retry_missing
+
+        # Failed: back off exponentially and give up after MAX_FAILED_ATTEMPTS
+        if row["attempts"] >= MAX_FAILED_ATTEMPTS:
+            return True
+        retry_at = (row["last_attempt_at"] or 0) + RETRY_BACKOFF_HOURS * 3600 * 2 ** (row["attempts"] - 1)
+        return time.time() < retry_at
+
+    def validators(self):
+        """Returns {url: {"etag": ..., "last_modified": ...}} for conditional requests."""
+        rows = self.conn.execute(
+            "SELECT url, etag, last_modified FROM episodes WHERE etag IS NOT NULL OR last_modified IS NOT NULL"
+        )
+        return {row["url"]: {"etag": row["etag"], "last_modified": row["last_modified"]} for row in rows}
+
+    def record_saved(self, url, slug, content_hash, validators=None):
+        validators = validators or {}
+        now = time.time()
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO episodes (url, slug, status, content_hash, scraped_at, attempts, last_attempt_at,
+                                      last_error, etag, last_modified)
+                VALUES (?, ?, ?, ?, ?, 1, ?, NULL, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    slug = excluded.slug,
+                    status = excluded.status,
+                    content_hash = excluded.content_hash,
+                    scraped_at = excluded.scraped_at,
+                    attempts = episodes.attempts + 1,
+                    last_attempt_at = excluded.last_attempt_at,
+                    last_error = NULL,
+                    etag = COALESCE(excluded.etag, episodes.etag),
+                    last_modified = COALESCE(excluded.last_modified, episodes.last_modified)
+            """, (normalize_url(url), slug, STATUS_OK, content_hash, now, now,
+                  validators.get("etag"), validators.get("last_modified")))
+
+    def record_failure(self, url, slug, status, error=None):
+        """Records a no-transcript or failed attempt. A previously saved episode keeps its 'ok' status."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO episodes (url, slug, status, attempts, last_attempt_at, last_error)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    status = CASE WHEN episodes.status = 'ok' THEN episodes.status ELSE excluded.status END,
+                    attempts = episodes.attempts + 1,
+                    last_attempt_at = excluded.last_attempt_at,
+                    last_error = excluded.last_error
+            """, (normalize_url(url), slug, status, now, error))
+
+    def record_checked(self, url):
+        """Records a conditional request that came back unchanged (304)."""
+        with self.conn:
+            self.conn.execute("UPDATE episodes SET last_attempt_at = ? WHERE url = ?",
+                              (time.time(), normalize_url(url)))
+
+    def import_legacy(self, raw_dir, content_hash):
+        """One-off bootstrap from data/raw/*.json when the manifest is new."""
+        imported = 0
+        for filename in os.listdir(raw_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(raw_dir, filename), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except:
+                continue # Ignore corrupted files
+            if "url" in data:
+                self.record_saved(data["url"], filename[:-len(".json")], content_hash(data))
+                imported += 1
+        return imported
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,123 @@
+import re
+
+# All patterns are compiled once at import time and shared by every call.
+TIMESTAMP_PATTERN = re.compile(r'^\d{1,2}:\d{2}$')
+SPEAKER_LINE_PATTERN = re.compile(r'^([A-Za-z \.\-]+):$')
+SPEAKER_INLINE_PATTERN = re.compile(r'^(Russ|Guest|Roberts|[A-Z][a-z]+ [A-Z][a-z]+): (.*)')
+BRACKET_PATTERN = re.compile(r'\[.*?\]')
+
+# Old-era transcripts run speakers together inline; a turn starts right before "<label>:"
+OLD_ERA_SPEAKER_LABELS = ("Russ", "Guest", "Roberts")
+
+IGNORE_PHRASES = frozenset(["Time", "Podcast Episode Highlights", "Hide Highlights"])
+OLD_ERA_IGNORE_PHRASE = "Time Podcast Episode Highlights"
+DEFAULT_SPEAKER = "Narrator/Intro"
+
+# A timestamp line ("1:23" or "12:34") is never longer than this
+MAX_TIMESTAMP_LENGTH = 5
+
+def clean_transcript_new_era(lines):
+    """Cleaning logic for modern episodes (Starting 8/29/2016)."""
+    cleaned_dialogue = []
+    current_speaker = DEFAULT_SPEAKER
+    current_text_buffer = []
+
+    for line in lines:
+        line = line.strip()
+        if not line: continue
+        if line in IGNORE_PHRASES: continue
+        if len(line) <= MAX_TIMESTAMP_LENGTH and TIMESTAMP_PATTERN.match(line): continue
+
+        # Speaker labels sit on their own line and end with a colon
+        if line[-1] == ':':
+            speaker_match = SPEAKER_LINE_PATTERN.match(line)
+            if speaker_match:
+                if current_text_buffer:
+                    cleaned_dialogue.append({
+                        "speaker": current_speaker,
+                        "text": " ".join(current_text_buffer)
+                    })
+                    current_text_buffer = []
+                current_speaker = speaker_match.group(1)
+                continue
+
+        if '[' in line:
+            line = BRACKET_PATTERN.sub('', line)
+        current_text_buffer.append(line)
+
+    if current_text_buffer:
+        cleaned_dialogue.append({
+            "speaker": current_speaker,
+            "text": " ".join(current_text_buffer)
+        })
+
+    return cleaned_dialogue
+
+def _old_era_pieces(full_text):
+    """
+    Cuts the text right before every speaker label (and at any newline), in a single scan.
+    Jumps from colon to colon with str.find and checks which label (if any) ends there,
+    which is much cheaper than running a regex alternation over every character.
+    """
+    pieces = []
+    for segment in full_text.split('\n'):
+        start = 0
+        colon = segment.find(':')
+        while colon != -1:
+            for label in OLD_ERA_SPEAKER_LABELS:
+                label_start = colon - len(label)
+                if label_start >= 0 and segment.startswith(label, label_start):
+                    pieces.append(segment[start:label_start])
+                    start = label_start
+                    break
+            colon = segment.find(':', colon + 1)
+        pieces.append(segment[start:])
+    return pieces
+
+def _clean_old_era_text(full_text):
+    """Splits old-era text into turns in one pass over the (already joined) transcript."""
+    cleaned_dialogue = []
+    current_speaker = DEFAULT_SPEAKER
+    current_text_buffer = []
+
+    for line in _old_era_pieces(full_text):
+        line = line.strip()
+        if not line: continue
+
+        if OLD_ERA_IGNORE_PHRASE in line: continue
+
+        match = SPEAKER_INLINE_PATTERN.match(line)
+
+        if match:
+            if current_text_buffer:
+                cleaned_dialogue.append({
+                    "speaker": current_speaker,
+                    "text": " ".join(current_text_buffer).strip()
+                })
+                current_text_buffer = []
+
+            current_speaker = match.group(1)
+            line = match.group(2)
+
+        if '[' in line:
+            line = BRACKET_PATTERN.sub('', line)
+        current_text_buffer.append(line)
+
+    if current_text_buffer:
+        cleaned_dialogue.append({
+            "speaker": current_speaker,
+            "text": " ".join(current_text_buffer).strip()
+        })
+
+    return cleaned_dialogue
+
+def clean_transcript_old_era(lines):
+    """Cleaning logic for episodes between 1/23/2012 & 8/29/2016."""
+    return _clean_old_era_text(" ".join(lines))
+
+def clean_transcript(raw_text, new_format):
+    """Cleans a raw transcript string without splitting it into a list first where it isn't needed."""
+    if new_format:
+        return clean_transcript_new_era(raw_text.split('\n'))
+    # Same as " ".join(raw_text.split('\n')), without building the intermediate list
+    return _clean_old_era_text(raw_text.replace('\n', ' '))
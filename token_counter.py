@@ -0,0 +1,43 @@
+import re
+
+# Words, numbers and individual punctuation marks
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Average characters per token for a long word (BPE vocabularies split rare/long words)
+CHARS_PER_WORD_TOKEN = 6
+
+class ApproxTokenCounter:
+    """
+    Offline token estimate, no downloads needed: one token per punctuation mark and per
+    short word, more for long words. Tends to slightly over-count OpenAI's cl100k
+    tokenizer on English prose, which is the safe side for a hard budget.
+    """
+    name = "approx"
+
+    def count(self, text):
+        return sum((len(piece) + CHARS_PER_WORD_TOKEN - 1) // CHARS_PER_WORD_TOKEN
+                   for piece in WORD_PATTERN.findall(text))
+
+class TiktokenCounter:
+    """Exact counts with OpenAI's tokenizer (needs the optional 'tiktoken' package)."""
+    name = "tiktoken"
+
+    def __init__(self, model="text-embedding-3-small"):
+        try:
+            import tiktoken
+        except ImportError:
+            raise RuntimeError("The 'tiktoken' tokenizer needs the tiktoken package: pip install tiktoken")
+        self.encoding = tiktoken.encoding_for_model(model)
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+TOKEN_COUNTERS = {
+    "approx": ApproxTokenCounter,
+    "tiktoken": TiktokenCounter,
+}
+
+def get_token_counter(name="approx"):
+    if name not in TOKEN_COUNTERS:
+        raise ValueError(f"Unknown tokenizer '{name}'. Choose from: {', '.join(TOKEN_COUNTERS)}")
+    return TOKEN_COUNTERS[name]()
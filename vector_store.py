@@ -0,0 +1,245 @@
+import json
+import os
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VECTOR_DIR = os.path.join(ROOT_DIR, "data", "vectors")
+
+VECTOR_SIZE = 1536
+DTYPES = ("float32", "float16")
+
+# Files inside the store directory. Every compaction (remove()) writes a new generation of the
+# matrix and ID index next to the old one; the checkpoint says which generation is live.
+VECTORS_FILE = "vectors.bin"   # row-major matrix, one row per chunk, no header (generation 0)
+IDS_FILE = "ids.jsonl"         # row i of the matrix <-> line i: {"id": ..., "episode_id": ...} (generation 0)
+META_FILE = "meta.json"        # {"dim": ..., "dtype": ...}
+CHECKPOINT_FILE = "checkpoint.json"  # {"generation": ..., "rows": ..., "ids_bytes": ...}: the last fully written batch
+
+def generation_files(generation):
+    """(matrix file, ID index file) of a generation: vectors.bin / ids.jsonl, then vectors.<n>.bin / ids.<n>.jsonl."""
+    if generation == 0:
+        return VECTORS_FILE, IDS_FILE
+    return f"vectors.{generation}.bin", f"ids.{generation}.jsonl"
+
+def write_synced(path, chunks):
+    """Writes the byte chunks to path and fsyncs it, so it is on disk before anything points at it."""
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+class VectorStore:
+    """
+    Append-only binary vector store: a raw float32 (or float16) matrix that is read back
+    with np.memmap, plus a parallel ID index. Text and metadata stay in the episode store.
+
+    A 1536-dim float32 row is 6 KB instead of ~30 KB of JSON floats, and reading the
+    vectors (06_load_db.py, local search) involves no parsing at all.
+    """
+    def __init__(self, path=DEFAULT_VECTOR_DIR, dim=VECTOR_SIZE, dtype="float32", read_only=False):
+        self.path = path
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, META_FILE)
+        self.checkpoint_path = os.path.join(path, CHECKPOINT_FILE)
+        self.matrix = None  # read-only stores: memmap opened once, see vectors()
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        elif read_only:
+            raise FileNotFoundError(f"No vector store in {path}. Run 05_embed.py first.")
+        else:
+            if dtype not in DTYPES:
+                raise ValueError(f"Unsupported dtype '{dtype}'. Choose from: {', '.join(DTYPES)}")
+            meta = {"dim": dim, "dtype": dtype}
+            with open(self.meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.row_bytes = self.dim * self.dtype.itemsize
+
+        self.records, self.ids_bytes = self._recover()
+
+    def _use_generation(self, generation):
+        self.generation = generation
+        vectors_file, ids_file = generation_files(generation)
+        self.vectors_path = os.path.join(self.path, vectors_file)
+        self.ids_path = os.path.join(self.path, ids_file)
+
+    def _recover(self):
+        """
+        Reads the committed rows and cuts both files back to them, so a batch torn by a crash
+        (half a vector row, or a final ID line without its newline) is dropped automatically.
+        Returns (records, size of the ID index in bytes).
+        """
+        checkpoint = None
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        self._use_generation(checkpoint.get("generation", 0) if checkpoint else 0)
+
+        vectors_size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        data = b""
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, 'rb') as f:
+                data = f.read()
+
+        if checkpoint:
+            if len(data) < checkpoint["ids_bytes"] or vectors_size < checkpoint["rows"] * self.row_bytes:
+                raise RuntimeError(f"Vector store {self.path} is shorter than its checkpoint "
+                                   f"({checkpoint['rows']} rows); it was modified outside VectorStore.")
+            data = data[:checkpoint["ids_bytes"]]
+            rows = checkpoint["rows"]
+        else:
+            # Store written before checkpoints existed: every complete ID line must have exactly one
+            # complete vector row. Anything else can't be paired up safely.
+            lines = data.split(b'\n')[:-1]
+            rows = vectors_size // self.row_bytes
+            if len(lines) != rows:
+                raise RuntimeError(f"Vector store {self.path} has {len(lines)} IDs but {rows} vector rows "
+                                   "and no checkpoint to reconcile them. Move it aside and re-run 05_embed.py "
+                                   "(the embedding cache makes that cheap).")
+            data = b"".join(line + b'\n' for line in lines)
+
+        # One json.loads over the whole index is several times faster than one per line
+        records = json.loads(b"[" + data.rstrip(b'\n').replace(b'\n', b",") + b"]") if data else []
+        if self.read_only:
+            # Readers (search) see committed rows only and never touch files a writer may be appending to.
+            # The matrix is mapped now, so a compaction that deletes this generation doesn't pull it away.
+            if records:
+                self.matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(len(records), self.dim))
+            return records, len(data)
+
+        torn = (os.path.getsize(self.ids_path) if os.path.exists(self.ids_path) else 0) - len(data)
+        torn += vectors_size - rows * self.row_bytes
+        if torn:
+            print(f"Vector store: dropped {torn} bytes of an interrupted batch.")
+            for path, size in ((self.ids_path, len(data)), (self.vectors_path, rows * self.row_bytes)):
+                if os.path.exists(path):
+                    with open(path, 'r+b') as f:
+                        f.truncate(size)
+
+        # Files of other generations: a compaction that crashed before its switch, or the old
+        # generation of one that crashed right after it
+        live = set(generation_files(self.generation))
+        for name in os.listdir(self.path):
+            if name not in live and (name.startswith("vectors.") and name.endswith(".bin")
+                                     or name.startswith("ids.") and name.endswith(".jsonl")):
+                os.remove(os.path.join(self.path, name))
+
+        self._commit(len(records), len(data))
+        return records, len(data)
+
+    def _commit(self, rows, ids_bytes, generation=None):
+        """Atomically records the live generation and the rows of it that are fully on disk."""
+        generation = self.generation if generation is None else generation
+        tmp_path = self.checkpoint_path + ".tmp"
+        write_synced(tmp_path, [json.dumps({"generation": generation, "rows": rows, "ids_bytes": ids_bytes}).encode('utf-8')])
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def ids(self):
+        return [record["id"] for record in self.records]
+
+    def episode_ids(self):
+        return [record["episode_id"] for record in self.records]
+
+    def append(self, records, vectors):
+        """
+        Appends [{"id", "episode_id"}, ...] and their vectors (rows are converted to the store's dtype),
+        then commits the checkpoint. Each call is one batch that survives a crash whole or not at all.
+        """
+        matrix = np.asarray(vectors, dtype=self.dtype).reshape(-1, self.dim)
+        entries = [{"id": record["id"], "episode_id": record["episode_id"]} for record in records]
+        lines = "".join(json.dumps(entry) + '\n' for entry in entries).encode('utf-8')
+
+        with open(self.vectors_path, 'ab') as f:
+            f.write(matrix.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.ids_path, 'ab') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records.extend(entries)
+        self.ids_bytes += len(lines)
+        self._commit(len(self.records), self.ids_bytes)
+
+    def vectors(self):
+        """The whole matrix as a read-only memmap (nothing is read until rows are touched)."""
+        if not self.records:
+            return np.zeros((0, self.dim), dtype=self.dtype)
+        if self.matrix is not None:
+            return self.matrix
+        return np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(len(self.records), self.dim))
+
+    def iter_batches(self, batch_size):
+        """Yields (start_row, records, matrix slice) in row order; slices are views of the memmap."""
+        matrix = self.vectors()
+        for start in range(0, len(self.records), batch_size):
+            yield start, self.records[start:start + batch_size], matrix[start:start + batch_size]
+
+    def remove(self, ids):
+        """Compacts the store without the given chunk IDs (rewrites both files once). Returns rows kept."""
+        ids = set(ids)
+        keep = [row for row, record in enumerate(self.records) if record["id"] not in ids]
+        if len(keep) == len(self.records):
+            return len(keep)
+
+        # The compacted store is written as the next generation, next to the live one. Replacing the
+        # checkpoint switches to it in one atomic step; a crash before that leaves the old one intact.
+        matrix = self.vectors()
+        old_paths = (self.vectors_path, self.ids_path)
+        generation = self.generation + 1
+        vectors_file, ids_file = generation_files(generation)
+        # A few thousand rows at a time, so the matrix is never fully in memory
+        write_synced(os.path.join(self.path, vectors_file),
+                     (np.ascontiguousarray(matrix[keep[start:start + 4096]]).tobytes()
+                      for start in range(0, len(keep), 4096)))
+        kept_records = [self.records[row] for row in keep]
+        lines = "".join(json.dumps(record) + '\n' for record in kept_records).encode('utf-8')
+        write_synced(os.path.join(self.path, ids_file), [lines])
+        del matrix
+
+        self._commit(len(kept_records), len(lines), generation)
+        self._use_generation(generation)
+        self.records = kept_records
+        self.ids_bytes = len(lines)
+        # Readers that opened the old generation keep their mapping after the unlink
+        for old_path in old_paths:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        return len(keep)
+
+    def import_jsonl(self, path, episode_ids, batch_size=1000):
+        """One-off migration from the old econtalk_vectors.jsonl (JSON float lists). Returns rows imported."""
+        records, vectors = [], []
+        imported = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # skip a torn/corrupted line
+                if not data.get("embedding") or data['id'] not in episode_ids:
+                    continue
+                records.append({"id": data['id'], "episode_id": data.get('episode_id', episode_ids[data['id']])})
+                vectors.append(data['embedding'])
+                if len(records) >= batch_size:
+                    self.append(records, vectors)
+                    imported += len(records)
+                    records, vectors = [], []
+        if records:
+            self.append(records, vectors)
+            imported += len(records)
+        return imported
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(p) for p in (self.vectors_path, self.ids_path) if os.path.exists(p))